@@ -0,0 +1,199 @@
+# asset_manager.py
+# 背景・キャラクター・キャラクターパーツの画像を一度だけ索引し、必要になったときに
+# 読み込んで、出力解像度ごとのリサイズ済み・分離済みの画像をLRUキャッシュする
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from character_rig import PART_IMAGES, CharacterRig
+
+# 索引するフォルダ（種類 → フォルダ名）
+ASSET_FOLDERS = {
+    "backgrounds": "backgrounds",
+    "characters": "characters",
+    "character_parts": "character_parts",
+}
+
+# 同じ名前の画像が複数ある場合は前にある拡張子を優先
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+class AssetCache:
+    """スレッドセーフなLRUキャッシュ（同じキーの読み込みは1回だけ行う）"""
+    
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}  # 読み込み中のキー → 完了を通知するイベント
+        self._lock = threading.Lock()
+    
+    def get(self, key, load_fn):
+        """キャッシュから取得（なければ load_fn で読み込んで追加、None はキャッシュしない）"""
+        while True:
+            with self._lock:
+                if key in self.items:
+                    self.hits += 1
+                    self.items.move_to_end(key)
+                    return self.items[key]
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+            # 別スレッド（先読みなど）が読み込み中なら完了を待つ
+            event.wait()
+        
+        try:
+            value = load_fn()
+            with self._lock:
+                self.misses += 1
+                if value is not None:
+                    self.items[key] = value
+                    if len(self.items) > self.max_size:
+                        self.items.popitem(last=False)  # 最も長く使われていないものを破棄
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+    
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+
+def _read_only(image):
+    """キャッシュ内の画像を共有しても書き換えられないようにする"""
+    image.flags.writeable = False
+    return image
+
+class AssetManager:
+    def __init__(self, root=".", cache_size=32):
+        # フォルダの索引（種類 → {小文字の名前: パス}）
+        self.root = root
+        self.index = {}
+        self.cache = AssetCache(cache_size)
+        self._preload_thread = None
+        self._stop = threading.Event()
+        for kind in ASSET_FOLDERS:
+            self.scan(kind)
+    
+    def scan(self, kind):
+        """フォルダ内の画像を索引し直す（ファイルは読み込まない）"""
+        folder = os.path.join(self.root, ASSET_FOLDERS[kind])
+        entries = {}
+        if os.path.isdir(folder):
+            for entry in os.scandir(folder):
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if not entry.is_file() or ext not in IMAGE_EXTENSIONS:
+                    continue
+                name = stem.lower()
+                current = entries.get(name)
+                if current is None or IMAGE_EXTENSIONS.index(ext) < IMAGE_EXTENSIONS.index(
+                        os.path.splitext(current)[1].lower()):
+                    entries[name] = entry.path
+        self.index[kind] = entries
+        return entries
+    
+    def names(self, kind):
+        """索引済みの画像名（拡張子なし・小文字）"""
+        return sorted(self.index[kind])
+    
+    def path(self, kind, name):
+        """画像のパス（索引になければフォルダを探し直し、それでもなければ None）"""
+        name = name.lower()
+        path = self.index[kind].get(name)
+        if path is None:
+            path = self.scan(kind).get(name)
+        return path
+    
+    def image(self, kind, name):
+        """元の画像（アルファチャンネルを含む、読み取り専用）"""
+        path = self.path(kind, name)
+        if path is None:
+            return None
+        
+        def load():
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                return None
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            return _read_only(image)
+        
+        return self.cache.get(("source", kind, name.lower()), load)
+    
+    def background(self, name, size):
+        """出力サイズ (幅, 高さ) にリサイズしたBGRの背景画像（読み取り専用）"""
+        size = tuple(size)
+        
+        def load():
+            image = self.image("backgrounds", name)
+            if image is None:
+                return None
+            if image.shape[2] == 4:
+                image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            return _read_only(cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+        
+        return self.cache.get(("backgrounds", name.lower(), size), load)
+    
+    def character(self, name, size=None):
+        """キャラクター画像をBGRとマスク（(H, W, 1) float32、不透明ならNone）に分けて返す"""
+        size = tuple(size) if size is not None else None
+        
+        def load():
+            image = self.image("characters", name)
+            if image is None:
+                return None
+            if size is not None:
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            if image.shape[2] != 4:
+                return _read_only(np.ascontiguousarray(image)), None
+            mask = (image[:, :, 3] / np.float32(255.0))[:, :, np.newaxis]
+            return _read_only(np.ascontiguousarray(image[:, :, :3])), _read_only(mask)
+        
+        return self.cache.get(("characters", name.lower(), size), load) or (None, None)
+    
+    def character_rig(self, prefix="", **kwargs):
+        """パーツ画像（{prefix}{パーツ名}）から作ったリグ（パーツがなければ None）"""
+        def load():
+            images = {}
+            for part in PART_IMAGES:
+                image = self.image("character_parts", f"{prefix}{part}")
+                if image is not None:
+                    images[part] = image
+            rig = CharacterRig(images, **kwargs)
+            return rig if rig else None
+        
+        return self.cache.get(("character_parts", prefix.lower(), tuple(sorted(kwargs.items()))), load)
+    
+    def preload(self, background_size=None):
+        """索引済みの画像をバックグラウンドスレッドで先に読み込む"""
+        if self._preload_thread is not None and self._preload_thread.is_alive():
+            return self._preload_thread
+        
+        def run():
+            for kind in ASSET_FOLDERS:
+                for name in self.names(kind):
+                    if self._stop.is_set():
+                        return
+                    if kind == "backgrounds" and background_size is not None:
+                        self.background(name, background_size)
+                    elif kind == "characters":
+                        self.character(name)
+                    else:
+                        self.image(kind, name)
+            self.character_rig()
+        
+        self._stop.clear()
+        self._preload_thread = threading.Thread(target=run, name="asset-preload", daemon=True)
+        self._preload_thread.start()
+        return self._preload_thread
+    
+    def close(self):
+        """先読みを止める"""
+        self._stop.set()
+        if self._preload_thread is not None:
+            self._preload_thread.join()
+            self._preload_thread = None
@@ -0,0 +1,194 @@
+# batch_process.py
+# 録画済み動画をプロセスプールで並列処理するコマンドラインツール
+import argparse
+import collections
+import multiprocessing
+import os
+import time
+import cv2
+import numpy as np
+from config import POSE_DETECTION_CONFIG, RENDER_CONFIG, SMOOTHING_CONFIG
+from landmark_store import DEFAULT_STREAMS, LandmarkStoreWriter
+from landmarks import LANDMARK_FIELDS, landmarks_to_array
+
+# ワーカープロセスごとの状態（MediaPipeのインスタンスはワーカーごとに1つ）
+_worker = {}
+
+def _init_worker(background):
+    """ワーカーの初期化（検出器・スムーザー・レンダラーを生成）"""
+    from character_renderer import CharacterRenderer
+    from pose_detector import PoseDetector
+    
+    _worker["detector"] = PoseDetector(**POSE_DETECTION_CONFIG)
+    _worker["renderer"] = CharacterRenderer(**RENDER_CONFIG)
+    _worker["background"] = background
+
+def _create_smoother():
+    """チャンクごとに新しいスムーザーを生成"""
+    from pose_smoother import PoseSmoother
+    
+    return PoseSmoother(
+        max_history=SMOOTHING_CONFIG["max_history"],
+        smoothing_factor=SMOOTHING_CONFIG["default_smoothing_factor"],
+        filter_type=SMOOTHING_CONFIG["filter_type"],
+        filter_params=SMOOTHING_CONFIG["filter_params"])
+
+def _seek(cap, frame_index):
+    """frame_index のフレームから読めるように移動（シークが不正確なコーデックでは先頭から読み飛ばす）"""
+    if frame_index == 0:
+        return True
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return True
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_index):
+        if not cap.grab():
+            return False
+    return True
+
+def _process_chunk(task):
+    """動画の[start, end)フレームを処理して描画結果とランドマークを返す"""
+    video_path, start, end, warmup, fps = task
+    detector = _worker["detector"]
+    renderer = _worker["renderer"]
+    smoother = _create_smoother()
+    detector.reset_roi()
+    
+    # スムーザーの状態を温めるため、チャンクの少し手前から読み始める
+    first = max(0, start - warmup)
+    cap = cv2.VideoCapture(video_path)
+    seeked = _seek(cap, first)
+    
+    frames = []
+    landmark_rows = []
+    index = first
+    while seeked and (end is None or index < end):
+        success, frame = cap.read()
+        if not success:
+            break
+        
+        timestamp = index / fps
+        landmarks = detector.detect_pose(frame)
+        smoothed = smoother.apply_smoothing(landmarks, timestamp) if landmarks else None
+        
+        if index >= start:
+            height, width = frame.shape[:2]
+            if _worker["background"] == "frame":
+                canvas = frame
+            else:
+                canvas = np.zeros((height, width, 3), dtype=np.uint8)
+            
+            if smoothed:
+                renderer.draw_character(canvas, smoothed, width, height)
+                landmark_rows.append(landmarks_to_array(smoothed))
+            else:
+                landmark_rows.append(np.full((33, LANDMARK_FIELDS), np.nan, dtype=np.float32))
+            frames.append(canvas)
+        index += 1
+    cap.release()
+    
+    if landmark_rows:
+        chunk_landmarks = np.stack(landmark_rows)
+    else:
+        chunk_landmarks = np.empty((0, 33, LANDMARK_FIELDS), dtype=np.float32)
+    return start, frames, chunk_landmarks
+
+def process_video(input_path, output_path, landmarks_path=None, workers=None,
+                  chunk_size=64, warmup=None, background="black", max_memory_mb=2048):
+    """動画をチャンクに分割して並列処理し、順番どおりに書き出す
+    
+    描画結果はチャンクごとにまとめてメインプロセスへ返るため、処理中のチャンクに含まれる
+    フレームの合計が max_memory_mb に収まるようにチャンクの大きさと同時に処理する数を決める。
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        print(f"動画を開けませんでした: {input_path}")
+        return False
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    
+    workers = workers or os.cpu_count() or 1
+    if warmup is None:
+        warmup = SMOOTHING_CONFIG["max_history"]
+    
+    # 処理中のフレーム数の上限（全ワーカーが動けるようにチャンクを小さくしてから、同時に処理するチャンク数を決める）
+    max_frames = max(1, max_memory_mb * 1024 * 1024 // (width * height * 3))
+    chunk_size = max(1, min(chunk_size, max_frames // workers))
+    max_pending = max(1, min(workers * 2, max_frames // chunk_size))
+    if max_pending < workers:
+        print(f"メモリの上限により {max_pending} チャンクずつ処理します（--max-memory で変更）")
+    
+    # フレーム数が取得できない場合は1チャンクで最後まで処理
+    if frame_count > 0:
+        tasks = [(input_path, start, min(start + chunk_size, frame_count), warmup, fps)
+                 for start in range(0, frame_count, chunk_size)]
+    else:
+        tasks = [(input_path, 0, None, warmup, fps)]
+    
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    landmark_writer = None
+    if landmarks_path:
+        landmark_writer = LandmarkStoreWriter(
+            landmarks_path, {"pose": DEFAULT_STREAMS["pose"]},
+            {"source": os.path.basename(input_path), "width": width, "height": height, "fps": fps})
+    written = 0
+    start_time = time.perf_counter()
+    
+    # 未完了のチャンク数を制限してメモリ使用量を抑える（上限は max_pending）
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(background,)) as pool:
+        pending = collections.deque()
+        task_iter = iter(tasks)
+        for task in task_iter:
+            pending.append(pool.apply_async(_process_chunk, (task,)))
+            if len(pending) >= max_pending:
+                break
+        
+        while pending:
+            start, frames, chunk_landmarks = pending.popleft().get()
+            for frame in frames:
+                writer.write(frame)
+            if landmark_writer:
+                landmark_writer.append_batch(
+                    np.arange(start, start + len(frames)), pose=chunk_landmarks)
+            written += len(frames)
+            
+            task = next(task_iter, None)
+            if task is not None:
+                pending.append(pool.apply_async(_process_chunk, (task,)))
+            
+            elapsed = time.perf_counter() - start_time
+            print(f"{written}/{frame_count or '?'} フレーム処理済み ({written / elapsed:.1f} fps)")
+    
+    writer.release()
+    
+    if landmark_writer:
+        landmark_writer.close()
+        print(f"ランドマークを保存しました: {landmarks_path}")
+    
+    print(f"動画を保存しました: {output_path}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="録画済み動画のバッチ処理")
+    parser.add_argument("input", help="入力動画ファイル")
+    parser.add_argument("-o", "--output", default="output.mp4", help="出力動画ファイル")
+    parser.add_argument("--landmarks", help="ランドマークの保存先ディレクトリ（landmark_store形式）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="ワーカープロセス数")
+    parser.add_argument("--chunk-size", type=int, default=64, help="1タスクあたりのフレーム数")
+    parser.add_argument("--warmup", type=int, default=None,
+                        help="スムーザーを温めるためにチャンク手前から読むフレーム数")
+    parser.add_argument("--background", choices=["black", "frame"], default="black",
+                        help="キャラクターを描く背景（黒 / 元フレーム）")
+    parser.add_argument("--max-memory", type=int, default=2048,
+                        help="処理中のフレームに使うメモリの上限（MB、超える場合はチャンクを小さくする）")
+    args = parser.parse_args()
+    
+    process_video(args.input, args.output, args.landmarks, args.workers,
+                  args.chunk_size, args.warmup, args.background, args.max_memory)
+
+if __name__ == "__main__":
+    main()
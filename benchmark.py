@@ -0,0 +1,228 @@
+# benchmark.py
+# 検出後のホットパス（スムージング・描画・UI・合成）のベンチマーク
+#
+# 記録済みのランドマーク（landmark.csv または landmark_store形式）と
+# testmovie.m4v のフレームを使い、各処理のスループット・レイテンシ分位点・
+# 1フレームあたりのメモリ確保量をJSONで出力する。
+import argparse
+import functools
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import cv2
+import numpy as np
+from landmark_store import LandmarkStore, convert_csv
+from landmarks import LandmarkArray
+
+def load_landmarks(path):
+    """ポーズのランドマーク列を読み込む（検出なしのフレームはNone）"""
+    if path.endswith(".csv"):
+        with tempfile.TemporaryDirectory(prefix="bench_") as temp_dir:
+            store_path = os.path.join(temp_dir, "landmarks")
+            convert_csv(path, store_path)
+            return load_landmarks(store_path)
+    poses = LandmarkStore(path)["pose"]
+    return [None if np.isnan(pose[0, 0]) else LandmarkArray(np.array(pose)) for pose in poses]
+
+def load_frames(path, limit=None):
+    """動画の全フレームをメモリに読み込む"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def make_segmentation_mask(landmarks, width, height):
+    """ランドマークの範囲から人物マスクの代用品を作る（MediaPipeを使わないため）"""
+    mask = np.zeros((height, width), dtype=np.float32)
+    if landmarks is not None:
+        points = np.clip(landmarks.array[:, :2], 0.0, 1.0) * (width, height)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        center = (int((x1 + x2) / 2), int((y1 + y2) / 2))
+        axes = (max(1, int((x2 - x1) / 2)), max(1, int((y2 - y1) / 2)))
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 1.0, -1)
+    return mask
+
+def measure(func, iterations, warmup=5):
+    """レイテンシ分布とメモリ確保量を計測"""
+    for i in range(warmup):
+        func(i)
+    
+    # レイテンシ（tracemallocなし）
+    durations = np.empty(iterations, dtype=np.float64)
+    total_start = time.perf_counter_ns()
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        func(i)
+        durations[i] = time.perf_counter_ns() - start
+    total_seconds = (time.perf_counter_ns() - total_start) / 1e9
+    
+    # メモリ確保量（1回ごとのピーク増加分）
+    alloc_iterations = min(iterations, 100)
+    alloc_bytes = np.empty(alloc_iterations, dtype=np.float64)
+    tracemalloc.start()
+    for i in range(alloc_iterations):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(i)
+        _, peak = tracemalloc.get_traced_memory()
+        alloc_bytes[i] = peak - before
+    tracemalloc.stop()
+    
+    durations_ms = durations / 1e6
+    return {
+        "iterations": iterations,
+        "throughput_per_sec": iterations / total_seconds,
+        "mean_ms": float(durations_ms.mean()),
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p95_ms": float(np.percentile(durations_ms, 95)),
+        "p99_ms": float(np.percentile(durations_ms, 99)),
+        "max_ms": float(durations_ms.max()),
+        "alloc_peak_bytes_per_frame": float(alloc_bytes.mean()),
+    }
+
+def bench_smoother(landmarks, frames, iterations):
+    """PoseSmoother.apply_smoothing"""
+    from pose_smoother import PoseSmoother
+    
+    poses = [lm for lm in landmarks if lm is not None]
+    smoother = PoseSmoother()
+    return measure(lambda i: smoother.apply_smoothing(poses[i % len(poses)], i / 30), iterations)
+
+def bench_character_renderer(landmarks, frames, iterations, backend="primitive"):
+    """CharacterRenderer.draw_character"""
+    from character_renderer import CharacterRenderer
+    
+    poses = [lm for lm in landmarks if lm is not None]
+    height, width = frames[0].shape[:2]
+    renderer = CharacterRenderer(backend=backend)
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    return measure(lambda i: renderer.draw_character(canvas, poses[i % len(poses)], width, height),
+                   iterations)
+
+def bench_ui_update(landmarks, frames, iterations):
+    """UIManager.create_canvas + UIManager.update"""
+    from ui_manager import UIManager
+    
+    height, width = frames[0].shape[:2]
+    ui_manager = UIManager()
+    
+    def run(i):
+        canvas = ui_manager.create_canvas(width, height)
+        ui_manager.update(canvas, frames[i % len(frames)], landmarks[i % len(landmarks)] is not None)
+    
+    return measure(run, iterations)
+
+def _load_test_module(width, height):
+    """test.py の合成関数を読み込む（標準ライブラリの test パッケージと区別するためファイルから読み込む）"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test.py")
+    spec = importlib.util.spec_from_file_location("app_test", path)
+    app_test = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_test)
+    
+    app_test.frame_width = width
+    app_test.frame_height = height
+    app_test.character_parts = app_test.load_character_parts()
+    return app_test
+
+def bench_compose_background(landmarks, frames, iterations, mode="roi"):
+    """test.compose_background"""
+    from compositing import BackgroundCompositor
+    
+    height, width = frames[0].shape[:2]
+    app_test = _load_test_module(width, height)
+    app_test.background_compositor = BackgroundCompositor(**{**app_test.BACKGROUND_CONFIG, "mode": mode})
+    background = cv2.resize(cv2.imread("backgrounds/tokyo_tower.png"), (width, height))
+    results = [
+        types.SimpleNamespace(segmentation_mask=make_segmentation_mask(lm, width, height))
+        for lm in landmarks
+    ]
+    count = min(len(frames), len(results))
+    return measure(
+        lambda i: app_test.compose_background(frames[i % count], background, results[i % count]),
+        iterations)
+
+def bench_image_character(landmarks, frames, iterations):
+    """test.draw_character（画像パーツのキャラクター合成）"""
+    height, width = frames[0].shape[:2]
+    app_test = _load_test_module(width, height)
+    results = [types.SimpleNamespace(pose_landmarks=lm) for lm in landmarks]
+    count = min(len(frames), len(results))
+    
+    # draw_character は入力フレームを書き換えるため、毎回コピーしてから渡す
+    output = np.empty_like(frames[0])
+    
+    def run(i):
+        np.copyto(output, frames[i % count])
+        app_test.draw_character(output, results[i % count])
+    
+    return measure(run, iterations)
+
+BENCHMARKS = {
+    "pose_smoother.apply_smoothing": bench_smoother,
+    "character_renderer.draw_character": bench_character_renderer,
+    "character_renderer.draw_character[sprite]": functools.partial(bench_character_renderer, backend="sprite"),
+    "ui_manager.update": bench_ui_update,
+    "test.compose_background": bench_compose_background,
+    "test.compose_background[full]": functools.partial(bench_compose_background, mode="full"),
+    "test.draw_character": bench_image_character,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="ホットパスのベンチマーク（結果はJSON）")
+    parser.add_argument("--landmarks", default="landmark.csv",
+                        help="ランドマーク（landmark.csv形式またはlandmark_storeディレクトリ）")
+    parser.add_argument("--video", default="testmovie.m4v", help="フレームを読み込む動画")
+    parser.add_argument("-n", "--iterations", type=int, default=1000, help="計測回数")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="実行するベンチマーク")
+    parser.add_argument("-o", "--output", help="JSONの出力先（省略時は標準出力）")
+    args = parser.parse_args()
+    
+    landmarks = load_landmarks(args.landmarks)
+    frames = load_frames(args.video)
+    if not frames:
+        print(f"動画を読み込めませんでした: {args.video}", file=sys.stderr)
+        return 1
+    
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "inputs": {
+            "landmarks": args.landmarks,
+            "landmark_frames": len(landmarks),
+            "video": args.video,
+            "video_frames": len(frames),
+            "frame_size": [frames[0].shape[1], frames[0].shape[0]],
+        },
+        "results": {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"実行中: {name}", file=sys.stderr)
+        report["results"][name] = BENCHMARKS[name](landmarks, frames, args.iterations)
+    
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,93 @@
 import cv2
 import numpy as np
 import math
+from collections import OrderedDict
+from landmarks import POSE_LANDMARK_INDEX, to_pixels
+
+# 描画に使うランドマークのインデックス
+NOSE = POSE_LANDMARK_INDEX["nose"]
+LEFT_EYE = POSE_LANDMARK_INDEX["left_eye"]
+RIGHT_EYE = POSE_LANDMARK_INDEX["right_eye"]
+BODY_POLYGON = tuple(POSE_LANDMARK_INDEX[name] for name in
+                     ("left_shoulder", "right_shoulder", "right_hip", "left_hip"))
+
+# 手足（関節の並び, 色のキー, 太さ）
+LIMBS = tuple(
+    (tuple(POSE_LANDMARK_INDEX[name] for name in joints), color_key, thickness)
+    for joints, color_key, thickness in (
+        (("left_shoulder", "left_elbow", "left_wrist"), "arms", 15),
+        (("right_shoulder", "right_elbow", "right_wrist"), "arms", 15),
+        (("left_hip", "left_knee", "left_ankle"), "legs", 20),
+        (("right_hip", "right_knee", "right_ankle"), "legs", 20),
+    )
+)
+
+class SpriteCache:
+    """スプライト（BGR画像・不透明マスク・中心位置）のLRUキャッシュ"""
+    
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, render_fn):
+        """キャッシュから取得（なければ render_fn で描画して追加）"""
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+        
+        self.misses += 1
+        sprite = render_fn()
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_size:
+            self.sprites.popitem(last=False)  # 最も長く使われていないものを破棄
+        return sprite
+    
+    def clear(self):
+        self.sprites.clear()
+
+def render_sprite(half_size, draw_fn):
+    """中心 (half_size, half_size) に描いた図形をスプライト化（描画範囲で切り詰める）"""
+    size = 2 * half_size + 1
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    center = (half_size, half_size)
+    
+    # 同じ図形を画像とマスクの両方に描く
+    draw_fn(image, center, None)
+    draw_fn(mask, center, 255)
+    
+    ys, xs = np.nonzero(mask)
+    if len(ys) == 0:
+        return None
+    y1, y2, x1, x2 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    return (image[y1:y2, x1:x2].copy(), mask[y1:y2, x1:x2].copy(),
+            (half_size - x1, half_size - y1))
+
+def blit_sprite(canvas, sprite, center):
+    """スプライトをマスク付きでキャンバスに貼り付け（はみ出す部分は切り取る）"""
+    if sprite is None:
+        return
+    image, mask, (anchor_x, anchor_y) = sprite
+    sprite_h, sprite_w = mask.shape
+    canvas_h, canvas_w = canvas.shape[:2]
+    x1 = center[0] - anchor_x
+    y1 = center[1] - anchor_y
+    
+    # キャンバスとの重なり部分
+    cx1, cy1 = max(x1, 0), max(y1, 0)
+    cx2, cy2 = min(x1 + sprite_w, canvas_w), min(y1 + sprite_h, canvas_h)
+    if cx1 >= cx2 or cy1 >= cy2:
+        return
+    sx1, sy1 = cx1 - x1, cy1 - y1
+    sx2, sy2 = sx1 + (cx2 - cx1), sy1 + (cy2 - cy1)
+    cv2.copyTo(image[sy1:sy2, sx1:sx2], mask[sy1:sy2, sx1:sx2], canvas[cy1:cy2, cx1:cx2])
 
 class CharacterRenderer:
-    def __init__(self):
+    def __init__(self, backend="primitive", sprite_cache_size=64, size_quantum=1):
         # カラースキームの初期化
         self.color_schemes = [
             {  # デフォルト
@@ -34,122 +118,98 @@ class CharacterRenderer:
         
         self.current_scheme = 0
         self.colors = self.color_schemes[self.current_scheme]
+        
+        # 描画方式（"primitive": 毎フレーム図形を描画 / "sprite": 事前描画した画像を貼り付け）
+        if backend not in ("primitive", "sprite"):
+            raise ValueError(f"未知の描画方式です: {backend}")
+        self.backend = backend
+        self.sprite_cache = SpriteCache(sprite_cache_size)
+        self.size_quantum = max(1, int(size_quantum))  # head_sizeの量子化幅（ピクセル）
     
     def next_color_scheme(self):
         """次のカラースキームに切り替え"""
         self.current_scheme = (self.current_scheme + 1) % len(self.color_schemes)
         self.colors = self.color_schemes[self.current_scheme]
     
-    def draw_character(self, canvas, landmarks, width, height):
-        """キャラクターを描画"""
-        # インデックスマッピング
-        nose = landmarks.landmark[0]
-        left_eye = landmarks.landmark[2]
-        right_eye = landmarks.landmark[5]
-        left_shoulder = landmarks.landmark[11]
-        right_shoulder = landmarks.landmark[12]
-        left_elbow = landmarks.landmark[13]
-        right_elbow = landmarks.landmark[14]
-        left_wrist = landmarks.landmark[15]
-        right_wrist = landmarks.landmark[16]
-        left_hip = landmarks.landmark[23]
-        right_hip = landmarks.landmark[24]
-        left_knee = landmarks.landmark[25]
-        right_knee = landmarks.landmark[26]
-        left_ankle = landmarks.landmark[27]
-        right_ankle = landmarks.landmark[28]
-        
-        # 座標変換関数
-        def transform_x(x):
-            return int(x * width)
+    def draw_character(self, canvas, landmarks, width, height, scheme=None):
+        """キャラクターを描画（scheme: 使うカラースキームの番号、省略時は現在のスキーム）"""
+        scheme = self.current_scheme if scheme is None else scheme % len(self.color_schemes)
+        colors = self.color_schemes[scheme]
         
-        def transform_y(y):
-            return int(y * height)
+        # 全ランドマークのピクセル座標を一括で求める
+        pixels = to_pixels(landmarks, width, height).tolist()
+        nose = tuple(pixels[NOSE])
+        left_eye = pixels[LEFT_EYE]
+        right_eye = pixels[RIGHT_EYE]
         
         # 頭を描画
         head_size = max(
             int(math.sqrt(
-                (transform_x(left_eye.x) - transform_x(right_eye.x))**2 +
-                (transform_y(left_eye.y) - transform_y(right_eye.y))**2
+                (left_eye[0] - right_eye[0])**2 +
+                (left_eye[1] - right_eye[1])**2
             ) * 5),
             30
         )
-        cv2.circle(
-            canvas, 
-            (transform_x(nose.x), transform_y(nose.y)), 
-            head_size, 
-            self.colors['head'], 
-            -1
-        )
-        cv2.circle(
-            canvas, 
-            (transform_x(nose.x), transform_y(nose.y)), 
-            head_size, 
-            (0, 0, 0), 
-            2
-        )
+        if self.backend == "sprite":
+            head_size = self._quantize_size(head_size)
+            blit_sprite(canvas, self._head_sprite(scheme, head_size), nose)
+        else:
+            self._draw_head(canvas, nose, head_size, colors['head'])
         
         # 体を描画
-        body_points = np.array([
-            [transform_x(left_shoulder.x), transform_y(left_shoulder.y)],
-            [transform_x(right_shoulder.x), transform_y(right_shoulder.y)],
-            [transform_x(right_hip.x), transform_y(right_hip.y)],
-            [transform_x(left_hip.x), transform_y(left_hip.y)]
-        ], np.int32)
-        cv2.fillPoly(canvas, [body_points], self.colors['body'])
+        body_points = np.array([pixels[index] for index in BODY_POLYGON], np.int32)
+        cv2.fillPoly(canvas, [body_points], colors['body'])
         cv2.polylines(canvas, [body_points], True, (0, 0, 0), 2)
         
-        # 左腕を描画（ベジェ曲線近似）
-        self._draw_limb(
-            canvas,
-            [(transform_x(left_shoulder.x), transform_y(left_shoulder.y)),
-             (transform_x(left_elbow.x), transform_y(left_elbow.y)),
-             (transform_x(left_wrist.x), transform_y(left_wrist.y))],
-            self.colors['arms'],
-            thickness=15
-        )
-        
-        # 右腕を描画
-        self._draw_limb(
-            canvas,
-            [(transform_x(right_shoulder.x), transform_y(right_shoulder.y)),
-             (transform_x(right_elbow.x), transform_y(right_elbow.y)),
-             (transform_x(right_wrist.x), transform_y(right_wrist.y))],
-            self.colors['arms'],
-            thickness=15
-        )
-        
-        # 左脚を描画
-        self._draw_limb(
-            canvas,
-            [(transform_x(left_hip.x), transform_y(left_hip.y)),
-             (transform_x(left_knee.x), transform_y(left_knee.y)),
-             (transform_x(left_ankle.x), transform_y(left_ankle.y))],
-            self.colors['legs'],
-            thickness=20
-        )
-        
-        # 右脚を描画
-        self._draw_limb(
-            canvas,
-            [(transform_x(right_hip.x), transform_y(right_hip.y)),
-             (transform_x(right_knee.x), transform_y(right_knee.y)),
-             (transform_x(right_ankle.x), transform_y(right_ankle.y))],
-            self.colors['legs'],
-            thickness=20
-        )
-        
-        # 目を描画
-        cv2.circle(canvas, (transform_x(left_eye.x), transform_y(left_eye.y)), head_size//6, (0, 0, 0), -1)
-        cv2.circle(canvas, (transform_x(right_eye.x), transform_y(right_eye.y)), head_size//6, (0, 0, 0), -1)
+        # 腕と脚を描画（ベジェ曲線近似）
+        for indices, color_key, thickness in LIMBS:
+            self._draw_limb(
+                canvas,
+                [tuple(pixels[index]) for index in indices],
+                colors[color_key],
+                thickness=thickness
+            )
         
-        # 鼻を描画
-        cv2.circle(canvas, (transform_x(nose.x), transform_y(nose.y)), head_size//8, (0, 0, 255), -1)
+        # 目を描画（小さい円は貼り付けより直接描く方が速い）
+        cv2.circle(canvas, tuple(left_eye), head_size//6, (0, 0, 0), -1)
+        cv2.circle(canvas, tuple(right_eye), head_size//6, (0, 0, 0), -1)
         
-        # 笑顔を描画
-        smile_center = (transform_x(nose.x), transform_y(nose.y) + head_size//3)
+        # 鼻と笑顔を描画
+        if self.backend == "sprite":
+            blit_sprite(canvas, self._face_sprite(head_size), nose)
+        else:
+            self._draw_face(canvas, nose, head_size)
+    
+    def _quantize_size(self, size):
+        """スプライトの種類を抑えるため head_size を量子化"""
+        return int(round(size / self.size_quantum)) * self.size_quantum
+    
+    def _draw_head(self, canvas, center, head_size, head_color, color=None):
+        """頭（塗りつぶしと輪郭）"""
+        cv2.circle(canvas, center, head_size, head_color if color is None else color, -1)
+        cv2.circle(canvas, center, head_size, (0, 0, 0) if color is None else color, 2)
+    
+    def _draw_face(self, canvas, nose_center, head_size, color=None):
+        """鼻と笑顔（鼻の位置が基準）"""
+        cv2.circle(canvas, nose_center, head_size//8, (0, 0, 255) if color is None else color, -1)
+        smile_center = (nose_center[0], nose_center[1] + head_size//3)
         axes = (head_size//2, head_size//4)
-        cv2.ellipse(canvas, smile_center, axes, 0, 0, 180, (0, 0, 0), 2)
+        cv2.ellipse(canvas, smile_center, axes, 0, 0, 180, (0, 0, 0) if color is None else color, 2)
+    
+    def _head_sprite(self, scheme, head_size):
+        """頭のスプライト（カラースキームごと）"""
+        head_color = self.color_schemes[scheme]['head']
+        return self.sprite_cache.get(
+            ("head", scheme, head_size),
+            lambda: render_sprite(head_size + 2, lambda image, center, color:
+                                  self._draw_head(image, center, head_size, head_color, color)))
+    
+    def _face_sprite(self, head_size):
+        """鼻と笑顔のスプライト"""
+        return self.sprite_cache.get(
+            ("face", head_size),
+            lambda: render_sprite(head_size + 2, lambda image, center, color:
+                                  self._draw_face(image, center, head_size, color)))
     
     def _draw_limb(self, canvas, points, color, thickness=10):
         """関節を線で描画（ベジェ曲線の簡易近似）"""
@@ -0,0 +1,136 @@
+# character_rig.py
+# 画像パーツのキャラクターを骨格に合わせて配置する2Dリグ
+#
+# 各パーツは「画像上の基準点2つ」を「ランドマーク上の点2つ」に重ねる相似変換
+# （拡大縮小・回転・平行移動）1回で配置する。画像とアルファは乗算済みBGRAとして
+# 1回のwarpAffineで変形し、出力はパーツが収まる矩形だけに限定する。
+import os
+import cv2
+import numpy as np
+from compositing import Sprite, composite, premultiply
+from landmarks import POSE_LANDMARK_INDEX, landmarks_to_array, to_pixels
+
+# パーツの定義（描画順）
+#   name: パーツ名
+#   image: character_parts/ の画像名
+#   crop: 画像から切り出す範囲 (x0, y0, x1, y1)（幅・高さに対する割合）
+#   anchors: 画像上の基準点2つ（幅・高さに対する割合）
+#   joints: 基準点に対応するランドマーク（複数指定したものは中点）
+RIG_PARTS = (
+    {"name": "right_thigh", "image": "right_leg", "crop": (0.0, 0.0, 1.0, 0.46),
+     "anchors": ((0.75, 0.0), (0.63, 0.42)), "joints": (("right_hip",), ("right_knee",))},
+    {"name": "right_shin", "image": "right_leg", "crop": (0.0, 0.38, 1.0, 1.0),
+     "anchors": ((0.63, 0.42), (0.54, 0.85)), "joints": (("right_knee",), ("right_ankle",))},
+    {"name": "left_thigh", "image": "left_leg", "crop": (0.0, 0.0, 1.0, 0.45),
+     "anchors": ((0.05, 0.0), (0.23, 0.41)), "joints": (("left_hip",), ("left_knee",))},
+    {"name": "left_shin", "image": "left_leg", "crop": (0.0, 0.37, 1.0, 1.0),
+     "anchors": ((0.23, 0.41), (0.44, 0.83)), "joints": (("left_knee",), ("left_ankle",))},
+    {"name": "body", "image": "body", "crop": (0.22, 0.0, 0.78, 0.40),
+     "anchors": ((0.49, 0.06), (0.49, 0.37)),
+     "joints": (("left_shoulder", "right_shoulder"), ("left_hip", "right_hip"))},
+    {"name": "right_upper_arm", "image": "right_arm", "crop": (0.0, 0.0, 1.0, 0.42),
+     "anchors": ((0.9, 0.02), (0.7, 0.38)), "joints": (("right_shoulder",), ("right_elbow",))},
+    {"name": "right_forearm", "image": "right_arm", "crop": (0.0, 0.34, 1.0, 1.0),
+     "anchors": ((0.7, 0.38), (0.46, 0.75)), "joints": (("right_elbow",), ("right_wrist",))},
+    {"name": "left_upper_arm", "image": "left_arm", "crop": (0.0, 0.0, 1.0, 0.44),
+     "anchors": ((0.07, 0.03), (0.26, 0.4)), "joints": (("left_shoulder",), ("left_elbow",))},
+    {"name": "left_forearm", "image": "left_arm", "crop": (0.0, 0.36, 1.0, 1.0),
+     "anchors": ((0.26, 0.4), (0.57, 0.78)), "joints": (("left_elbow",), ("left_wrist",))},
+    {"name": "head", "image": "head", "crop": (0.0, 0.0, 1.0, 1.0),
+     "anchors": ((0.4, 0.66), (0.61, 0.66)), "joints": (("right_eye",), ("left_eye",))},
+)
+
+PART_IMAGES = ("head", "body", "right_arm", "left_arm", "right_leg", "left_leg")
+
+class CharacterRig:
+    def __init__(self, images, parts=RIG_PARTS, min_visibility=0.5):
+        # images: 画像名 → BGR/BGRA画像（ない画像を使うパーツは描画しない）
+        self.min_visibility = min_visibility
+        self.parts = []
+        joints = []
+        for part in parts:
+            image = images.get(part["image"])
+            if image is None:
+                continue
+            height, width = image.shape[:2]
+            x0, y0, x1, y1 = part["crop"]
+            cx0, cy0 = int(x0 * width), int(y0 * height)
+            cx1, cy1 = int(round(x1 * width)), int(round(y1 * height))
+            
+            # 切り出した画像内での基準点（複素数で持つと相似変換が1回の割り算で求まる）
+            (ax0, ay0), (ax1, ay1) = part["anchors"]
+            self.parts.append({
+                "name": part["name"],
+                "bgra": premultiply(image[cy0:cy1, cx0:cx1]),
+                "source": (complex(ax0 * width - cx0, ay0 * height - cy0),
+                           complex(ax1 * width - cx0, ay1 * height - cy0)),
+            })
+            joints.extend(part["joints"])
+        
+        # 全パーツの基準点をランドマークから一度に求めるための重み行列（(パーツ数 * 2, 33)）
+        self.joint_weights = np.zeros((len(joints), len(POSE_LANDMARK_INDEX)), dtype=np.float64)
+        for row, joint_names in enumerate(joints):
+            for name in joint_names:
+                self.joint_weights[row, POSE_LANDMARK_INDEX[name]] = 1.0 / len(joint_names)
+        self.joint_used = self.joint_weights > 0
+    
+    @classmethod
+    def load(cls, folder="character_parts", prefix="", **kwargs):
+        """フォルダからパーツ画像（{prefix}{画像名}.png）を読み込む"""
+        images = {}
+        for name in PART_IMAGES:
+            path = os.path.join(folder, f"{prefix}{name}.png")
+            if os.path.exists(path):
+                images[name] = cv2.imread(path, cv2.IMREAD_UNCHANGED)  # アルファチャンネルも読み込む
+        return cls(images, **kwargs)
+    
+    def __len__(self):
+        return len(self.parts)
+    
+    def draw(self, image, landmarks):
+        """ランドマークに合わせて全パーツを image に直接合成"""
+        if not self.parts:
+            return image
+        height, width = image.shape[:2]
+        points = landmarks_to_array(landmarks)
+        
+        # 全パーツの基準点（中点を含む）と可視度をまとめて計算
+        targets = self.joint_weights @ to_pixels(points, width, height)
+        targets = (targets[:, 0] + 1j * targets[:, 1]).reshape(-1, 2)
+        visibility = np.where(self.joint_used, points[:, 3], np.inf).min(axis=1).reshape(-1, 2).min(axis=1)
+        
+        for part, (target0, target1), visible in zip(self.parts, targets, visibility):
+            if visible < self.min_visibility:
+                continue
+            self._draw_part(image, part, target0, target1)
+        return image
+    
+    def _draw_part(self, image, part, target0, target1):
+        """1パーツを相似変換で変形して合成"""
+        source0, source1 = part["source"]
+        if source1 == source0 or target1 == target0:
+            return
+        
+        # source → target の相似変換（z' = a * z + b）
+        a = (target1 - target0) / (source1 - source0)
+        b = target0 - a * source0
+        
+        # 変形後のパーツが収まる矩形（画面内に限定）
+        part_h, part_w = part["bgra"].shape[:2]
+        corners = a * np.array([0, part_w, part_h * 1j, part_w + part_h * 1j]) + b
+        height, width = image.shape[:2]
+        x1 = max(int(np.floor(corners.real.min())), 0)
+        y1 = max(int(np.floor(corners.imag.min())), 0)
+        x2 = min(int(np.ceil(corners.real.max())) + 1, width)
+        y2 = min(int(np.ceil(corners.imag.max())) + 1, height)
+        if x1 >= x2 or y1 >= y2:
+            return
+        
+        # 矩形の左上を原点とした変換行列で、BGRAを1回で変形
+        matrix = np.array([
+            [a.real, -a.imag, b.real - x1],
+            [a.imag, a.real, b.imag - y1],
+        ])
+        warped = cv2.warpAffine(part["bgra"], matrix, (x2 - x1, y2 - y1),
+                                flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        composite(image, Sprite.from_bgra(warped), x1, y1)
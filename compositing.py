@@ -0,0 +1,198 @@
+# compositing.py
+# 乗算済みアルファの整数演算による画像合成（パーツの外接矩形だけを処理する）
+import cv2
+import numpy as np
+
+class Sprite:
+    """乗算済みアルファ形式の画像
+    
+    premultiplied は BGR * alpha / 255（uint8）、alpha は1チャンネル（uint8）。
+    不透明度0の周囲は切り詰め、元画像内での位置を offset に保持する。
+    """
+    
+    def __init__(self, premultiplied, alpha, offset=(0, 0), size=None):
+        self.premultiplied = premultiplied
+        self.alpha = alpha
+        self.offset = offset  # 元画像内での左上位置 (x, y)
+        self.size = size or (alpha.shape[1], alpha.shape[0])  # 元画像のサイズ (幅, 高さ)
+        self.inverse_alpha = (255 - alpha)[:, :, np.newaxis]  # 合成時にチャンネル方向へブロードキャスト
+        self.opaque = alpha.size > 0 and alpha.min() == 255  # 全面不透明なら合成せずコピーする
+    
+    @classmethod
+    def from_image(cls, image):
+        """BGR（不透明）またはBGRA画像から生成"""
+        height, width = image.shape[:2]
+        bgra = premultiply(image)
+        
+        # 不透明度0の周囲を切り詰める
+        x, y, w, h = cv2.boundingRect(bgra[:, :, 3])
+        bgra = bgra[y:y + h, x:x + w]
+        return cls(bgra[:, :, :3], bgra[:, :, 3], (x, y), (width, height))
+    
+    @classmethod
+    def from_bgra(cls, bgra, offset=(0, 0)):
+        """乗算済みのBGRA画像（warpAffine の結果など）から生成（コピーしない）"""
+        return cls(bgra[:, :, :3], bgra[:, :, 3], offset)
+
+def premultiply(image):
+    """BGR（不透明）・BGRA・グレースケール画像を乗算済みアルファのBGRA（uint8）に変換"""
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)  # アルファ255で乗算は不要
+    
+    bgra = image.astype(np.uint16)
+    bgra[:, :, :3] *= bgra[:, :, 3:]
+    _divide_255(bgra[:, :, :3])
+    return bgra.astype(np.uint8)
+
+def _divide_255(values):
+    """uint16 の値を255で割って四捨五入（0〜65025の範囲で正確）"""
+    values += 128
+    values += values >> 8
+    values >>= 8
+    return values
+
+def composite(dst, sprite, x, y):
+    """スプライトを dst に重ねる（x, y は元画像の左上の位置、dst を直接書き換える）
+    
+    out = src + dst * (255 - alpha) / 255
+    """
+    x += sprite.offset[0]
+    y += sprite.offset[1]
+    sprite_h, sprite_w = sprite.alpha.shape
+    dst_h, dst_w = dst.shape[:2]
+    
+    # 画面との重なり部分だけを処理
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + sprite_w, dst_w), min(y + sprite_h, dst_h)
+    if x1 >= x2 or y1 >= y2:
+        return dst
+    sx1, sy1 = x1 - x, y1 - y
+    sx2, sy2 = sx1 + (x2 - x1), sy1 + (y2 - y1)
+    
+    roi = dst[y1:y2, x1:x2]
+    if sprite.opaque:
+        roi[...] = sprite.premultiplied[sy1:sy2, sx1:sx2]
+        return dst
+    
+    blended = roi.astype(np.uint16)
+    blended *= sprite.inverse_alpha[sy1:sy2, sx1:sx2]
+    _divide_255(blended)
+    blended += sprite.premultiplied[sy1:sy2, sx1:sx2]
+    roi[...] = blended
+    return dst
+
+class BackgroundCompositor:
+    """セグメンテーションマスクで人物を切り抜いて背景に重ねる
+    
+    mode="full" はフレームとマスクを背景の大きさに拡大して全画素を選択する。
+    mode="roi" はマスクを低解像度のまま扱い、人物の外接矩形（余白付き）の中だけ
+    マスクを拡大してぼかした境界で合成する。矩形の外は背景をそのままコピーする。
+    """
+    
+    def __init__(self, mode="roi", threshold=0.1, feather=0.2, mask_size=256, margin=2,
+                 temporal_smoothing=0.0):
+        self.mode = mode
+        self.threshold = threshold  # 人物とみなすマスクの値
+        self.feather = feather  # 境界をぼかすマスク値の幅（0なら二値）
+        self.mask_size = mask_size  # マスクを扱う解像度（長辺のピクセル数、これより大きければ縮小）
+        self.margin = margin  # 外接矩形の周囲に加える余白（低解像度マスクのピクセル数）
+        self.temporal_smoothing = temporal_smoothing  # 前フレームのマスクを残す割合（0なら平滑化しない）
+        self.mask = None  # 時間方向に平滑化した低解像度マスク
+        self.output = None  # 合成結果のバッファ（毎フレーム再利用）
+    
+    def reset(self):
+        """時間方向の平滑化をリセット"""
+        self.mask = None
+    
+    def compose(self, frame, background, mask):
+        """合成結果を返す（返す配列は次の呼び出しで上書きされる）"""
+        if self.output is None or self.output.shape != background.shape:
+            self.output = np.empty_like(background)
+        if self.mode == "full":
+            return self._compose_full(frame, background, mask)
+        return self._compose_roi(frame, background, mask)
+    
+    def _compose_full(self, frame, background, mask):
+        """フレームとマスクを背景の大きさに拡大して全画素を合成"""
+        height, width = background.shape[:2]
+        frame = cv2.resize(frame, (width, height))
+        mask = cv2.resize(self._smooth(mask), (width, height))
+        np.copyto(self.output, background)
+        np.copyto(self.output, frame, where=(mask > self.threshold)[:, :, np.newaxis])
+        return self.output
+    
+    def _smooth(self, mask):
+        """時間方向の平滑化（指数移動平均）"""
+        if self.temporal_smoothing <= 0:
+            return mask
+        if self.mask is None or self.mask.shape != mask.shape:
+            self.mask = mask.astype(np.float32)
+        else:
+            cv2.accumulateWeighted(mask, self.mask, 1.0 - self.temporal_smoothing)
+        return self.mask
+    
+    def _compose_roi(self, frame, background, mask):
+        """人物の外接矩形の中だけを合成"""
+        output = self.output
+        np.copyto(output, background)
+        out_h, out_w = output.shape[:2]
+        
+        # マスクはモデルの解像度（mask_size 以下）のまま扱う
+        mask_h, mask_w = mask.shape[:2]
+        scale = self.mask_size / max(mask_h, mask_w)
+        if scale < 1.0:
+            mask_w, mask_h = max(1, round(mask_w * scale)), max(1, round(mask_h * scale))
+            mask = cv2.resize(mask, (mask_w, mask_h), interpolation=cv2.INTER_AREA)
+        mask = self._smooth(mask)
+        
+        # 境界のぼかしは低解像度で不透明度に変換しておき、拡大時の線形補間で滑らかにする
+        if self.feather > 0:
+            lower = self.threshold - self.feather / 2
+            alpha = np.clip((mask - lower) * (1.0 / self.feather), 0.0, 1.0).astype(np.float32)
+            foreground = alpha > 0
+        else:
+            alpha = mask
+            foreground = mask > self.threshold
+        
+        # 人物の外接矩形（余白付き）を出力画像の座標に変換
+        x, y, w, h = cv2.boundingRect(foreground.view(np.uint8))
+        if w == 0 or h == 0:
+            return output
+        scale_x, scale_y = out_w / mask_w, out_h / mask_h
+        x1 = max(int((x - self.margin) * scale_x), 0)
+        y1 = max(int((y - self.margin) * scale_y), 0)
+        x2 = min(int(np.ceil((x + w + self.margin) * scale_x)), out_w)
+        y2 = min(int(np.ceil((y + h + self.margin) * scale_y)), out_h)
+        if x1 >= x2 or y1 >= y2:
+            return output
+        size = (x2 - x1, y2 - y1)
+        
+        # 矩形の中だけマスクを拡大（cv2.resize と同じ画素中心の対応）
+        alpha = cv2.warpAffine(alpha, _roi_resize_matrix(scale_x, scale_y, x1, y1), size,
+                               flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                               borderMode=cv2.BORDER_REPLICATE)
+        
+        # フレームも背景と大きさが違えば矩形の中だけ拡大
+        frame_h, frame_w = frame.shape[:2]
+        if (frame_w, frame_h) == (out_w, out_h):
+            frame_roi = frame[y1:y2, x1:x2]
+        else:
+            frame_roi = cv2.warpAffine(frame, _roi_resize_matrix(out_w / frame_w, out_h / frame_h, x1, y1),
+                                       size, flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                       borderMode=cv2.BORDER_REPLICATE)
+        
+        roi = output[y1:y2, x1:x2]
+        if self.feather > 0:
+            roi[...] = cv2.blendLinear(frame_roi, roi, alpha, 1.0 - alpha)
+        else:
+            cv2.copyTo(frame_roi, (alpha > self.threshold).view(np.uint8), roi)
+        return output
+
+def _roi_resize_matrix(scale_x, scale_y, x1, y1):
+    """拡大後の画像の (x1, y1) から始まる矩形 → 元画像 の座標変換（cv2.resize と同じ対応）"""
+    return np.array([
+        [1.0 / scale_x, 0.0, (x1 + 0.5) / scale_x - 0.5],
+        [0.0, 1.0 / scale_y, (y1 + 0.5) / scale_y - 0.5],
+    ])
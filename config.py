@@ -3,17 +3,63 @@
 
 # 姿勢検出の設定
 POSE_DETECTION_CONFIG = {
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+    # ROIモード（前フレームの人物領域だけを切り出して推論）
+    "roi_mode": False,
+    "roi_padding": 0.25,  # 人物領域の周囲に加える余白（辺の長さに対する割合）
+    "roi_min_visibility": 0.5,  # 領域計算に使うランドマークの可視度の下限
+    "roi_min_size": 96,  # ROIの最小サイズ（ピクセル）
+    "inference_size": 480  # ROIモードでの推論画像の長辺の上限（ピクセル）
+}
+
+# 検出プロファイル（test.py、モードごとに必要なモデルだけを動かす）
+DETECTION_PROFILES = {
+    "pose": {"segmentation": False, "hands": False, "face": False, "model_complexity": 1},
+    "pose_segmentation": {"segmentation": True, "hands": False, "face": False, "model_complexity": 1},
+    "pose_hands": {"segmentation": False, "hands": True, "face": False, "model_complexity": 1},
+    "holistic": {"segmentation": True, "hands": True, "face": True, "model_complexity": 1}
+}
+
+DETECTION_CONFIG = {
+    "profile": "pose_segmentation",  # 起動時のプロファイル（Mキーで切替）
+    "hands_interval": 2,  # 手のモデルを動かす間隔（フレーム数）
+    "face_interval": 3,  # 顔のモデルを動かす間隔（フレーム数）
     "min_detection_confidence": 0.5,
     "min_tracking_confidence": 0.5
 }
 
+# 複数人モードの設定（MediaPipe Tasks の PoseLandmarker を使用）
+MULTI_PERSON_CONFIG = {
+    "enabled": False,
+    "model_asset_path": "models/pose_landmarker_full.task",
+    "num_poses": 4,  # 同時に検出・描画する最大人数
+    "min_presence_confidence": 0.5,
+    "max_match_distance": 0.1,  # 同一人物とみなすランドマーク間の平均距離（正規化座標）
+    "max_missed_frames": 5  # 検出されなくてもトラックを保持するフレーム数
+}
+
 # スムージングの設定
 SMOOTHING_CONFIG = {
     "max_history": 15,
     "default_smoothing_factor": 0.8,
     "min_smoothing_factor": 0.0,
     "max_smoothing_factor": 0.95,
-    "smoothing_step": 0.05
+    "smoothing_step": 0.05,
+    # フィルタの種類: "weighted_average" / "one_euro" / "kalman"
+    "filter_type": "weighted_average",
+    # フィルタごとのパラメータ（default_smoothing_factor のときの値）
+    "filter_params": {
+        "one_euro": {
+            "min_cutoff": 1.0,  # 静止時のカットオフ周波数(Hz)
+            "beta": 10.0,  # 速度に対するカットオフの増加率
+            "d_cutoff": 1.0  # 速度推定のカットオフ周波数(Hz)
+        },
+        "kalman": {
+            "process_noise": 10.0,  # 加速度の分散
+            "measurement_noise": 1e-4  # 観測ノイズの分散
+        }
+    }
 }
 
 # UI設定
@@ -29,3 +75,92 @@ CAMERA_CONFIG = {
     "width": 640,
     "height": 480
 }
+
+# パイプライン設定（キャプチャ・検出・描画の並列化）
+PIPELINE_CONFIG = {
+    "enabled": False,
+    "queue_size": 1,  # 各ステージ間のキュー長（最新フレーム優先）
+    "stats_interval": 5.0  # ステージ統計の出力間隔（秒、0で無効）
+}
+
+# 適応的な検出の間引き設定
+ADAPTIVE_SKIP_CONFIG = {
+    "enabled": False,
+    "frame_budget_ms": 33.3,  # 1フレームあたりの処理時間の目標（ミリ秒）
+    "max_interval": 4,  # 検出を間引く最大間隔（フレーム）
+    "max_extrapolation": 0.2  # ランドマークを外挿する最大時間（秒）
+}
+
+# キャラクター描画設定
+RENDER_CONFIG = {
+    "backend": "primitive",  # "primitive"（毎フレーム図形を描画）または "sprite"（頭部を事前描画して貼り付け、数ピクセル異なる）
+    "sprite_cache_size": 64,  # キャッシュするスプライト数の上限（LRUで破棄）
+    "size_quantum": 1  # 頭の大きさの量子化幅（ピクセル、2以上にすると頭の大きさが丸められる）
+}
+
+# 処理時間の計測設定
+METRICS_CONFIG = {
+    "enabled": False,
+    "window": 300,  # 分位点の計算に使う直近のフレーム数
+    "export_path": None,  # 出力ファイル（例: "metrics.prom" / "metrics.jsonl"）
+    "export_format": "prometheus",  # "prometheus" または "jsonl"
+    "export_interval": 5.0,  # ファイル出力の間隔（秒）
+    "http_port": None,  # ローカルHTTPエンドポイントのポート（例: 9100）
+    "overlay": False  # 起動時に処理時間をキャンバスに表示するか（Tキーで切替）
+}
+
+# 画像アセット（背景・キャラクター・キャラクターパーツ）の読み込み設定
+ASSET_CONFIG = {
+    "root": ".",  # backgrounds/ characters/ character_parts/ があるフォルダ
+    "cache_size": 32,  # キャッシュする画像（解像度別）の数の上限（LRUで破棄）
+    "preload": True  # 起動時にバックグラウンドで全画像を読み込んでおくか
+}
+
+# 背景合成の設定（test.py）
+BACKGROUND_CONFIG = {
+    "mode": "roi",  # "roi"（人物の周囲だけ合成）または "full"（全画素を合成）
+    "threshold": 0.1,  # 人物とみなすセグメンテーションマスクの値
+    "feather": 0.2,  # 境界をぼかすマスク値の幅（0なら二値）
+    "mask_size": 256,  # マスクを扱う解像度（長辺のピクセル数）
+    "margin": 2,  # 人物の外接矩形に加える余白（マスクのピクセル数）
+    "temporal_smoothing": 0.0  # 前フレームのマスクを残す割合（0〜1、ちらつき軽減）
+}
+
+# ジェスチャー分類の設定（gesture.py で学習したモデルを使用）
+GESTURE_CONFIG = {
+    "enabled": False,  # ジェスチャーでコマンドを実行するか（--gestures でも有効化）
+    "model_path": "models/gesture_svc.npz",  # 学習済みモデル（python gesture.py で作成）
+    "data_dir": "trainimgdata",  # 学習データ（<ラベル>/<画像>）
+    "feature_cache": "models/gesture_features.npz",  # 特徴量キャッシュ（画像ファイルのハッシュと抽出の設定がキー）
+    # ジェスチャー名 → キー入力と同じアクション名
+    "commands": {
+        "rock": "reset_history",
+        "paper": "change_color",
+        "scissors": "next_filter"
+    },
+    "interval": 3,  # 手の検出・分類を行う間隔（フレーム数）
+    "window": 8,  # 多数決に使う直近の分類回数
+    "min_votes": 6,  # コマンドを発行するのに必要な同じ分類結果の数
+    "min_score": 0.75,  # 分類結果として採用する得票率の下限
+    "cooldown": 1.0,  # コマンドを発行してから次を発行するまでの最短時間（秒）
+    "model_complexity": 0  # 手の検出モデルの複雑さ（0または1）
+}
+
+# 描画結果の書き出し設定（--export PATH、拡張子 .gif なら GIF、それ以外は動画）
+EXPORT_CONFIG = {
+    "path": None,  # 出力ファイル（例: "out.gif" / "out.mp4"）
+    "gif_fps": 10.0,  # GIF に書き出す最大フレームレート（超える分は間引く）
+    "video_fps": 30.0,  # 動画のフレームレート
+    "palette": "adaptive",  # GIF の共有パレット（"adaptive": 最初のフレームの代表色、"uniform": 均等な色）
+    "loop": 0,  # GIF の繰り返し回数（0で無限）
+    "queue_size": 8,  # 書き出し待ちのフレーム数の上限（超えたら古いものから破棄）
+    "fourcc": "mp4v",  # 動画のコーデック
+    "image_pattern": "tmpimages/*.png"  # python exporter.py で書き出す連番画像
+}
+
+# マルチプロセス構成の設定（--multiprocess、キャプチャ+検出と描画を別プロセスで実行）
+SHARED_PIPELINE_CONFIG = {
+    "ring_slots": 8,  # 共有メモリのリングバッファのスロット数（描画が遅れても上書きされるまでの猶予）
+    "poll_interval": 0.001,  # 描画プロセスが新しいスロットを確認する間隔（秒）
+    "ready_timeout": 30.0  # 描画プロセスの起動を待つ時間（秒）
+}
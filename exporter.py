@@ -0,0 +1,419 @@
+# exporter.py
+# 描画済みのキャンバスを MP4 または GIF アニメーションに逐次書き出す
+#
+# フレームは書き出しスレッドで1枚ずつエンコードしてファイルに追記するため、メモリに
+# 保持するのはキューに入っている数フレームだけ（クリップ全体は保持しない）。
+# GIF は全フレームで1つのパレットを共有し、前のフレームから変化した矩形だけを
+# 変化のない画素を透明色にして書き出す。
+import argparse
+import glob
+import os
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from config import EXPORT_CONFIG
+from frame_pipeline import LatestFrameQueue
+from instrumentation import NullMetrics
+
+TRANSPARENT_INDEX = 255  # GIF の透明色（パレットの最後の番号）
+_MIN_CODE_SIZE = 8  # 256色パレットの LZW の最小符号長
+_MAX_CODE = 4096  # LZW の辞書の上限（12ビット）
+_MIN_RUN = 16  # これ以上続く同じ番号は列の符号でまとめて出力する
+
+def uniform_palette():
+    """BGR を 6x7x6 段階に分けた均等なパレット（(252, 3) uint8）"""
+    b, g, r = np.meshgrid(np.linspace(0, 255, 6), np.linspace(0, 255, 7), np.linspace(0, 255, 6),
+                          indexing="ij")
+    return np.stack([b, g, r], axis=-1).reshape(-1, 3).round().astype(np.uint8)
+
+def adaptive_palette(image, colors=191, samples=20000):
+    """画像の代表色（k-means）と、後から現れる色のための 4x4x4 段階の色を合わせたパレット"""
+    levels = np.linspace(0, 255, 4)
+    cube = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 3)
+    pixels = image.reshape(-1, 3)
+    if len(pixels) > samples:
+        pixels = pixels[np.random.default_rng(0).choice(len(pixels), samples, replace=False)]
+    pixels = np.unique(pixels, axis=0).astype(np.float32)
+    if len(pixels) > colors:
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        _, _, pixels = cv2.kmeans(pixels, colors, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    return np.concatenate([cube, pixels]).round().clip(0, 255).astype(np.uint8)
+
+class PaletteMapper:
+    """BGR 画像をパレット番号に変換する（各チャンネル上位5ビットの表を一度だけ作る）"""
+    
+    def __init__(self, palette):
+        self.palette = palette[:TRANSPARENT_INDEX]
+        
+        # 32x32x32 の格子点それぞれに最も近いパレットの色
+        levels = np.arange(32) * 8 + 4
+        grid = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 1, 3)
+        table = np.empty(len(grid), dtype=np.uint8)
+        colors = self.palette.astype(np.int32)[np.newaxis]
+        for start in range(0, len(grid), 4096):
+            distances = ((grid[start:start + 4096] - colors) ** 2).sum(axis=-1)
+            table[start:start + 4096] = distances.argmin(axis=1)
+        self.table = table
+    
+    def __call__(self, image):
+        """(H, W, 3) uint8 の BGR → (H, W) uint8 のパレット番号"""
+        keys = (image[:, :, 0] >> 3).astype(np.uint16) << 10
+        keys |= (image[:, :, 1] >> 3).astype(np.uint16) << 5
+        keys |= image[:, :, 2] >> 3
+        return self.table[keys]
+
+def lzw_encode(indices):
+    """パレット番号の列（bytes）を GIF の LZW で圧縮したバイト列
+    
+    基本は最長一致の LZW だが、_MIN_RUN 個以上続く同じ番号（透明色や塗りつぶし）は1画素ずつ
+    辞書を引かず、同じ番号だけの列の符号（使うたびに1個ずつ長い列が辞書に加わる）でまとめて出力する。
+    """
+    data = np.frombuffer(indices, dtype=np.uint8)
+    clear_code = 1 << _MIN_CODE_SIZE
+    first_code = clear_code + 2
+    next_code = first_code
+    table = {}  # (接頭辞の符号 << 8 | 次の番号) → 符号
+    get = table.get
+    chains = {}  # 番号 → その番号が 1, 2, 3, ... 個続く列の符号
+    codes = [clear_code]
+    append = codes.append
+    
+    # 長く続く同じ番号の区間
+    starts = np.concatenate([[0], np.flatnonzero(data[1:] != data[:-1]) + 1])
+    lengths = np.diff(np.append(starts, len(data)))
+    long_runs = lengths >= _MIN_RUN
+    runs = zip(starts[long_runs].tolist(), lengths[long_runs].tolist())
+    
+    # prefix は出力を保留している符号（-1 はなし）
+    prefix = -1
+    position = 0
+    if not long_runs[0]:
+        prefix = indices[0]
+        position = 1
+    for run_start, run_length in [*runs, (len(data), 0)]:
+        # 区間の手前は最長一致で1画素ずつ
+        for index in indices[position:run_start]:
+            key = prefix << 8 | index
+            code = get(key)
+            if code is not None:
+                prefix = code
+                continue
+            append(prefix)
+            if next_code < _MAX_CODE:
+                table[key] = next_code
+                next_code += 1
+            else:
+                append(clear_code)
+                table.clear()
+                chains.clear()
+                next_code = first_code
+            prefix = index
+        if run_length == 0:
+            break
+        
+        # 同じ番号の区間は、辞書にある最も長い列の符号から順に出力
+        value = indices[run_start]
+        chain = chains.setdefault(value, [value])
+        remaining = run_length
+        while remaining:
+            if prefix >= 0:
+                append(prefix)
+                if next_code < _MAX_CODE:
+                    key = prefix << 8 | value
+                    if key not in table:
+                        table[key] = next_code
+                    # 直前の符号が最も長い列なら、1個長い列が辞書に加わる
+                    if prefix == chain[-1]:
+                        chain.append(next_code)
+                    next_code += 1
+                else:
+                    append(clear_code)
+                    table.clear()
+                    chains.clear()
+                    chain = chains[value] = [value]
+                    next_code = first_code
+            count = min(remaining, len(chain))
+            prefix = chain[count - 1]
+            remaining -= count
+        position = run_start + run_length
+    append(prefix)
+    append(clear_code + 1)
+    
+    # 符号長は直前のクリア符号からの出力数で決まる（復号側が辞書に追加した数に合わせる）
+    codes = np.array(codes, dtype=np.uint16)
+    positions = np.arange(len(codes))
+    last_clear = np.maximum.accumulate(np.where(codes == clear_code, positions, 0))
+    since_clear = positions - np.concatenate([[0], last_clear[:-1]]) - 1
+    sizes = np.clip(np.frexp(first_code - 1 + since_clear)[1], _MIN_CODE_SIZE + 1, 12)
+    sizes[0] = _MIN_CODE_SIZE + 1
+    
+    # 可変長の符号を下位ビットから詰める
+    bits = (codes[:, np.newaxis] >> np.arange(12, dtype=np.uint16)) & 1
+    bits = bits[np.arange(12) < sizes[:, np.newaxis]].astype(np.uint8)
+    return np.packbits(bits, bitorder="little").tobytes()
+
+def _sub_blocks(data):
+    """GIF のデータサブブロック（255バイトごとに長さを前置し、0で終端）"""
+    blocks = bytearray()
+    for start in range(0, len(data), 255):
+        chunk = data[start:start + 255]
+        blocks.append(len(chunk))
+        blocks += chunk
+    blocks.append(0)
+    return bytes(blocks)
+
+class GifEncoder:
+    """共有パレットと差分矩形による GIF アニメーションの逐次書き出し
+    
+    表示時間は次のフレームが来たときに決まるため、エンコード済みのフレームを1枚だけ
+    保留しておく。前のフレームと同じ画像は書き出さずに、保留中のフレームの表示時間を延ばす。
+    """
+    
+    def __init__(self, path, width, height, palette="adaptive", loop=0, fps=10.0):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.palette_mode = palette
+        self.loop = loop
+        self.fps = fps  # 最後のフレームの表示時間に使う
+        self.file = None
+        self.mapper = None
+        self.previous = None  # 表示中の画像のパレット番号
+        self.pending = None  # 保留中のフレーム（(タイムスタンプ, 画像記述子とデータ)）
+        self.start_time = None
+        self.written_cs = 0  # 書き出し済みの表示時間の合計（1/100秒）
+        self.frames = 0
+    
+    def _open(self, image):
+        """ヘッダー・共有パレット・ループ回数を書き出す"""
+        if self.palette_mode == "uniform":
+            palette = uniform_palette()
+        else:
+            palette = adaptive_palette(image)
+        self.mapper = PaletteMapper(palette)
+        color_table = np.zeros((256, 3), dtype=np.uint8)
+        color_table[:len(self.mapper.palette)] = self.mapper.palette[:, ::-1]  # BGR → RGB
+        
+        self.file = open(self.path, "wb")
+        self.file.write(b"GIF89a" + struct.pack("<HHBBB", self.width, self.height, 0xF7, 0, 0))
+        self.file.write(color_table.tobytes())
+        self.file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00")
+    
+    def write(self, image, timestamp):
+        """1フレームを追加"""
+        if self.file is None:
+            self._open(image)
+            self.start_time = timestamp
+        indices = self.mapper(image)
+        
+        if self.previous is None:
+            x, y, w, h = 0, 0, self.width, self.height
+            data = indices
+            self.previous = indices
+        else:
+            # 前のフレームから変化した画素の外接矩形だけを書き出す
+            changed = indices != self.previous
+            x, y, w, h = cv2.boundingRect(changed.view(np.uint8))
+            if w == 0 or h == 0:
+                return
+            changed = changed[y:y + h, x:x + w]
+            data = np.where(changed, indices[y:y + h, x:x + w], np.uint8(TRANSPARENT_INDEX))
+            self.previous[y:y + h, x:x + w] = indices[y:y + h, x:x + w]
+        
+        descriptor = b"\x2c" + struct.pack("<HHHHB", x, y, w, h, 0)
+        encoded = descriptor + bytes([_MIN_CODE_SIZE]) + _sub_blocks(lzw_encode(data.tobytes()))
+        self._flush(timestamp)
+        self.pending = (timestamp, encoded)
+    
+    def _flush(self, next_timestamp):
+        """保留中のフレームを、次のフレームまでの表示時間を付けて書き出す"""
+        if self.pending is None:
+            return
+        _, encoded = self.pending
+        
+        # 表示時間は経過時間の累計から求めて丸め誤差をためない（2/100秒未満はブラウザが延ばすため下限）
+        end_cs = int(round((next_timestamp - self.start_time) * 100))
+        delay = min(max(end_cs - self.written_cs, 2), 0xFFFF)
+        self.written_cs += delay
+        
+        # 描画後は残す（disposal 1）、TRANSPARENT_INDEX は透明
+        self.file.write(b"\x21\xf9\x04" + struct.pack("<BHB", 0x05, delay, TRANSPARENT_INDEX) + b"\x00")
+        self.file.write(encoded)
+        self.pending = None
+        self.frames += 1
+    
+    def close(self, timestamp=None):
+        """最後のフレームと終端を書き出してファイルを閉じる"""
+        if self.file is None:
+            return
+        if self.pending is not None:
+            if timestamp is None:
+                timestamp = self.pending[0] + 1.0 / self.fps
+            self._flush(max(timestamp, self.pending[0] + 1.0 / self.fps))
+        self.file.write(b"\x3b")
+        self.file.close()
+        self.file = None
+
+class Mp4Encoder:
+    """cv2.VideoWriter による MP4 の書き出し（固定フレームレート）
+    
+    タイムスタンプに合わせてフレームを繰り返し、描画が fps より遅くても再生時間を実時間に揃える。
+    """
+    
+    def __init__(self, path, width, height, fps=30.0, fourcc="mp4v"):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+        if not self.writer.isOpened():
+            raise RuntimeError(f"動画ファイルを開けませんでした: {path}")
+        self.fps = fps
+        self.start_time = None
+        self.frames = 0
+    
+    def write(self, image, timestamp):
+        """1フレームを追加（前のフレームから間が空いていればその分繰り返す）"""
+        if self.start_time is None:
+            self.start_time = timestamp
+        target = int(round((timestamp - self.start_time) * self.fps)) + 1
+        for _ in range(min(max(target - self.frames, 1), int(self.fps) + 1)):
+            self.writer.write(image)
+            self.frames += 1
+    
+    def close(self, timestamp=None):
+        self.writer.release()
+
+def create_encoder(path, width, height, fps, palette="adaptive", loop=0, fourcc="mp4v"):
+    """拡張子（.gif またはそれ以外の動画）に応じたエンコーダー"""
+    if os.path.splitext(path)[1].lower() == ".gif":
+        return GifEncoder(path, width, height, palette=palette, loop=loop, fps=fps)
+    return Mp4Encoder(path, width, height, fps=fps, fourcc=fourcc)
+
+class FrameExporter:
+    """描画済みのキャンバスを書き出しスレッドでファイルに追記する
+    
+    submit() はキャンバスをコピーして有界キューに入れるだけで、描画ループを待たせない。
+    書き出しが追いつかないときは古いフレームから破棄する（dropped に数える）。
+    block=True ならキューが空くまで待ち、フレームを破棄しない（表示のない一括変換向け）。
+    """
+    
+    def __init__(self, path, fps=None, queue_size=8, palette="adaptive", loop=0, fourcc="mp4v",
+                 block=False, metrics=None):
+        self.path = path
+        is_gif = os.path.splitext(path)[1].lower() == ".gif"
+        self.fps = fps or (EXPORT_CONFIG["gif_fps"] if is_gif else EXPORT_CONFIG["video_fps"])
+        self.encoder_params = dict(palette=palette, loop=loop, fourcc=fourcc)
+        self.block = block
+        self.encoder = None
+        self.size = None  # 最初のフレームの (幅, 高さ)（以降のフレームはこの大きさに揃える）
+        self.start_time = None
+        self.last_timestamp = None
+        self.last_slot = -1
+        self.submitted = 0
+        self.error = None
+        
+        # 書き出しスレッド
+        self.metrics = metrics or NullMetrics()
+        self.frame_queue = LatestFrameQueue(queue_size)
+        self.thread = threading.Thread(target=self._write_loop, name="exporter", daemon=True)
+        self.thread.start()
+    
+    @property
+    def dropped(self):
+        """書き出しが追いつかずに破棄したフレーム数"""
+        return self.frame_queue.dropped
+    
+    def submit(self, canvas, timestamp=None):
+        """キャンバスを書き出しキューに入れる（fps より短い間隔のフレームは間引く）"""
+        if self.error is not None:
+            return False
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = timestamp
+        
+        # 開始からの経過時間を 1/fps 刻みの枠に分け、1つの枠には1フレームだけ入れる
+        slot = int((timestamp - self.start_time) * self.fps + 0.5)
+        if slot <= self.last_slot:
+            return False
+        self.last_slot = slot
+        self.last_timestamp = timestamp
+        
+        # キャンバスは描画側で再利用されるためコピーして渡す
+        self.frame_queue.put((canvas.copy(), timestamp), block=self.block)
+        self.submitted += 1
+        return True
+    
+    def _write_loop(self):
+        """書き出しスレッド：キューのフレームをエンコードしてファイルに追記"""
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            image, timestamp = item
+            try:
+                with self.metrics.span("export"):
+                    if self.encoder is None:
+                        height, width = image.shape[:2]
+                        self.size = (width, height)
+                        self.encoder = create_encoder(self.path, width, height, self.fps,
+                                                      **self.encoder_params)
+                    if (image.shape[1], image.shape[0]) != self.size:
+                        image = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+                    self.encoder.write(image, timestamp)
+            except Exception as e:
+                self.error = e
+                print(f"書き出しに失敗しました: {e}")
+    
+    def close(self):
+        """キューに残ったフレームを書き出してファイルを閉じる"""
+        self.frame_queue.close()
+        self.thread.join()
+        if self.encoder is not None:
+            self.encoder.close(self.last_timestamp + 1.0 / self.fps)
+        return self.encoder is not None and self.error is None
+
+def export_images(paths, output, fps=10.0, palette="adaptive", loop=0):
+    """連番画像を1枚ずつ読み込んで書き出す（全フレームをメモリに読み込まない）"""
+    encoder = None
+    size = None
+    frames = 0
+    for frame_index, path in enumerate(paths):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"画像を読み込めませんでした: {path}")
+            continue
+        if encoder is None:
+            size = (image.shape[1], image.shape[0])
+            encoder = create_encoder(output, size[0], size[1], fps, palette=palette, loop=loop)
+        elif (image.shape[1], image.shape[0]) != size:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        encoder.write(image, frame_index / fps)
+        frames += 1
+    if encoder is not None:
+        encoder.close()
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="連番画像を GIF アニメーションまたは MP4 に書き出す")
+    parser.add_argument("pattern", nargs="?", default=EXPORT_CONFIG["image_pattern"],
+                        help="入力画像のパターン（例: tmpimages/*.png）")
+    parser.add_argument("-o", "--output", default="out.gif", help="出力ファイル（.gif または .mp4）")
+    parser.add_argument("--fps", type=float, default=EXPORT_CONFIG["gif_fps"], help="フレームレート")
+    parser.add_argument("--palette", choices=("adaptive", "uniform"), default=EXPORT_CONFIG["palette"],
+                        help="GIF の共有パレット（adaptive: 最初のフレームの代表色、uniform: 均等な色）")
+    args = parser.parse_args()
+    
+    paths = sorted(glob.glob(args.pattern))
+    if not paths:
+        print(f"画像が見つかりません: {args.pattern}")
+        return 1
+    start = time.perf_counter()
+    export_images(paths, args.output, fps=args.fps, palette=args.palette, loop=EXPORT_CONFIG["loop"])
+    print(f"{len(paths)}フレームを書き出しました: {args.output}"
+          f"（{os.path.getsize(args.output) / 1024:.0f} KB、{time.perf_counter() - start:.1f}秒）")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,304 @@
+# frame_io.py
+# フレームの入力元（ソース）と出力先（シンク）
+#
+# ソースは cv2.VideoCapture と同じ read() / isOpened() / release() を持ち、
+# シンクは write(canvas) / wait_key() / close() を持つ。表示のない環境では
+# ウィンドウ以外のシンクを使えば cv2 の GUI 関数を一切呼ばない。
+import glob
+import os
+import socket
+import struct
+import time
+import cv2
+import numpy as np
+from asset_manager import IMAGE_EXTENSIONS
+from config import EXPORT_CONFIG
+from exporter import FrameExporter
+from frame_ring import FrameRing
+
+NO_KEY = 0xFF  # cv2.waitKey(1) & 0xFF でキー入力がなかったときの値
+_FRAME_HEADER = struct.Struct("<III")  # ソケットで送るフレームの (高さ, 幅, チャンネル数)
+
+class CameraSource:
+    """カメラ（自分を見るように左右反転）"""
+    
+    def __init__(self, device_id=0, width=None, height=None, mirror=True):
+        self.cap = cv2.VideoCapture(device_id)
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.mirror = mirror
+    
+    def read(self):
+        """(成功, フレーム) を返す（cv2.VideoCapture と同じ形）"""
+        success, frame = self.cap.read()
+        if success and self.mirror:
+            frame = cv2.flip(frame, 1)
+        return success, frame
+    
+    def isOpened(self):
+        return self.cap.isOpened()
+    
+    def release(self):
+        self.cap.release()
+
+class VideoFileSource:
+    """動画ファイル（realtime=True なら動画のフレームレートに合わせて待つ）"""
+    
+    def __init__(self, path, loop=False, realtime=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.loop = loop
+        self.interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0) if realtime else 0.0
+        self.next_time = None
+        self.finished = False
+    
+    def read(self):
+        success, frame = self.cap.read()
+        if not success and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.cap.read()
+        if not success:
+            self.finished = True
+            return False, None
+        if self.interval > 0:
+            self.next_time = _wait_until(self.next_time, self.interval)
+        return True, frame
+    
+    def isOpened(self):
+        return self.cap.isOpened() and not self.finished
+    
+    def release(self):
+        self.cap.release()
+
+class ImageDirectorySource:
+    """フォルダ内の画像（tmpimages/ など）を名前順に1枚ずつ読み込む"""
+    
+    def __init__(self, folder, loop=False, fps=None):
+        self.paths = sorted(
+            path for path in glob.glob(os.path.join(folder, "*"))
+            if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+        self.loop = loop
+        self.interval = 1.0 / fps if fps else 0.0
+        self.next_time = None
+        self.position = 0
+    
+    def read(self):
+        failures = 0  # 続けて読み込めなかった画像の数（1周分読めなければ終了）
+        while self.isOpened() and failures < len(self.paths):
+            if self.position >= len(self.paths):
+                self.position = 0
+            frame = cv2.imread(self.paths[self.position], cv2.IMREAD_COLOR)
+            self.position += 1
+            if frame is None:
+                failures += 1
+                continue
+            if self.interval > 0:
+                self.next_time = _wait_until(self.next_time, self.interval)
+            return True, frame
+        self.release()
+        return False, None
+    
+    def isOpened(self):
+        return self.position < len(self.paths) or (self.loop and len(self.paths) > 0)
+    
+    def release(self):
+        self.position = len(self.paths)
+        self.loop = False
+
+class SocketSource:
+    """ローカルのソケットで受け取る生のフレーム
+    
+    127.0.0.1:port で待ち受け、最初に接続したクライアントから
+    (高さ, 幅, チャンネル数) のヘッダー（uint32 x 3）と画素のバイト列（BGR）を受け取る。
+    送る側は send_frame() を使う。接続が閉じられるか、不正なヘッダーを受け取ったら終了。
+    """
+    
+    MAX_SIZE = 8192  # 受け付ける幅・高さの上限（ピクセル）
+    
+    def __init__(self, port, host="127.0.0.1", timeout=None):
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(timeout)  # 接続を待つ時間（None なら無制限）
+        self.connection = None
+        self.finished = False
+    
+    def read(self):
+        if self.finished:
+            return False, None
+        try:
+            if self.connection is None:
+                self.connection, _ = self.server.accept()
+                self.connection.settimeout(None)
+            header = bytearray(_FRAME_HEADER.size)
+            if not self._receive(memoryview(header)):
+                raise ConnectionError
+            height, width, channels = _FRAME_HEADER.unpack(header)
+            if not (0 < height <= self.MAX_SIZE and 0 < width <= self.MAX_SIZE and channels == 3):
+                print(f"不正なフレームのヘッダーを受信しました: {height}x{width}x{channels}")
+                raise ConnectionError
+            frame = np.empty((height, width, channels), dtype=np.uint8)
+            if not self._receive(memoryview(frame).cast("B")):
+                raise ConnectionError
+        except (OSError, ConnectionError):
+            self.finished = True
+            return False, None
+        return True, frame
+    
+    def _receive(self, buffer):
+        """buffer がいっぱいになるまで受信（途中で接続が閉じられたら False）"""
+        while len(buffer):
+            received = self.connection.recv_into(buffer)
+            if received == 0:
+                return False
+            buffer = buffer[received:]
+        return True
+    
+    def isOpened(self):
+        return not self.finished
+    
+    def release(self):
+        self.finished = True
+        if self.connection is not None:
+            self.connection.close()
+        self.server.close()
+
+def send_frame(connection, frame):
+    """SocketSource にフレームを1枚送る（グレースケール・BGRA は BGR に変換）"""
+    frame = np.asarray(frame, dtype=np.uint8)
+    if frame.ndim == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    elif frame.shape[2] == 4:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    frame = np.ascontiguousarray(frame)
+    connection.sendall(_FRAME_HEADER.pack(*frame.shape))
+    connection.sendall(memoryview(frame).cast("B"))
+
+def _wait_until(next_time, interval):
+    """前回の予定時刻から interval 後まで待ち、次の予定時刻を返す（遅れている分は取り戻さない）"""
+    now = time.perf_counter()
+    if next_time is not None and next_time > now:
+        time.sleep(next_time - now)
+        now = next_time
+    return now + interval
+
+class WindowSink:
+    """ウィンドウに表示（キー入力も受け付ける）"""
+    
+    def __init__(self, ui_manager):
+        self.ui_manager = ui_manager
+        self.frames = 0
+    
+    def open(self):
+        self.ui_manager.initialize()
+    
+    def write(self, canvas):
+        self.ui_manager.display(canvas)
+        self.frames += 1
+    
+    def wait_key(self):
+        return cv2.waitKey(1) & 0xFF
+    
+    def close(self):
+        cv2.destroyAllWindows()
+
+class NullSink:
+    """描画結果を捨てる（描画までの処理速度の計測用）"""
+    
+    def __init__(self):
+        self.frames = 0  # 受け取ったフレーム数
+    
+    def open(self):
+        """出力を開始"""
+        pass
+    
+    def write(self, canvas):
+        """描画結果を1枚出力（canvas は次の描画で再利用されるため、保持するならコピーする）"""
+        self.frames += 1
+    
+    def wait_key(self):
+        """キー入力（cv2.waitKey(1) & 0xFF と同じ値、なければ NO_KEY）"""
+        return NO_KEY
+    
+    def close(self):
+        """出力を終了"""
+        pass
+
+class VideoFileSink(NullSink):
+    """動画ファイル・GIF に書き出す（書き出しは exporter の別スレッド）
+    
+    表示のない環境では描画が実時間より速く進むため、フレームの時刻は実時間ではなく
+    1フレームごとに 1 / frame_rate 秒ずつ進め、書き出しが追いつくまで待つ
+    （GIF は exporter の fps に合わせて間引かれる）。
+    """
+    
+    def __init__(self, path, frame_rate=30.0, **kwargs):
+        super().__init__()
+        self.exporter = FrameExporter(path, block=True, **kwargs)
+        self.frame_rate = frame_rate
+    
+    def write(self, canvas):
+        self.exporter.submit(canvas, self.frames / self.frame_rate)
+        self.frames += 1
+    
+    def close(self):
+        if self.exporter.close():
+            print(f"描画結果を書き出しました: {self.exporter.path}"
+                  f"（{self.exporter.submitted - self.exporter.dropped}フレーム、破棄 {self.exporter.dropped}）")
+
+class SharedMemorySink(NullSink):
+    """共有メモリのリングバッファに書き込む（別プロセスが FrameRing.attach(name) で読む）
+    
+    リングバッファは最初のフレームの大きさで作成する。
+    """
+    
+    def __init__(self, name=None, slots=8):
+        super().__init__()
+        self.name = name
+        self.slots = slots
+        self.ring = None
+        self.size = None  # 最初のフレームの (幅, 高さ)（以降のフレームはこの大きさに揃える）
+    
+    def write(self, canvas):
+        if self.ring is None:
+            self.size = (canvas.shape[1], canvas.shape[0])
+            self.ring = FrameRing.create({"frame": (canvas.shape, canvas.dtype)}, self.slots, self.name)
+            print(f"共有メモリに書き込みます: {self.ring.name}")
+        elif (canvas.shape[1], canvas.shape[0]) != self.size:
+            canvas = cv2.resize(canvas, self.size, interpolation=cv2.INTER_AREA)
+        self.ring.write(frame=canvas)
+        self.frames += 1
+    
+    def close(self):
+        if self.ring is not None:
+            self.ring.close_writer()
+            self.ring.close()
+            self.ring = None
+
+def open_source(spec, loop=False, realtime=False):
+    """指定（"camera[:番号]"・"video:パス"・"images:フォルダ"・"socket:ポート"）からソースを作成
+    
+    "camera" 以外で種類を省略した場合は、フォルダなら画像、ファイルなら動画として開く。
+    """
+    kind, _, value = spec.partition(":")
+    if kind not in ("camera", "video", "images", "socket"):
+        kind, value = ("images" if os.path.isdir(spec) else "video"), spec
+    if kind == "camera":
+        return CameraSource(int(value) if value else 0)
+    if kind == "video":
+        return VideoFileSource(value, loop=loop, realtime=realtime)
+    if kind == "images":
+        return ImageDirectorySource(value, loop=loop, fps=30.0 if realtime else None)
+    return SocketSource(int(value))
+
+def open_sink(spec, ui_manager=None):
+    """指定（"window"・"null"・"video:パス"・"shm[:名前]"）からシンクを作成"""
+    kind, _, value = spec.partition(":")
+    if kind == "window":
+        return WindowSink(ui_manager)
+    if kind == "null":
+        return NullSink()
+    if kind == "video":
+        return VideoFileSink(value, frame_rate=EXPORT_CONFIG["video_fps"])
+    if kind == "shm":
+        return SharedMemorySink(value or None)
+    raise ValueError(f"不明な出力先です: {spec}")
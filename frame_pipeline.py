@@ -0,0 +1,165 @@
+# frame_pipeline.py
+# キャプチャ・検出・描画をスレッドで並列化するパイプライン
+import collections
+import threading
+import time
+
+class LatestFrameQueue:
+    """最新フレーム優先の有界キュー（満杯時は最も古い要素を破棄）"""
+    
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, maxsize)
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+    
+    def put(self, item, block=False):
+        """要素を追加（満杯なら古い要素を捨てて破棄数を数える、block=True なら空くまで待つ）"""
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize or self.closed)
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+    
+    def get(self, timeout=None):
+        """要素を取り出す（タイムアウトまたはクローズ時はNone）"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self.closed, timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()  # 空きを待っている put() を起こす
+            return item
+    
+    def close(self):
+        """キューを閉じて待機中のスレッドを起こす"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+    
+    def qsize(self):
+        """現在のキュー長"""
+        with self._cond:
+            return len(self._items)
+
+class FramePipeline:
+    def __init__(self, capture_fn, detect_fn, queue_size=1):
+        # 各ステージの処理関数
+        self.capture_fn = capture_fn
+        self.detect_fn = detect_fn
+        
+        # ステージ間のキュー（キャプチャ→検出、検出→描画）
+        self.frame_queue = LatestFrameQueue(queue_size)
+        self.result_queue = LatestFrameQueue(queue_size)
+        
+        # スレッド管理
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.error = None  # ステージで発生した例外（get_result() でメインスレッドに送出）
+        
+        # 統計情報
+        self.frames_captured = 0
+        self.frames_detected = 0
+        self.frames_rendered = 0
+        self.start_time = 0
+    
+    def start(self):
+        """キャプチャスレッドと検出ワーカーを起動"""
+        self.start_time = time.perf_counter()
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._detect_loop, name="detect", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def _capture_loop(self):
+        """キャプチャステージ：フレームを取得して検出キューへ"""
+        try:
+            while not self.stop_event.is_set():
+                frame = self.capture_fn()
+                if frame is None:
+                    break
+                self.frames_captured += 1
+                self.frame_queue.put(frame)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.frame_queue.close()
+    
+    def _detect_loop(self):
+        """検出ステージ：最新フレームに対して検出し描画キューへ"""
+        try:
+            while not self.stop_event.is_set():
+                frame = self.frame_queue.get(timeout=0.1)
+                if frame is None:
+                    if self.frame_queue.closed:
+                        break
+                    continue
+                landmarks = self.detect_fn(frame)
+                self.frames_detected += 1
+                self.result_queue.put((frame, landmarks))
+        except Exception as error:
+            self.error = error
+        finally:
+            # 例外で終了しても描画側が待ち続けないようにキューを閉じる
+            self.result_queue.close()
+    
+    def get_result(self, timeout=None):
+        """描画ステージ用に最新の(フレーム, ランドマーク)を取得（ステージが例外で終了していれば送出）"""
+        item = self.result_queue.get(timeout)
+        if item is not None:
+            self.frames_rendered += 1
+        elif self.error is not None and self.is_finished():
+            raise self.error
+        return item
+    
+    def is_finished(self):
+        """全ステージが終了し、未処理の結果が残っていないか"""
+        return self.result_queue.closed and self.result_queue.qsize() == 0
+    
+    def stop(self):
+        """パイプラインを停止してスレッドを待機"""
+        self.stop_event.set()
+        self.frame_queue.close()
+        self.result_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
+    
+    def get_stats(self):
+        """ステージごとのキュー長・破棄フレーム数・処理数"""
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return {
+            "capture": {
+                "frames": self.frames_captured,
+                "fps": self.frames_captured / elapsed,
+            },
+            "detect": {
+                "frames": self.frames_detected,
+                "fps": self.frames_detected / elapsed,
+                "queue_depth": self.frame_queue.qsize(),
+                "dropped": self.frame_queue.dropped,
+            },
+            "render": {
+                "frames": self.frames_rendered,
+                "fps": self.frames_rendered / elapsed,
+                "queue_depth": self.result_queue.qsize(),
+                "dropped": self.result_queue.dropped,
+            },
+        }
+    
+    def format_stats(self):
+        """統計情報を1行の文字列に整形"""
+        stats = self.get_stats()
+        return (
+            f"capture {stats['capture']['fps']:.1f}fps | "
+            f"detect {stats['detect']['fps']:.1f}fps "
+            f"q={stats['detect']['queue_depth']} drop={stats['detect']['dropped']} | "
+            f"render {stats['render']['fps']:.1f}fps "
+            f"q={stats['render']['queue_depth']} drop={stats['render']['dropped']}"
+        )
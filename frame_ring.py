@@ -0,0 +1,174 @@
+# frame_ring.py
+# multiprocessing.shared_memory 上のリングバッファ（プロセス間でフレームをコピーせずに受け渡す）
+#
+# 各スロットには書き込みの連番と、フィールド（フレームなど）の配列を1つずつ持つ。
+# 書き込み側は連番を -1 にしてから書き込み、書き終えたら連番を入れて公開する。
+# 読み込み側は NumPy のビューで直接読み、使い終わったあとに連番が変わっていなければ
+# 途中で上書きされていない（valid）と判断する。
+import json
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+_MAGIC = 0x52564652  # "RVFR"
+_HEADER_SIZE = 4096  # 制御領域とフィールド定義（JSON）の大きさ
+_ALIGNMENT = 64  # 各配列の先頭をキャッシュラインに揃える
+
+# 制御領域（int64）の位置
+_CONTROL_MAGIC = 0
+_CONTROL_SLOTS = 1
+_CONTROL_LATEST = 2  # 最後に公開した連番（まだなければ -1）
+_CONTROL_CLOSED = 3  # 書き込み側が終了したら 1
+_CONTROL_LAYOUT_SIZE = 4  # フィールド定義（JSON）のバイト数
+_CONTROL_WORDS = 8
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def _layout(fields, slots):
+    """各フィールドのオフセットと全体の大きさ"""
+    offsets = {}
+    offset = _align(_HEADER_SIZE + 8 * slots)  # 連番の配列の後ろ
+    for name, (shape, dtype) in fields.items():
+        offsets[name] = offset
+        offset = _align(offset + slots * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize)
+    return offsets, offset
+
+def _attach_shared_memory(name):
+    """既存の共有メモリを開く（終了時に削除しないよう、作成したプロセス以外では追跡しない）"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    
+    # 3.12 以前は開くだけでも追跡される（spawn した子プロセスは親と追跡プロセスを共有するため、
+    # 開いたあとに登録を解除すると親の登録まで消える）ので、開く間だけ登録を無効にする
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+class FrameRing:
+    """固定の大きさのスロットを循環して使う共有メモリのリングバッファ
+    
+    fields はフィールド名 → (1スロット分の形, dtype)（landmark_store のストリームと同じ形式）。
+    書き込み側は1プロセスだけ、読み込み側はいくつでもよい。
+    """
+    
+    def __init__(self, memory, fields, slots, owner):
+        self.memory = memory
+        self.name = memory.name
+        self.fields = fields
+        self.slots = slots
+        self.owner = owner  # 作成したプロセス（close で共有メモリを削除する）
+        self.control = np.ndarray((_CONTROL_WORDS,), dtype=np.int64, buffer=memory.buf)
+        self.sequences = np.ndarray((slots,), dtype=np.int64, buffer=memory.buf, offset=_HEADER_SIZE)
+        offsets, _ = _layout(fields, slots)
+        self.arrays = {
+            name: np.ndarray((slots, *shape), dtype=dtype, buffer=memory.buf, offset=offsets[name])
+            for name, (shape, dtype) in fields.items()
+        }
+        self.next_sequence = 0  # 書き込み側が次に使う連番
+    
+    @classmethod
+    def create(cls, fields, slots=8, name=None):
+        """リングバッファを作成（name を省略すると自動で決まる）"""
+        fields = {name: (tuple(shape), np.dtype(dtype).str) for name, (shape, dtype) in fields.items()}
+        layout = json.dumps({"fields": fields}).encode("utf-8")
+        if 8 * _CONTROL_WORDS + len(layout) > _HEADER_SIZE:
+            raise ValueError("フィールドの定義が大きすぎます")
+        _, size = _layout(fields, slots)
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        ring = cls(memory, fields, slots, owner=True)
+        ring.sequences[:] = -1
+        ring.control[:] = 0
+        ring.control[_CONTROL_MAGIC] = _MAGIC
+        ring.control[_CONTROL_SLOTS] = slots
+        ring.control[_CONTROL_LATEST] = -1
+        ring.control[_CONTROL_LAYOUT_SIZE] = len(layout)
+        memory.buf[8 * _CONTROL_WORDS:8 * _CONTROL_WORDS + len(layout)] = layout
+        return ring
+    
+    @classmethod
+    def attach(cls, name):
+        """別のプロセスが作成したリングバッファを開く（フィールドの定義は共有メモリから読む）"""
+        memory = _attach_shared_memory(name)
+        control = np.ndarray((_CONTROL_WORDS,), dtype=np.int64, buffer=memory.buf)
+        if control[_CONTROL_MAGIC] != _MAGIC:
+            memory.close()
+            raise ValueError(f"リングバッファではありません: {name}")
+        slots = int(control[_CONTROL_SLOTS])
+        layout_size = int(control[_CONTROL_LAYOUT_SIZE])
+        layout = json.loads(bytes(memory.buf[8 * _CONTROL_WORDS:8 * _CONTROL_WORDS + layout_size]))
+        fields = {name: (tuple(shape), dtype) for name, (shape, dtype) in layout["fields"].items()}
+        del control
+        return cls(memory, fields, slots, owner=False)
+    
+    # 書き込み側
+    
+    def claim(self):
+        """次のスロットを書き込み中にして (連番, フィールド名 → そのスロットのビュー) を返す"""
+        sequence = self.next_sequence
+        slot = sequence % self.slots
+        self.sequences[slot] = -1  # 読み込み側に書き込み中であることを示す
+        return sequence, {name: array[slot, ...] for name, array in self.arrays.items()}
+    
+    def publish(self, sequence):
+        """claim したスロットを公開"""
+        self.sequences[sequence % self.slots] = sequence
+        self.control[_CONTROL_LATEST] = sequence
+        self.next_sequence = sequence + 1
+    
+    def write(self, **values):
+        """各フィールドに値をコピーして公開し、連番を返す"""
+        sequence, views = self.claim()
+        for name, value in values.items():
+            views[name][...] = value
+        self.publish(sequence)
+        return sequence
+    
+    def close_writer(self):
+        """書き込みの終了を読み込み側に知らせる"""
+        self.control[_CONTROL_CLOSED] = 1
+    
+    # 読み込み側
+    
+    @property
+    def latest(self):
+        """最後に公開された連番（まだなければ -1）"""
+        return int(self.control[_CONTROL_LATEST])
+    
+    @property
+    def closed(self):
+        return bool(self.control[_CONTROL_CLOSED])
+    
+    def view(self, sequence):
+        """連番のスロットのビュー（フィールド名 → 配列、上書き済みなら None）"""
+        slot = sequence % self.slots
+        if sequence < 0 or self.sequences[slot] != sequence:
+            return None
+        return {name: array[slot, ...] for name, array in self.arrays.items()}
+    
+    def valid(self, sequence):
+        """view で得たスロットがまだ上書きされていないか"""
+        return sequence >= 0 and self.sequences[sequence % self.slots] == sequence
+    
+    def wait(self, after=-1, timeout=None, poll_interval=0.001):
+        """after より新しい連番が公開されるまで待って最新の連番を返す（タイムアウトまたは終了時は None）"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            latest = self.latest
+            if latest > after:
+                return latest
+            if self.closed or (deadline is not None and time.perf_counter() >= deadline):
+                return None
+            time.sleep(poll_interval)
+    
+    def close(self):
+        """共有メモリを閉じる（作成したプロセスなら削除も行う）"""
+        self.control = self.sequences = None
+        self.arrays = {}
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
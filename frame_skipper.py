@@ -0,0 +1,52 @@
+# frame_skipper.py
+# 検出の間引き間隔を計測レイテンシから自動調整する
+import math
+
+class AdaptiveFrameSkipper:
+    def __init__(self, frame_budget_ms=33.3, max_interval=4, ema_alpha=0.2):
+        # 1フレームあたりの処理時間の目標（ミリ秒）
+        self.frame_budget_ms = frame_budget_ms
+        self.max_interval = max_interval
+        self.ema_alpha = ema_alpha
+        
+        # 計測値（指数移動平均）
+        self.detect_ms = 0.0  # 検出1回あたりの時間
+        self.other_ms = 0.0  # 検出以外（キャプチャ・描画・表示）の時間
+        
+        # 何フレームごとに検出するか
+        self.interval = 1
+        self.frame_count = 0
+    
+    def reset(self):
+        """計測値と間隔をリセット"""
+        self.detect_ms = 0.0
+        self.other_ms = 0.0
+        self.interval = 1
+        self.frame_count = 0
+    
+    def should_detect(self):
+        """このフレームで検出を実行するか"""
+        detect = self.frame_count % self.interval == 0
+        self.frame_count += 1
+        return detect
+    
+    def _update(self, value, sample):
+        """指数移動平均の更新"""
+        if value == 0.0:
+            return sample
+        return value + self.ema_alpha * (sample - value)
+    
+    def record_frame(self, frame_ms, detect_ms=None):
+        """1フレームの計測結果を記録して間隔を再計算"""
+        if detect_ms is not None:
+            self.detect_ms = self._update(self.detect_ms, detect_ms)
+            frame_ms -= detect_ms
+        self.other_ms = self._update(self.other_ms, frame_ms)
+        
+        # other + detect / N <= budget となる最小のNを選ぶ
+        available_ms = self.frame_budget_ms - self.other_ms
+        if available_ms <= 0:
+            interval = self.max_interval
+        else:
+            interval = math.ceil(self.detect_ms / available_ms)
+        self.interval = max(1, min(self.max_interval, interval))
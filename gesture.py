@@ -0,0 +1,366 @@
+# gesture.py
+# 手のランドマークからジェスチャー（グー・チョキ・パーなど）を分類する
+#
+# 学習: trainimgdata/<ラベル>/*.jpg から右手の特徴量を並列に抽出し（ファイルのハッシュで
+# キャッシュ）、scikit-learn の SVC で学習して models/ に保存する。
+#   python gesture.py（保存先などは config.py の GESTURE_CONFIG）
+# 推論: 保存したサポートベクターなどの配列だけを読み込み、NumPyで分類する
+# （実行時に scikit-learn は不要、1回あたり数十マイクロ秒）。
+import argparse
+import collections
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+from config import GESTURE_CONFIG
+from frame_pipeline import LatestFrameQueue
+from instrumentation import NullMetrics
+from landmarks import landmarks_to_array
+
+# 1つの手のランドマーク数と特徴量の次元（21点 × x, y, z）
+HAND_LANDMARKS = 21
+HAND_FEATURES = HAND_LANDMARKS * 3
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+def hand_features(hand_landmarks):
+    """手のランドマークを63次元の特徴量（x, y, z の順、float32）に一括変換"""
+    return landmarks_to_array(hand_landmarks)[:, :3].reshape(HAND_FEATURES)
+
+def normalize_features(features):
+    """手首を原点に、手首から最も遠い点までの距離が1になるように正規化（(..., 63)）
+    
+    画面内の位置や手の大きさ（カメラからの距離）によらない特徴量にする。
+    """
+    points = np.asarray(features, dtype=np.float32).reshape(-1, HAND_LANDMARKS, 3)
+    points = points - points[:, :1]
+    scale = np.linalg.norm(points[:, :, :2], axis=-1).max(axis=1)
+    points /= np.maximum(scale, 1e-6)[:, np.newaxis, np.newaxis]
+    return points.reshape(np.shape(features))
+
+def _file_hash(path):
+    """画像ファイルの内容のハッシュ"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _cache_key(path, min_detection_confidence):
+    """特徴量キャッシュのキー（画像の内容と抽出の設定、設定を変えたら抽出し直す）"""
+    return f"{_file_hash(path)}:holistic-static:{min_detection_confidence:g}"
+
+# ワーカープロセスごとの検出器
+_worker = {}
+
+def _init_worker(min_detection_confidence):
+    """ワーカーの初期化（静止画モードの Holistic を生成）"""
+    import mediapipe as mp
+    _worker["holistic"] = mp.solutions.holistic.Holistic(
+        static_image_mode=True, min_detection_confidence=min_detection_confidence)
+
+def _extract_file(path):
+    """1枚の画像から右手の特徴量を抽出（検出できなければ NaN）"""
+    import cv2
+    features = np.full(HAND_FEATURES, np.nan, dtype=np.float32)
+    image = cv2.imread(path)
+    if image is None:
+        return features
+    result = _worker["holistic"].process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if result.right_hand_landmarks:
+        features[:] = hand_features(result.right_hand_landmarks)
+    return features
+
+def list_dataset(basedir):
+    """データセットの画像パスとラベル（サブフォルダ名）"""
+    paths, labels = [], []
+    for label in sorted(os.listdir(basedir)):
+        folder = os.path.join(basedir, label)
+        if label.startswith(".") or not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(folder, name))
+                labels.append(label)
+    return paths, labels
+
+def extract_dataset(basedir="trainimgdata", cache_path=None, workers=None, min_detection_confidence=0.5):
+    """データセットの特徴量を抽出（キャッシュにない画像だけを複数プロセスで処理）
+    
+    戻り値は (特徴量 (N, 63), ラベル (N,), パス (N,))。右手を検出できなかった画像は除く。
+    """
+    paths, labels = list_dataset(basedir)
+    hashes = [_cache_key(path, min_detection_confidence) for path in paths]
+    
+    # キャッシュ（ファイルのハッシュと抽出の設定 → 特徴量、未検出は NaN）
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            cache = dict(zip(data["hashes"].tolist(), data["features"]))
+    
+    missing = [i for i, h in enumerate(hashes) if h not in cache]
+    if missing:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(missing)))
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker, initargs=(min_detection_confidence,)) as pool:
+            for i, features in zip(missing, pool.map(_extract_file, [paths[i] for i in missing])):
+                cache[hashes[i]] = features
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            np.savez(cache_path, hashes=np.array(list(cache)),
+                     features=np.array(list(cache.values()), dtype=np.float32).reshape(-1, HAND_FEATURES))
+    
+    features = np.array([cache[h] for h in hashes], dtype=np.float32).reshape(-1, HAND_FEATURES)
+    found = ~np.isnan(features).any(axis=1)
+    for path in np.array(paths)[~found]:
+        print(f"右手が検出されませんでした: {path}")
+    return features[found], np.array(labels)[found], np.array(paths)[found]
+
+def svc_gamma(gamma, features, num_features):
+    """SVC の gamma パラメータ（"scale" / "auto" / 数値）を scikit-learn と同じ規則で数値にする"""
+    if gamma == "auto":
+        return 1.0 / num_features
+    if gamma == "scale":
+        if features is None:
+            raise ValueError('gamma="scale" のSVCには学習に使った特徴量が必要です')
+        variance = np.asarray(features, dtype=np.float64).var()
+        return 1.0 / (num_features * variance) if variance != 0 else 1.0
+    return float(gamma)
+
+class GestureClassifier:
+    """RBFカーネルのSVC（one-vs-one）をNumPyで評価する分類器"""
+    
+    def __init__(self, classes, support_vectors, pair_coefs, intercepts, gamma, normalize=True):
+        self.classes = np.asarray(classes)
+        self.support_vectors = np.asarray(support_vectors, dtype=np.float64)
+        self.pair_coefs = np.asarray(pair_coefs, dtype=np.float64)  # (クラスの組数, サポートベクター数)
+        self.intercepts = np.asarray(intercepts, dtype=np.float64)
+        self.gamma = float(gamma)
+        self.normalize = bool(normalize)
+        
+        # クラスの組 (i, j)（i < j、libsvm と同じ順序）
+        pairs = np.array([(i, j) for i in range(len(self.classes)) for j in range(i + 1, len(self.classes))],
+                         dtype=np.int64).reshape(-1, 2)
+        self.pair_first, self.pair_second = pairs[:, 0], pairs[:, 1]
+        self.sv_norms = (self.support_vectors ** 2).sum(axis=1)
+    
+    @classmethod
+    def from_svc(cls, model, classes, normalize=True, features=None):
+        """学習済みの sklearn.svm.SVC（kernel="rbf"）から生成
+        
+        gamma="scale" のときは学習に使った特徴量 features（正規化済み）の分散から gamma を求める。
+        """
+        if model.kernel != "rbf":
+            raise ValueError(f"RBFカーネル以外のSVCには対応していません: {model.kernel}")
+        gamma = svc_gamma(model.gamma, features, model.support_vectors_.shape[1])
+        
+        # 組 (i, j) ごとに、全サポートベクターに対する係数を1行にまとめる
+        starts = np.concatenate([[0], np.cumsum(model.n_support_)])
+        num_classes = len(model.n_support_)
+        pair_coefs = []
+        for i in range(num_classes):
+            for j in range(i + 1, num_classes):
+                coefs = np.zeros(len(model.support_vectors_))
+                coefs[starts[i]:starts[i + 1]] = model.dual_coef_[j - 1, starts[i]:starts[i + 1]]
+                coefs[starts[j]:starts[j + 1]] = model.dual_coef_[i, starts[j]:starts[j + 1]]
+                pair_coefs.append(coefs)
+        pair_coefs = np.array(pair_coefs).reshape(-1, len(model.support_vectors_))
+        intercepts = np.asarray(model.intercept_, dtype=np.float64)
+        
+        # 2クラスのとき scikit-learn は公開する係数の符号を反転している（正ならクラス1）ので元に戻す
+        if num_classes == 2:
+            pair_coefs, intercepts = -pair_coefs, -intercepts
+        return cls(np.asarray(classes)[model.classes_], model.support_vectors_, pair_coefs,
+                   intercepts, gamma, normalize)
+    
+    @classmethod
+    def load(cls, path):
+        """save() で保存したモデルを読み込む"""
+        with np.load(path) as data:
+            return cls(data["classes"], data["support_vectors"], data["pair_coefs"],
+                       data["intercepts"], data["gamma"], data["normalize"])
+    
+    def save(self, path):
+        """モデルを配列だけのnpzファイルに保存（読み込みに pickle を使わない）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, classes=self.classes, support_vectors=self.support_vectors,
+                 pair_coefs=self.pair_coefs, intercepts=self.intercepts,
+                 gamma=self.gamma, normalize=self.normalize)
+    
+    def predict_features(self, features):
+        """特徴量（(N, 63)）を分類し、(クラス番号 (N,), 得票率 (N,)) を返す"""
+        features = np.asarray(features, dtype=np.float64).reshape(-1, HAND_FEATURES)
+        if self.normalize:
+            features = normalize_features(features)
+        if len(self.classes) == 1:
+            return np.zeros(len(features), dtype=np.int64), np.ones(len(features))
+        
+        # RBFカーネル exp(-gamma * |x - sv|^2) と各組の決定関数
+        distances = (features ** 2).sum(axis=1)[:, np.newaxis] - 2.0 * features @ self.support_vectors.T + self.sv_norms
+        kernel = np.exp(-self.gamma * np.maximum(distances, 0.0))
+        decisions = kernel @ self.pair_coefs.T + self.intercepts
+        
+        # 組ごとの勝者に投票（同数なら番号の小さいクラス）
+        winners = np.where(decisions > 0, self.pair_first, self.pair_second)
+        votes = np.zeros((len(features), len(self.classes)), dtype=np.int64)
+        np.add.at(votes, (np.arange(len(features))[:, np.newaxis], winners), 1)
+        best = votes.argmax(axis=1)
+        return best, votes[np.arange(len(features)), best] / (len(self.classes) - 1)
+    
+    def classify(self, hand_landmarks, mirror=False):
+        """手のランドマーク1つを分類し、(ラベル, 得票率) を返す（手がなければ (None, 0.0)）
+        
+        mirror=True なら左右反転してから分類する（学習データと逆の手・鏡像の画像のとき）。
+        """
+        if hand_landmarks is None:
+            return None, 0.0
+        features = hand_features(hand_landmarks)
+        if mirror:
+            features = features.copy()
+            features[0::3] = 1.0 - features[0::3]
+        best, score = self.predict_features(features)
+        return str(self.classes[best[0]]), float(score[0])
+
+class GestureCommandSource:
+    """手のジェスチャーをキー入力と同じ {"action": ...} のコマンドに変換する
+    
+    手の検出と分類は別スレッドで interval フレームごとに行い（処理中なら最新のフレームだけ
+    残す）、メインスレッドは submit() でフレームを渡して poll() で結果を受け取るだけにする。
+    直近 window 回の分類のうち min_votes 回以上同じジェスチャーならコマンドを1回発行し、
+    手を下ろすか別のジェスチャーに変えるまで同じコマンドは繰り返さない。
+    """
+    
+    def __init__(self, classifier, commands, interval=3, window=8, min_votes=6, min_score=0.75,
+                 cooldown=1.0, model_complexity=0, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5, metrics=None):
+        import mediapipe as mp
+        self.classifier = classifier
+        self.commands = commands  # ジェスチャー名 → アクション名
+        self.hands = mp.solutions.hands.Hands(
+            max_num_hands=1,
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+        
+        # 分類結果の多数決
+        self.interval = max(1, interval)
+        self.min_votes = min_votes
+        self.min_score = min_score  # これ未満の得票率の分類結果は「不明」として扱う
+        self.cooldown = cooldown  # コマンドを発行してから次を発行するまでの最短時間（秒）
+        self.predictions = collections.deque(maxlen=window)
+        self.updated = False  # 前回の poll() 以降に分類結果が追加されたか
+        self.active_gesture = None  # 発行済みで、まだ続いているジェスチャー
+        self.last_command_time = -float("inf")
+        self.frame_index = 0
+        self._lock = threading.Lock()
+        
+        # 手の検出・分類スレッド
+        self.metrics = metrics or NullMetrics()
+        self.frame_queue = LatestFrameQueue(1)
+        self.thread = threading.Thread(target=self._classify_loop, name="gesture", daemon=True)
+        self.thread.start()
+    
+    def submit(self, frame):
+        """フレームを渡す（interval フレームごとに分類スレッドへ）"""
+        self.frame_index += 1
+        if self.frame_index % self.interval == 0:
+            self.frame_queue.put(frame)
+    
+    def _classify_loop(self):
+        """分類スレッド：手を検出して分類し、結果を多数決用に追加"""
+        import cv2
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None:
+                break
+            with self.metrics.span("gesture"):
+                results = self.hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                gesture = None
+                if results.multi_hand_landmarks:
+                    # 学習データ（鏡像でない写真の右手）に合わせ、"Right" と判定された手は左右反転
+                    # （MediaPipe は鏡像の入力を前提に左右を判定するため、入力の反転の有無によらない）
+                    mirror = results.multi_handedness[0].classification[0].label == "Right"
+                    label, score = self.classifier.classify(results.multi_hand_landmarks[0], mirror)
+                    if score >= self.min_score:
+                        gesture = label
+            with self._lock:
+                self.predictions.append(gesture)
+                self.updated = True
+    
+    def poll(self):
+        """発行するコマンド（{"action": ..., "gesture": ...}）、なければ None"""
+        if not self.updated:
+            return None
+        with self._lock:
+            self.updated = False
+            gesture, votes = collections.Counter(self.predictions).most_common(1)[0]
+            
+            # 安定したジェスチャーがなければ、次に同じジェスチャーをしたときに再発行できるようにする
+            if gesture is None or votes < self.min_votes:
+                self.active_gesture = None
+                return None
+            if gesture == self.active_gesture:
+                return None
+            now = time.perf_counter()
+            if now - self.last_command_time < self.cooldown:
+                return None
+            self.active_gesture = gesture
+            action = self.commands.get(gesture)
+            if action is None:
+                return None
+            self.last_command_time = now
+            return {"action": action, "gesture": gesture}
+    
+    def close(self):
+        """分類スレッドを止めて検出器を解放"""
+        self.frame_queue.close()
+        self.thread.join()
+        self.hands.close()
+
+def train(features, labels, C=1.0, normalize=True, cv=5):
+    """SVC（scikit-learn）で学習し、交差検証の正解率とともに分類器を返す"""
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+    from sklearn.svm import SVC
+    
+    classes, y = np.unique(labels, return_inverse=True)
+    X = normalize_features(features) if normalize else np.asarray(features)
+    
+    # 学習に使っていないデータでの正解率（各クラスの枚数が分割数より少なければ減らす）
+    folds = min(cv, np.bincount(y).min()) if len(classes) > 1 else 0
+    scores = None
+    if folds >= 2:
+        scores = cross_val_score(SVC(C=C, kernel="rbf", gamma="scale"), X, y,
+                                 cv=StratifiedKFold(folds, shuffle=True, random_state=0))
+    
+    model = SVC(C=C, kernel="rbf", gamma="scale").fit(X, y)
+    return GestureClassifier.from_svc(model, classes, normalize, X), scores
+
+def main():
+    parser = argparse.ArgumentParser(description="手のジェスチャー分類器の学習")
+    parser.add_argument("--data", default=GESTURE_CONFIG["data_dir"], help="学習データ（<ラベル>/<画像> の形式）")
+    parser.add_argument("--model", default=GESTURE_CONFIG["model_path"], help="モデルの保存先")
+    parser.add_argument("--cache", default=GESTURE_CONFIG["feature_cache"], help="特徴量キャッシュ")
+    parser.add_argument("--workers", type=int, default=None, help="特徴量抽出のプロセス数")
+    parser.add_argument("--cv", type=int, default=5, help="交差検証の分割数")
+    parser.add_argument("-C", type=float, default=1.0, help="SVCの正則化パラメータ")
+    parser.add_argument("--raw", action="store_true", help="特徴量を正規化しない（ノートブックと同じ生の座標）")
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    features, labels, paths = extract_dataset(args.data, args.cache, args.workers)
+    print(f"特徴量: {features.shape}（{time.perf_counter() - start:.1f}秒）")
+    if len(features) == 0:
+        print("どの画像からも有効な手のランドマークが検出されませんでした。")
+        return 1
+    
+    classifier, scores = train(features, labels, args.C, normalize=not args.raw, cv=args.cv)
+    if scores is not None:
+        print(f"交差検証の正解率: {scores.mean():.3f} (±{scores.std():.3f}, {len(scores)}分割)")
+    predicted, _ = classifier.predict_features(features)
+    print(f"学習データの正解率: {(classifier.classes[predicted] == labels).mean():.3f}")
+    
+    classifier.save(args.model)
+    print(f"モデルを保存しました: {args.model}（クラス: {', '.join(classifier.classes)}）")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
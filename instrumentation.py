@@ -0,0 +1,180 @@
+# instrumentation.py
+# ステージごとの処理時間の計測とメトリクス出力
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Prometheusヒストグラムのバケット境界（ミリ秒）
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 16, 33, 50, 100, 250, 1000)
+
+class _StageStats:
+    """1ステージ分の計測値（直近の値のリングバッファと累積ヒストグラム）"""
+    
+    def __init__(self, window, buckets_ms):
+        self.recent = np.zeros(window, dtype=np.int64)  # 直近の処理時間（ナノ秒）
+        self.recent_index = 0
+        self.recent_count = 0
+        self.buckets_ns = np.array(buckets_ms, dtype=np.int64) * 1_000_000
+        self.bucket_counts = np.zeros(len(buckets_ms) + 1, dtype=np.int64)  # 最後は+Inf
+        self.total_ns = 0
+        self.count = 0
+    
+    def record(self, duration_ns):
+        """処理時間を1件記録"""
+        self.recent[self.recent_index] = duration_ns
+        self.recent_index = (self.recent_index + 1) % len(self.recent)
+        self.recent_count = min(self.recent_count + 1, len(self.recent))
+        self.bucket_counts[np.searchsorted(self.buckets_ns, duration_ns)] += 1
+        self.total_ns += duration_ns
+        self.count += 1
+    
+    def summary(self):
+        """直近の処理時間の統計（ミリ秒）"""
+        recent_ms = self.recent[:self.recent_count] / 1e6
+        if self.recent_count == 0:
+            return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0,
+                    "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        p50, p95, p99 = np.percentile(recent_ms, (50, 95, 99))
+        return {
+            "count": self.count,
+            "mean_ms": float(recent_ms.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(recent_ms.max()),
+        }
+
+class StageMetrics:
+    def __init__(self, window=300, buckets_ms=DEFAULT_BUCKETS_MS):
+        # ステージ名ごとの計測値（記録順を保持）
+        self.window = window
+        self.buckets_ms = tuple(buckets_ms)
+        self.stages = {}
+        self._lock = threading.Lock()
+    
+    @contextlib.contextmanager
+    def span(self, name):
+        """with文で囲んだ区間の処理時間を記録"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start)
+    
+    def record(self, name, duration_ns):
+        """処理時間を記録（複数スレッドから呼び出し可）"""
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = _StageStats(self.window, self.buckets_ms)
+            stats.record(duration_ns)
+    
+    def summary(self):
+        """全ステージの統計"""
+        with self._lock:
+            return {name: stats.summary() for name, stats in self.stages.items()}
+    
+    def to_prometheus(self):
+        """Prometheusのテキスト形式に変換"""
+        lines = [
+            "# HELP pose_stage_duration_seconds Processing time per pipeline stage.",
+            "# TYPE pose_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, stats in self.stages.items():
+                cumulative = np.cumsum(stats.bucket_counts)
+                for bound_ms, count in zip(self.buckets_ms, cumulative):
+                    lines.append(
+                        f'pose_stage_duration_seconds_bucket{{stage="{name}",le="{bound_ms / 1000:g}"}} {count}')
+                lines.append(f'pose_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'pose_stage_duration_seconds_sum{{stage="{name}"}} {stats.total_ns / 1e9:.6f}')
+                lines.append(f'pose_stage_duration_seconds_count{{stage="{name}"}} {stats.count}')
+        return "\n".join(lines) + "\n"
+    
+    def to_json_line(self):
+        """JSON Lines形式の1行に変換"""
+        return json.dumps({"time": time.time(), "stages": self.summary()}, ensure_ascii=False)
+
+class NullMetrics:
+    """計測を無効にしたときの何もしない実装"""
+    stages = {}
+    
+    def span(self, name):
+        return contextlib.nullcontext()
+    
+    def record(self, name, duration_ns):
+        pass
+    
+    def summary(self):
+        return {}
+
+class MetricsExporter:
+    def __init__(self, metrics, path=None, export_format="prometheus", interval=5.0, http_port=None):
+        # 出力先（ファイル・ローカルHTTPエンドポイント）
+        self.metrics = metrics
+        self.path = path
+        self.export_format = export_format
+        self.interval = interval
+        self.last_export = time.perf_counter()
+        self.server = None
+        if http_port:
+            self.start_http_server(http_port)
+    
+    def maybe_export(self):
+        """前回から interval 秒以上経っていればファイルに出力"""
+        now = time.perf_counter()
+        if self.path and now - self.last_export >= self.interval:
+            self.export()
+            self.last_export = now
+    
+    def export(self):
+        """ファイルに出力（Prometheus形式は上書き、JSON Linesは追記）"""
+        if not self.path:
+            return
+        if self.export_format == "jsonl":
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(self.metrics.to_json_line() + "\n")
+        else:
+            # 読み込み途中のファイルを見せないよう一時ファイル経由で置き換える
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.metrics.to_prometheus())
+            os.replace(temp_path, self.path)
+    
+    def start_http_server(self, port):
+        """/metrics（Prometheus形式）と /metrics.json を返すローカルHTTPサーバを起動"""
+        metrics = self.metrics
+        
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = metrics.to_json_line().encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+    
+    def close(self):
+        """最終結果を出力してサーバを停止"""
+        self.export()
+        if self.server:
+            self.server.shutdown()
+            self.server = None
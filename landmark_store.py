@@ -0,0 +1,238 @@
+# landmark_store.py
+# ランドマーク記録用の列指向バイナリ形式（ストリームごとの固定長float32配列）
+#
+# 1つの記録はディレクトリで、ストリームごとに生のバイナリファイルを持つ。
+#   meta.json        ストリーム名・形状・型
+#   frame_index.bin  フレーム番号 (int64)
+#   pose.bin         (フレーム数, 33, 4) float32  x, y, z, visibility
+#   left_hand.bin    (フレーム数, 21, 3) float32
+#   right_hand.bin   (フレーム数, 21, 3) float32
+#   face.bin         (フレーム数, 468, 3) float32（refine_face_landmarks時は478点）
+# 検出されなかったフレームはNaNで埋める。
+# 追記はファイル末尾への書き込みだけなので、読み込み側はnp.memmapでゼロコピーに参照できる。
+import argparse
+import csv
+import json
+import os
+import numpy as np
+
+# 既定のストリーム定義（名前: (1フレームあたりの形状, 型)）
+DEFAULT_STREAMS = {
+    "pose": ((33, 4), "float32"),
+    "left_hand": ((21, 3), "float32"),
+    "right_hand": ((21, 3), "float32"),
+    "face": ((468, 3), "float32"),
+}
+
+META_FILE = "meta.json"
+FRAME_INDEX_STREAM = "frame_index"
+FORMAT_VERSION = 1
+
+def _stream_path(path, name):
+    """ストリームのファイルパス"""
+    return os.path.join(path, f"{name}.bin")
+
+class LandmarkStoreWriter:
+    def __init__(self, path, streams=None, metadata=None):
+        # 保存先ディレクトリ（既存の記録は上書き）
+        self.path = path
+        self.streams = {
+            name: (tuple(shape), np.dtype(dtype))
+            for name, (shape, dtype) in (streams or DEFAULT_STREAMS).items()
+        }
+        self.metadata = metadata or {}
+        self.count = 0
+        
+        os.makedirs(path, exist_ok=True)
+        self._write_meta()
+        self._index_file = open(_stream_path(path, FRAME_INDEX_STREAM), "wb")
+        self._files = {name: open(_stream_path(path, name), "wb") for name in self.streams}
+        
+        # 検出されなかったストリーム用のNaNフレーム
+        self._empty = {
+            name: np.full(shape, np.nan, dtype=dtype)
+            for name, (shape, dtype) in self.streams.items()
+        }
+    
+    def _write_meta(self):
+        """ストリーム定義を書き込む"""
+        meta = {
+            "version": FORMAT_VERSION,
+            "streams": {
+                name: {"shape": list(shape), "dtype": dtype.name}
+                for name, (shape, dtype) in self.streams.items()
+            },
+            "metadata": self.metadata,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    
+    def append(self, frame_index, **arrays):
+        """1フレーム分を追記（省略・Noneのストリームは NaN で埋める）"""
+        for name, (shape, dtype) in self.streams.items():
+            values = arrays.get(name)
+            if values is None:
+                values = self._empty[name]
+            else:
+                values = np.asarray(values, dtype=dtype)
+                if values.shape != shape:
+                    raise ValueError(f"{name} の形状が不正です: {values.shape} (期待値 {shape})")
+            self._files[name].write(values.tobytes())
+        self._index_file.write(np.int64(frame_index).tobytes())
+        self.count += 1
+    
+    def append_batch(self, frame_indices, **arrays):
+        """複数フレームをまとめて追記（各配列の先頭軸がフレーム）"""
+        frame_indices = np.asarray(frame_indices, dtype=np.int64)
+        count = len(frame_indices)
+        for name, (shape, dtype) in self.streams.items():
+            values = arrays.get(name)
+            if values is None:
+                values = np.broadcast_to(self._empty[name], (count,) + shape)
+            else:
+                values = np.asarray(values, dtype=dtype)
+                if values.shape != (count,) + shape:
+                    raise ValueError(f"{name} の形状が不正です: {values.shape}")
+            self._files[name].write(np.ascontiguousarray(values).tobytes())
+        self._index_file.write(frame_indices.tobytes())
+        self.count += count
+    
+    def flush(self):
+        """バッファをディスクへ書き出す"""
+        self._index_file.flush()
+        for f in self._files.values():
+            f.flush()
+    
+    def close(self):
+        """ファイルを閉じる"""
+        if self._index_file.closed:
+            return
+        self._index_file.close()
+        for f in self._files.values():
+            f.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class LandmarkStore:
+    def __init__(self, path):
+        # 記録を読み込み専用のメモリマップとして開く
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.metadata = meta.get("metadata", {})
+        self.streams = {
+            name: (tuple(info["shape"]), np.dtype(info["dtype"]))
+            for name, info in meta["streams"].items()
+        }
+        
+        # 書き込み途中で終わった記録も読めるよう、件数はファイルサイズから求める
+        index_path = _stream_path(path, FRAME_INDEX_STREAM)
+        count = os.path.getsize(index_path) // 8
+        for name, (shape, dtype) in self.streams.items():
+            frame_bytes = int(np.prod(shape)) * dtype.itemsize
+            count = min(count, os.path.getsize(_stream_path(path, name)) // frame_bytes)
+        self.count = count
+        
+        self.frame_index = self._map(index_path, (), np.dtype(np.int64))
+        self._arrays = {
+            name: self._map(_stream_path(path, name), shape, dtype)
+            for name, (shape, dtype) in self.streams.items()
+        }
+    
+    def _map(self, file_path, shape, dtype):
+        """ファイルを (count, *shape) のメモリマップとして開く"""
+        if self.count == 0:
+            return np.empty((0,) + shape, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode="r", shape=(self.count,) + shape)
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, name):
+        """ストリーム全体の配列（メモリマップ）"""
+        if name == FRAME_INDEX_STREAM:
+            return self.frame_index
+        return self._arrays[name]
+    
+    def frame(self, position):
+        """position番目のフレームの各ストリーム（ビュー）"""
+        return {name: array[position] for name, array in self._arrays.items()}
+    
+    def find(self, frame_index):
+        """フレーム番号から位置を探す（見つからなければNone）"""
+        position = int(np.searchsorted(self.frame_index, frame_index))
+        if position < self.count and self.frame_index[position] == frame_index:
+            return position
+        return None
+
+def convert_csv(csv_path, store_path):
+    """landmark.csv 形式（frame, landmark_type, index, x, y, z, visibility）を変換"""
+    # 1回目の走査：各ストリームの点数を求める
+    max_index = {}
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            landmark_type, index = row[1], int(row[2])
+            max_index[landmark_type] = max(max_index.get(landmark_type, -1), index)
+    
+    streams = dict(DEFAULT_STREAMS)
+    for name, last in max_index.items():
+        shape, dtype = streams.get(name, ((0, 3), "float32"))
+        streams[name] = ((max(shape[0], last + 1), shape[1]), dtype)
+    
+    # 2回目の走査：フレームごとにまとめて追記
+    with LandmarkStoreWriter(store_path, streams, {"source": os.path.basename(csv_path)}) as writer:
+        current_frame = None
+        buffers = {}
+        
+        def flush_frame():
+            if current_frame is not None:
+                writer.append(current_frame, **buffers)
+        
+        with open(csv_path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                frame = int(row[0])
+                if frame != current_frame:
+                    flush_frame()
+                    current_frame = frame
+                    buffers = {}
+                
+                name = row[1]
+                shape, dtype = writer.streams[name]
+                if name not in buffers:
+                    buffers[name] = np.full(shape, np.nan, dtype=dtype)
+                buffers[name][int(row[2])] = [float(v) for v in row[3:3 + shape[1]]]
+            flush_frame()
+        
+        return writer.count
+
+def main():
+    parser = argparse.ArgumentParser(description="ランドマーク記録の変換・確認")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    convert_parser = subparsers.add_parser("convert", help="CSVを列指向形式に変換")
+    convert_parser.add_argument("csv", help="入力CSV（例: landmark.csv）")
+    convert_parser.add_argument("store", help="出力ディレクトリ")
+    
+    info_parser = subparsers.add_parser("info", help="記録の内容を表示")
+    info_parser.add_argument("store", help="記録ディレクトリ")
+    args = parser.parse_args()
+    
+    if args.command == "convert":
+        count = convert_csv(args.csv, args.store)
+        print(f"{count} フレームを変換しました: {args.store}")
+    else:
+        store = LandmarkStore(args.store)
+        print(f"フレーム数: {len(store)}")
+        for name, (shape, dtype) in store.streams.items():
+            print(f"  {name}: {shape} {dtype.name}")
+
+if __name__ == "__main__":
+    main()
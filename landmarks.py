@@ -0,0 +1,108 @@
+# landmarks.py
+# ランドマークの配列表現（MediaPipeのprotoを毎フレームコピーしないための軽量ビュー）
+import numpy as np
+
+# 1ランドマークあたりの要素数（x, y, z, visibility）
+LANDMARK_FIELDS = 4
+
+# MediaPipe Poseのランドマーク名とインデックスの対応
+POSE_LANDMARK_NAMES = (
+    "nose",
+    "left_eye_inner", "left_eye", "left_eye_outer",
+    "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear",
+    "mouth_left", "mouth_right",
+    "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist",
+    "left_pinky", "right_pinky",
+    "left_index", "right_index",
+    "left_thumb", "right_thumb",
+    "left_hip", "right_hip",
+    "left_knee", "right_knee",
+    "left_ankle", "right_ankle",
+    "left_heel", "right_heel",
+    "left_foot_index", "right_foot_index",
+)
+POSE_LANDMARK_INDEX = {name: index for index, name in enumerate(POSE_LANDMARK_NAMES)}
+
+class _LandmarkRow:
+    """配列の1行をMediaPipeのランドマークと同じ属性名で参照する"""
+    __slots__ = ("_row",)
+    
+    def __init__(self, row):
+        self._row = row
+    
+    @property
+    def x(self):
+        return float(self._row[0])
+    
+    @property
+    def y(self):
+        return float(self._row[1])
+    
+    @property
+    def z(self):
+        return float(self._row[2])
+    
+    @property
+    def visibility(self):
+        return float(self._row[3])
+
+class _LandmarkList:
+    """landmarks.landmark[i] 形式のアクセスを配列上で提供する"""
+    __slots__ = ("_array",)
+    
+    def __init__(self, array):
+        self._array = array
+    
+    def __len__(self):
+        return len(self._array)
+    
+    def __getitem__(self, index):
+        return _LandmarkRow(self._array[index])
+    
+    def __iter__(self):
+        for row in self._array:
+            yield _LandmarkRow(row)
+
+class LandmarkArray:
+    """(N, 4) float32配列を保持するランドマーク集合"""
+    __slots__ = ("array",)
+    
+    def __init__(self, array):
+        self.array = array
+    
+    @property
+    def landmark(self):
+        """MediaPipeのNormalizedLandmarkList互換のアクセス"""
+        return _LandmarkList(self.array)
+    
+    def __len__(self):
+        return len(self.array)
+
+def landmarks_to_array(landmarks, out=None):
+    """MediaPipeのランドマーク（またはLandmarkArray・配列）を(N, 4) float32配列に変換"""
+    if isinstance(landmarks, (LandmarkArray, np.ndarray)):
+        array = landmarks.array if isinstance(landmarks, LandmarkArray) else landmarks
+        if out is None:
+            return array
+        out[...] = array
+        return out
+    
+    points = landmarks.landmark
+    values = np.fromiter(
+        (v for lm in points for v in (lm.x, lm.y, lm.z, lm.visibility)),
+        dtype=np.float32,
+        count=len(points) * LANDMARK_FIELDS)
+    values = values.reshape(len(points), LANDMARK_FIELDS)
+    if out is None:
+        return values
+    out[...] = values
+    return out
+
+def to_pixels(landmarks, width, height):
+    """正規化座標をピクセル座標に一括変換（(..., N, 2) int32、int(x * width) と同じ切り捨て）"""
+    points = landmarks_to_array(landmarks)
+    # float64で掛けて、1点ずつ int(x * width) を計算した場合と同じ値にする
+    return (points[..., :2] * np.array((width, height), dtype=np.float64)).astype(np.int32)
@@ -1,69 +1,323 @@
-import cv2
-from pose_detector import PoseDetector
+import collections
+import os
+import time
+from config import (ADAPTIVE_SKIP_CONFIG, CAMERA_CONFIG, EXPORT_CONFIG, GESTURE_CONFIG, METRICS_CONFIG,
+                    MULTI_PERSON_CONFIG, PIPELINE_CONFIG, POSE_DETECTION_CONFIG, RENDER_CONFIG,
+                    SMOOTHING_CONFIG)
+from exporter import FrameExporter
+from frame_io import CameraSource, WindowSink
+from frame_pipeline import FramePipeline
+from frame_skipper import AdaptiveFrameSkipper
+from gesture import GestureClassifier, GestureCommandSource
+from instrumentation import MetricsExporter, NullMetrics, StageMetrics
+from pose_detector import MultiPoseDetector, PoseDetector
 from character_renderer import CharacterRenderer
-from pose_smoother import PoseSmoother
+from pose_smoother import MultiPoseSmoother, PoseSmoother
+from pose_tracker import PoseTracker
+from session_recorder import SessionPlayer, SessionRecorder
 from ui_manager import UIManager
 
+# 検出スレッド側のスムーザーに適用するコマンド
+SMOOTHING_ACTIONS = ("smooth_up", "smooth_down", "next_filter", "reset_history")
+
 class PoseAnimationApp:
-    def __init__(self):
+    def __init__(self, pipelined=None, adaptive_skip=None,
+                 record_path=None, replay_path=None, replay_speed=1.0,
+                 metrics_path=None, metrics_port=None, timing_overlay=None,
+                 multi_person=None, gestures=None, export_path=None, source=None, sink=None):
+        # 再生モード（記録済みランドマークで描画し、カメラとMediaPipeは使わない）
+        self.player = SessionPlayer(replay_path, speed=replay_speed) if replay_path else None
+        
+        # ステージごとの処理時間の計測（出力先かオーバーレイを指定したら有効）
+        metrics_path = metrics_path or METRICS_CONFIG["export_path"]
+        metrics_port = metrics_port or METRICS_CONFIG["http_port"]
+        if timing_overlay is None:
+            timing_overlay = METRICS_CONFIG["overlay"]
+        if METRICS_CONFIG["enabled"] or metrics_path or metrics_port or timing_overlay:
+            self.metrics = StageMetrics(window=METRICS_CONFIG["window"])
+            export_format = METRICS_CONFIG["export_format"]
+            if metrics_path and metrics_path.endswith(".jsonl"):
+                export_format = "jsonl"
+            self.metrics_exporter = MetricsExporter(
+                self.metrics,
+                path=metrics_path,
+                export_format=export_format,
+                interval=METRICS_CONFIG["export_interval"],
+                http_port=metrics_port)
+        else:
+            self.metrics = NullMetrics()
+            self.metrics_exporter = None
+        self.show_timing = timing_overlay
+        
+        # 複数人モード（人物ごとにトラックIDを割り当てて色分け）
+        if multi_person is None:
+            multi_person = MULTI_PERSON_CONFIG["enabled"]
+        self.multi_person = multi_person and self.player is None
+        
         # コンポーネントの初期化
-        self.pose_detector = PoseDetector()
-        self.pose_smoother = PoseSmoother(max_history=15, smoothing_factor=0.8)
-        self.character_renderer = CharacterRenderer()
+        smoother_params = dict(
+            max_history=SMOOTHING_CONFIG["max_history"],
+            smoothing_factor=SMOOTHING_CONFIG["default_smoothing_factor"],
+            filter_type=SMOOTHING_CONFIG["filter_type"],
+            filter_params=SMOOTHING_CONFIG["filter_params"])
+        self.pose_tracker = None
+        if self.player is not None:
+            self.pose_detector = None
+            self.pose_smoother = PoseSmoother(**smoother_params)
+        elif self.multi_person:
+            self.pose_detector = MultiPoseDetector(
+                MULTI_PERSON_CONFIG["model_asset_path"],
+                num_poses=MULTI_PERSON_CONFIG["num_poses"],
+                min_detection_confidence=POSE_DETECTION_CONFIG["min_detection_confidence"],
+                min_presence_confidence=MULTI_PERSON_CONFIG["min_presence_confidence"],
+                min_tracking_confidence=POSE_DETECTION_CONFIG["min_tracking_confidence"],
+                metrics=self.metrics)
+            self.pose_tracker = PoseTracker(
+                max_distance=MULTI_PERSON_CONFIG["max_match_distance"],
+                max_missed=MULTI_PERSON_CONFIG["max_missed_frames"])
+            self.pose_smoother = MultiPoseSmoother(max_people=MULTI_PERSON_CONFIG["num_poses"], **smoother_params)
+        else:
+            self.pose_detector = PoseDetector(metrics=self.metrics, **POSE_DETECTION_CONFIG)
+            self.pose_smoother = PoseSmoother(**smoother_params)
+        self.character_renderer = CharacterRenderer(**RENDER_CONFIG)
         self.ui_manager = UIManager(window_name="Pose Animation")
         
-        # カメラの初期化
-        self.cap = cv2.VideoCapture(0)
+        # 入力元（省略時はカメラ）と出力先（省略時はウィンドウ）
+        if self.player is not None:
+            self.cap = None
+        else:
+            self.cap = source or CameraSource(CAMERA_CONFIG["device_id"])
+        self.sink = sink or WindowSink(self.ui_manager)
+        
+        # 記録モード（スムージング済みランドマークをタイムスタンプ付きで保存）
+        if record_path and self.multi_person:
+            print("複数人モードでは記録できません（1人分の形式のため）")
+            record_path = None
+        self.record_path = record_path
+        self.recorder = None
         
         # アプリケーション状態
         self.running = False
+        self.start_time = 0
+        
+        # パイプラインモード（キャプチャ・検出・描画を並列化）
+        self.pipelined = PIPELINE_CONFIG["enabled"] if pipelined is None else pipelined
+        self.pipeline = None
+        self.smoothing_commands = collections.deque()  # 検出スレッドで適用するスムージングのコマンド
+        
+        # 適応的な検出の間引き（間のフレームは速度推定で外挿）
+        if adaptive_skip is None:
+            adaptive_skip = ADAPTIVE_SKIP_CONFIG["enabled"]
+        if adaptive_skip and self.pipelined and self.player is None:
+            print("パイプラインモードでは検出を間引けません（検出スレッドが最新フレームだけを処理するため）")
+            adaptive_skip = False
+        self.frame_skipper = AdaptiveFrameSkipper(
+            frame_budget_ms=ADAPTIVE_SKIP_CONFIG["frame_budget_ms"],
+            max_interval=ADAPTIVE_SKIP_CONFIG["max_interval"]) if adaptive_skip else None
+        self.pose_found = False
+        
+        # ジェスチャーによるコマンド入力（キーボードのないキオスク向け）
+        if gestures is None:
+            gestures = GESTURE_CONFIG["enabled"]
+        self.gesture_source = None
+        if gestures and self.player is None:
+            if os.path.exists(GESTURE_CONFIG["model_path"]):
+                self.gesture_source = GestureCommandSource(
+                    GestureClassifier.load(GESTURE_CONFIG["model_path"]),
+                    GESTURE_CONFIG["commands"],
+                    interval=GESTURE_CONFIG["interval"],
+                    window=GESTURE_CONFIG["window"],
+                    min_votes=GESTURE_CONFIG["min_votes"],
+                    min_score=GESTURE_CONFIG["min_score"],
+                    cooldown=GESTURE_CONFIG["cooldown"],
+                    model_complexity=GESTURE_CONFIG["model_complexity"],
+                    metrics=self.metrics)
+            else:
+                print(f"ジェスチャーのモデルがありません: {GESTURE_CONFIG['model_path']}（python gesture.py で作成）")
+        
+        # 描画結果の書き出し（.gif なら GIF アニメーション、それ以外は動画）
+        export_path = export_path or EXPORT_CONFIG["path"]
+        self.exporter = FrameExporter(
+            export_path,
+            queue_size=EXPORT_CONFIG["queue_size"],
+            palette=EXPORT_CONFIG["palette"],
+            loop=EXPORT_CONFIG["loop"],
+            fourcc=EXPORT_CONFIG["fourcc"],
+            metrics=self.metrics) if export_path else None
     
     def initialize(self):
         """アプリケーションの初期化"""
-        if not self.cap.isOpened():
-            print("カメラを開けませんでした。")
+        if self.player is None and not self.cap.isOpened():
+            print("入力を開けませんでした。")
             return False
         
-        self.ui_manager.initialize()
+        self.sink.open()
         self.running = True
+        self.start_time = time.perf_counter()
         return True
     
-    def process_frame(self):
-        """1フレームの処理"""
-        # カメラからフレームを取得
-        success, frame = self.cap.read()
-        if not success:
-            print("カメラからのフレーム取得に失敗しました。")
-            return None
+    def is_source_open(self):
+        """入力（カメラまたは再生）が有効か"""
+        if self.player is not None:
+            return self.player.isOpened()
+        return self.cap.isOpened()
+    
+    def capture_frame(self):
+        """入力元から1フレーム取得（カメラは左右反転済み）"""
+        with self.metrics.span("capture"):
+            success, frame = self.cap.read()
+            if not success:
+                if self.cap.isOpened():
+                    print("フレームの取得に失敗しました。")
+                else:
+                    print("入力が終了しました。")
+                return None
+            return frame
+    
+    def detect_landmarks(self, frame):
+        """ポーズ検出とスムージング"""
+        # パイプラインモードで溜まったスムージングのコマンドを検出スレッドで適用
+        while self.smoothing_commands:
+            self.apply_smoothing_command(self.smoothing_commands.popleft())
         
-        # 画像の反転（自分を見るように）
-        frame = cv2.flip(frame, 1)
+        if self.multi_person:
+            return self.detect_people(frame)
         
-        # ポーズ検出
+        timestamp = time.perf_counter()
         landmarks = self.pose_detector.detect_pose(frame)
         
         # スムージング適用
         if landmarks:
-            smoothed_landmarks = self.pose_smoother.apply_smoothing(landmarks)
+            with self.metrics.span("smoothing"):
+                smoothed_landmarks = self.pose_smoother.apply_smoothing(landmarks, timestamp)
         else:
             smoothed_landmarks = None
         
-        # 描画用キャンバスを作成
-        height, width, _ = frame.shape
-        canvas = self.ui_manager.create_canvas(width, height)
+        # 記録
+        if self.record_path:
+            if self.recorder is None:
+                height, width = frame.shape[:2]
+                self.recorder = SessionRecorder(self.record_path, width, height)
+            self.recorder.write(smoothed_landmarks, timestamp)
         
-        # UI更新（FPS、ステータス表示など）
-        self.ui_manager.update(canvas, frame, smoothed_landmarks is not None)
+        return smoothed_landmarks
+    
+    def detect_people(self, frame):
+        """複数人の検出・追跡・スムージング（[(track_id, LandmarkArray), ...]）"""
+        timestamp = time.perf_counter()
+        poses = self.pose_detector.detect_poses(frame, timestamp)
         
-        # キャラクター描画
+        # トラックIDの割り当て
+        track_ids = self.pose_tracker.update(poses)
+        
+        # 全員分を1回のフィルタ適用でスムージング
+        if len(track_ids) == 0 and len(self.pose_tracker.missing_ids) == 0:
+            return []
+        with self.metrics.span("smoothing"):
+            return self.pose_smoother.apply_tracks(
+                track_ids, poses, self.pose_tracker.missing_ids, timestamp)
+    
+    def render_frame(self, frame, smoothed_landmarks):
+        """キャンバスへの描画"""
+        # 描画用キャンバスを作成（再生時は記録時のサイズ）
+        if frame is not None:
+            height, width = frame.shape[:2]
+        else:
+            width, height = self.player.width, self.player.height
+        
+        # ジェスチャー分類スレッドにフレームを渡す（分類は数フレームに1回）
+        if self.gesture_source is not None and frame is not None:
+            self.gesture_source.submit(frame)
+        
+        with self.metrics.span("ui_overlay"):
+            canvas = self.ui_manager.create_canvas(width, height)
+            
+            # UI更新（FPS、ステータス表示など）
+            self.ui_manager.update(canvas, frame, bool(smoothed_landmarks))
+            
+            # 処理時間のオーバーレイ
+            if self.show_timing:
+                self.ui_manager.add_timing_overlay(canvas, self.metrics.summary())
+        
+        # キャラクター描画（複数人モードではトラックごとに色を変える）
         if smoothed_landmarks:
-            self.character_renderer.draw_character(canvas, smoothed_landmarks, width, height)
+            with self.metrics.span("render"):
+                if self.multi_person:
+                    for track_id, landmarks in smoothed_landmarks:
+                        self.character_renderer.draw_character(
+                            canvas, landmarks, width, height,
+                            scheme=self.character_renderer.current_scheme + track_id)
+                else:
+                    self.character_renderer.draw_character(canvas, smoothed_landmarks, width, height)
         
         return canvas
     
+    def display(self, canvas):
+        """キャンバスの表示とメトリクスの出力"""
+        with self.metrics.span("display"):
+            self.sink.write(canvas)
+        if self.exporter:
+            self.exporter.submit(canvas)
+        if self.metrics_exporter:
+            self.metrics_exporter.maybe_export()
+    
+    def process_frame(self):
+        """1フレームの処理"""
+        if self.player is not None:
+            return self.process_replay_frame()
+        
+        # カメラからフレームを取得
+        frame = self.capture_frame()
+        if frame is None:
+            return None
+        
+        if self.frame_skipper is None:
+            # ポーズ検出とスムージング
+            smoothed_landmarks = self.detect_landmarks(frame)
+            
+            # 描画
+            return self.render_frame(frame, smoothed_landmarks)
+        
+        return self.process_frame_adaptive(frame)
+    
+    def process_frame_adaptive(self, frame):
+        """検出をNフレームごとに間引き、間のフレームは外挿したランドマークで描画"""
+        frame_start = time.perf_counter()
+        detect_ms = None
+        
+        if self.frame_skipper.should_detect():
+            smoothed_landmarks = self.detect_landmarks(frame)
+            detect_ms = (time.perf_counter() - frame_start) * 1000
+            self.pose_found = bool(smoothed_landmarks)
+        elif self.pose_found and self.multi_person:
+            smoothed_landmarks = self.pose_smoother.extrapolate_tracks(
+                max_horizon=ADAPTIVE_SKIP_CONFIG["max_extrapolation"])
+        elif self.pose_found:
+            smoothed_landmarks = self.pose_smoother.extrapolate(
+                max_horizon=ADAPTIVE_SKIP_CONFIG["max_extrapolation"])
+        else:
+            smoothed_landmarks = None
+        
+        canvas = self.render_frame(frame, smoothed_landmarks)
+        
+        # 計測結果から間引き間隔を更新
+        frame_ms = (time.perf_counter() - frame_start) * 1000
+        self.frame_skipper.record_frame(frame_ms, detect_ms)
+        return canvas
+    
+    def process_replay_frame(self):
+        """記録済みランドマークで1フレームを描画"""
+        success, smoothed_landmarks = self.player.read()
+        if not success:
+            print("再生が終了しました。")
+            return None
+        return self.render_frame(None, smoothed_landmarks)
+    
     def handle_key_events(self):
         """キー入力の処理"""
-        key = cv2.waitKey(1) & 0xFF
+        # waitKeyの中でウィンドウの再描画が行われるため別ステージとして計測
+        with self.metrics.span("key_wait"):
+            key = self.sink.wait_key()
         
         # ESCキーが押されたら終了
         if key == 27:
@@ -73,45 +327,146 @@ class PoseAnimationApp:
         # キー入力をUIマネージャに渡す
         command = self.ui_manager.handle_key(key)
         
+        # キー入力がなければジェスチャーからのコマンド
+        if command is None and self.gesture_source is not None:
+            command = self.gesture_source.poll()
+            if command:
+                print(f"ジェスチャー: {command['gesture']}")
+        
         # UIマネージャからのコマンドを処理
         if command:
-            if command["action"] == "smooth_up":
-                self.pose_smoother.increase_smoothing()
-                print(f"スムージング係数: {self.pose_smoother.smoothing_factor:.2f}")
-            elif command["action"] == "smooth_down":
-                self.pose_smoother.decrease_smoothing()
-                print(f"スムージング係数: {self.pose_smoother.smoothing_factor:.2f}")
-            elif command["action"] == "reset_history":
-                self.pose_smoother.reset_history()
-                print("履歴リセット")
+            if command["action"] in SMOOTHING_ACTIONS:
+                # パイプラインモードではスムージング中の検出スレッドと競合しないよう、検出スレッドに渡す
+                if self.pipeline is not None:
+                    self.smoothing_commands.append(command)
+                else:
+                    self.apply_smoothing_command(command)
+            elif command["action"] == "toggle_timing":
+                self.show_timing = not self.show_timing
+                if self.show_timing and self.metrics_exporter is None:
+                    print("計測が無効です（--timing-overlay または config.py の METRICS_CONFIG で有効化）")
             elif command["action"] == "change_color":
                 self.character_renderer.next_color_scheme()
                 print("キャラクターの色を変更しました")
     
+    def apply_smoothing_command(self, command):
+        """スムージングの設定を変更するコマンド（スムーザーを使うスレッドで呼ぶ）"""
+        if command["action"] == "smooth_up":
+            self.pose_smoother.increase_smoothing()
+            print(f"スムージング係数: {self.pose_smoother.smoothing_factor:.2f}")
+        elif command["action"] == "smooth_down":
+            self.pose_smoother.decrease_smoothing()
+            print(f"スムージング係数: {self.pose_smoother.smoothing_factor:.2f}")
+        elif command["action"] == "next_filter":
+            self.pose_smoother.next_filter()
+            print(f"スムージングフィルタ: {self.pose_smoother.filter_type}")
+        elif command["action"] == "reset_history":
+            self.pose_smoother.reset_history()
+            if self.pose_tracker:
+                self.pose_tracker.reset()
+            print("履歴リセット")
+    
     def run(self):
         """メインループ"""
         if not self.initialize():
             return
         
-        while self.running and self.cap.isOpened():
+        if self.pipelined and self.player is None:
+            self.run_pipelined()
+            return
+        
+        while self.running and self.is_source_open():
+            frame_start = time.perf_counter_ns()
+            
             # フレーム処理
             canvas = self.process_frame()
             if canvas is None:
                 break
             
             # 表示
-            self.ui_manager.display(canvas)
+            self.display(canvas)
+            
+            # キー入力処理
+            self.handle_key_events()
+            self.metrics.record("frame", time.perf_counter_ns() - frame_start)
+        
+        # リソース解放
+        self.cleanup()
+    
+    def run_pipelined(self):
+        """パイプラインモードのメインループ（描画・表示はメインスレッド）"""
+        self.pipeline = FramePipeline(
+            self.capture_frame,
+            self.detect_landmarks,
+            queue_size=PIPELINE_CONFIG["queue_size"])
+        self.pipeline.start()
+        
+        stats_interval = PIPELINE_CONFIG["stats_interval"]
+        last_stats_time = time.perf_counter()
+        
+        while self.running:
+            # 検出済みの最新フレームを取得（検出が例外で終了していればここで送出される）
+            try:
+                item = self.pipeline.get_result(timeout=0.5)
+            except Exception:
+                self.cleanup()
+                raise
+            if item is None:
+                if self.pipeline.is_finished():
+                    break
+                # 検出が遅れている間もウィンドウの更新と ESC を受け付ける
+                self.handle_key_events()
+                continue
+            
+            frame_start = time.perf_counter_ns()
+            frame, smoothed_landmarks = item
+            canvas = self.render_frame(frame, smoothed_landmarks)
+            
+            # 表示
+            self.display(canvas)
             
             # キー入力処理
             self.handle_key_events()
+            self.metrics.record("frame", time.perf_counter_ns() - frame_start)
+            
+            # ステージ統計の定期出力
+            now = time.perf_counter()
+            if stats_interval > 0 and now - last_stats_time >= stats_interval:
+                print(self.pipeline.format_stats())
+                last_stats_time = now
         
         # リソース解放
         self.cleanup()
     
     def cleanup(self):
         """リソースの解放"""
-        self.cap.release()
-        cv2.destroyAllWindows()
+        if self.pipeline:
+            self.pipeline.stop()
+            print(self.pipeline.format_stats())
+            self.pipeline = None
+        if self.metrics_exporter:
+            self.metrics_exporter.close()
+        if self.recorder:
+            self.recorder.close()
+            print(f"ランドマークを記録しました: {self.record_path}")
+        if self.player:
+            self.player.release()
+        if self.multi_person:
+            self.pose_detector.close()
+        if self.gesture_source:
+            self.gesture_source.close()
+        if self.exporter:
+            if self.exporter.close():
+                print(f"描画結果を書き出しました: {self.exporter.path}"
+                      f"（{self.exporter.submitted - self.exporter.dropped}フレーム、破棄 {self.exporter.dropped}）")
+        if self.cap:
+            self.cap.release()
+        self.sink.close()
+        
+        # 描画のスループット（表示のない環境での計測用）
+        elapsed = time.perf_counter() - self.start_time
+        if self.sink.frames > 0 and elapsed > 0:
+            print(f"描画: {self.sink.frames}フレーム（{self.sink.frames / elapsed:.1f} FPS）")
 
 if __name__ == "__main__":
     app = PoseAnimationApp()
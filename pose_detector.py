@@ -1,19 +1,60 @@
+import os
+import time
 import cv2
 import mediapipe as mp
+import numpy as np
+from instrumentation import NullMetrics
+from landmarks import LANDMARK_FIELDS, POSE_LANDMARK_INDEX, LandmarkArray, landmarks_to_array, to_pixels
+
+# get_landmark_positions で返すランドマーク
+POSITION_LANDMARKS = {
+    name: POSE_LANDMARK_INDEX[name] for name in (
+        "nose", "left_eye", "right_eye", "left_ear", "right_ear",
+        "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+        "left_wrist", "right_wrist", "left_hip", "right_hip",
+        "left_knee", "right_knee", "left_ankle", "right_ankle")
+}
+_POSITION_INDICES = list(POSITION_LANDMARKS.values())
 
 class PoseDetector:
-    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 roi_mode=False, roi_padding=0.25, roi_min_visibility=0.5,
+                 roi_min_size=96, inference_size=480, metrics=None):
         # MediaPipe Pose初期化
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose(
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence)
+        
+        # ROIモード（前フレームの人物領域だけを切り出して推論）
+        self.roi_mode = roi_mode
+        self.roi_padding = roi_padding  # 人物領域の周囲に加える余白（辺の長さに対する割合）
+        self.roi_min_visibility = roi_min_visibility  # 領域計算に使うランドマークの可視度
+        self.roi_min_size = roi_min_size  # ROIの最小サイズ（ピクセル）
+        self.inference_size = inference_size  # 推論画像の長辺の上限（ピクセル）
+        self.roi = None  # (x1, y1, x2, y2)
+        
+        # ROIモードでは self.pose（トラッキングあり）に同じ位置・大きさの切り出し画像だけを入力する。
+        # トラッキングの状態は入力画像の正規化座標なので、ROIが変わったらリセットする。
+        # 追跡が外れたときの全体探索は、状態を持たない静止画モードの別インスタンスで行う
+        self.pose_roi = None  # self.pose に最後に入力したROI
+        self.search_pose = self.mp_pose.Pose(
+            static_image_mode=True,
+            min_detection_confidence=min_detection_confidence) if roi_mode else None
+        
+        # 処理時間の計測（色変換・推論）
+        self.metrics = metrics or NullMetrics()
     
     def detect_pose(self, image):
         """画像から姿勢を検出し、ランドマークを返す"""
+        if self.roi_mode:
+            return self._detect_pose_roi(image)
+        
         # MediaPipeの処理のためBGR→RGB変換
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(image_rgb)
+        with self.metrics.span("color_convert"):
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with self.metrics.span("inference"):
+            results = self.pose.process(image_rgb)
         
         # ポーズが検出されたなら
         if results.pose_landmarks:
@@ -21,37 +62,246 @@ class PoseDetector:
         
         return None
     
+    def reset_roi(self):
+        """ROI追跡をリセット（次フレームは全体を探索）"""
+        self.roi = None
+    
+    def _process_region(self, region, pose):
+        """領域を縮小してからRGB変換し推論する"""
+        with self.metrics.span("color_convert"):
+            h, w = region.shape[:2]
+            scale = self.inference_size / max(h, w)
+            if scale < 1.0:
+                # INTER_AREA は大きなROIの縮小だけで数ミリ秒かかるため線形補間
+                region = cv2.resize(
+                    region, (max(1, int(w * scale)), max(1, int(h * scale))),
+                    interpolation=cv2.INTER_LINEAR)
+            region_rgb = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
+        with self.metrics.span("inference"):
+            return pose.process(region_rgb)
+    
+    def _detect_pose_roi(self, image):
+        """ROIモードでの検出（追跡が外れたら全体探索にフォールバック）"""
+        height, width = image.shape[:2]
+        
+        if self.roi is not None:
+            # ROIが変わったらトラッキングの状態を捨てる（前のROIの座標のまま引き継がない）
+            if self.roi != self.pose_roi:
+                if self.pose_roi is not None:
+                    self.pose.reset()
+                self.pose_roi = self.roi
+            x1, y1, x2, y2 = self.roi
+            results = self._process_region(image[y1:y2, x1:x2], self.pose)
+            if results.pose_landmarks:
+                # ROI内の正規化座標をフレーム全体の正規化座標に戻す
+                points = landmarks_to_array(results.pose_landmarks)
+                roi_width = x2 - x1
+                roi_height = y2 - y1
+                points[:, 0] = (x1 + points[:, 0] * roi_width) / width
+                points[:, 1] = (y1 + points[:, 1] * roi_height) / height
+                points[:, 2] *= roi_width / width
+                self._update_roi(points, width, height)
+                return LandmarkArray(points)
+            
+            # 追跡ロスト
+            self.roi = None
+        
+        # フレーム全体を探索
+        results = self._process_region(image, self.search_pose)
+        if results.pose_landmarks:
+            points = landmarks_to_array(results.pose_landmarks)
+            self._update_roi(points, width, height)
+            return LandmarkArray(points)
+        
+        return None
+    
+    def _update_roi(self, points, width, height):
+        """ランドマークから次フレームのROIを計算"""
+        visible = points[:, 3] >= self.roi_min_visibility
+        if np.count_nonzero(visible) < 4:
+            visible = np.ones(len(points), dtype=bool)
+        xs = np.clip(points[visible, 0], 0.0, 1.0) * width
+        ys = np.clip(points[visible, 1], 0.0, 1.0) * height
+        bx1, bx2 = float(xs.min()), float(xs.max())
+        by1, by2 = float(ys.min()), float(ys.max())
+        
+        # 人物が現在のROIの内側に収まっていて、ROIが大きすぎなければ据え置く
+        # （ROIが変わるたびにトラッキングをリセットして人物検出からやり直すため）
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            margin = self.roi_padding * 0.5 * max(bx2 - bx1, by2 - by1)
+            # 画面の端で切れている側は、ROIが画面の端まで届いていればよい
+            inside = (max(bx1 - margin, 0) >= x1 and max(by1 - margin, 0) >= y1 and
+                      min(bx2 + margin, width) <= x2 and min(by2 + margin, height) <= y2)
+            roi_area = (x2 - x1) * (y2 - y1)
+            person_area = max((bx2 - bx1) * (by2 - by1), 1.0)
+            if inside and roi_area <= person_area * 4 * (1 + 2 * self.roi_padding) ** 2:
+                return
+        
+        # 余白を加えた正方形の領域
+        size = max(bx2 - bx1, by2 - by1) * (1 + 2 * self.roi_padding)
+        size = max(size, self.roi_min_size)
+        cx = (bx1 + bx2) / 2
+        cy = (by1 + by2) / 2
+        x1 = int(max(0, cx - size / 2))
+        y1 = int(max(0, cy - size / 2))
+        x2 = int(min(width, cx + size / 2))
+        y2 = int(min(height, cy + size / 2))
+        
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            self.roi = None
+        else:
+            self.roi = (x1, y1, x2, y2)
+    
     def get_landmark_positions(self, landmarks, image_width, image_height):
         """ランドマークの座標を抽出"""
-        positions = {}
-        
-        # MediaPipe Poseランドマークのマッピング
-        landmark_indices = {
-            "nose": 0,
-            "left_eye": 2,
-            "right_eye": 5,
-            "left_ear": 7,
-            "right_ear": 8,
-            "left_shoulder": 11,
-            "right_shoulder": 12,
-            "left_elbow": 13,
-            "right_elbow": 14,
-            "left_wrist": 15,
-            "right_wrist": 16,
-            "left_hip": 23,
-            "right_hip": 24,
-            "left_knee": 25,
-            "right_knee": 26,
-            "left_ankle": 27,
-            "right_ankle": 28
+        points = landmarks_to_array(landmarks)
+        pixels = to_pixels(points[_POSITION_INDICES], image_width, image_height).tolist()
+        visibility = points[_POSITION_INDICES, 3].tolist()
+        
+        return {
+            name: {"x": x, "y": y, "visibility": v}
+            for name, (x, y), v in zip(POSITION_LANDMARKS, pixels, visibility)
         }
+
+class MultiPoseDetector:
+    def __init__(self, model_asset_path, num_poses=4, min_detection_confidence=0.5,
+                 min_presence_confidence=0.5, min_tracking_confidence=0.5, metrics=None):
+        # MediaPipe Tasks の PoseLandmarker（1回の推論で複数人を検出）
+        if not os.path.exists(model_asset_path):
+            raise FileNotFoundError(
+                f"モデルファイルが見つかりません: {model_asset_path}\n"
+                "https://storage.googleapis.com/mediapipe-models/pose_landmarker/"
+                "pose_landmarker_full/float16/latest/pose_landmarker_full.task をダウンロードしてください")
+        vision = mp.tasks.vision
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_asset_path),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=num_poses,
+            min_pose_detection_confidence=min_detection_confidence,
+            min_pose_presence_confidence=min_presence_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+        self.num_poses = num_poses
+        self.last_timestamp_ms = -1
         
-        for name, idx in landmark_indices.items():
-            landmark = landmarks.landmark[idx]
-            positions[name] = {
-                "x": int(landmark.x * image_width),
-                "y": int(landmark.y * image_height),
-                "visibility": landmark.visibility
-            }
+        # 処理時間の計測（色変換・推論）
+        self.metrics = metrics or NullMetrics()
+    
+    def detect_poses(self, image, timestamp=None):
+        """画像から複数人の姿勢を検出し、(人数, 33, 4) の配列を返す"""
+        with self.metrics.span("color_convert"):
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
+        
+        # VIDEOモードではタイムスタンプが単調増加している必要がある
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        timestamp_ms = max(int(timestamp * 1000), self.last_timestamp_ms + 1)
+        self.last_timestamp_ms = timestamp_ms
+        
+        with self.metrics.span("inference"):
+            result = self.landmarker.detect_for_video(mp_image, timestamp_ms)
         
-        return positions
\ No newline at end of file
+        # 全員分をまとめて配列に変換
+        poses = result.pose_landmarks
+        count = sum(len(pose) for pose in poses)
+        values = np.fromiter(
+            (v for pose in poses for lm in pose
+             for v in (lm.x, lm.y, lm.z, lm.visibility if lm.visibility is not None else 1.0)),
+            dtype=np.float32,
+            count=count * LANDMARK_FIELDS)
+        return values.reshape(len(poses), -1, LANDMARK_FIELDS) if poses else values.reshape(0, 33, LANDMARK_FIELDS)
+    
+    def close(self):
+        """検出器を解放"""
+        self.landmarker.close()
+
+class DetectionResults:
+    """ProfileDetector の検出結果（Holistic の結果と同じ属性名、無効なモデルの結果は None）"""
+    __slots__ = ("pose_landmarks", "segmentation_mask", "left_hand_landmarks",
+                 "right_hand_landmarks", "face_landmarks")
+    
+    def __init__(self, pose_landmarks=None, segmentation_mask=None, left_hand_landmarks=None,
+                 right_hand_landmarks=None, face_landmarks=None):
+        self.pose_landmarks = pose_landmarks
+        self.segmentation_mask = segmentation_mask
+        self.left_hand_landmarks = left_hand_landmarks
+        self.right_hand_landmarks = right_hand_landmarks
+        self.face_landmarks = face_landmarks
+
+class ProfileDetector:
+    def __init__(self, segmentation=False, hands=False, face=False, model_complexity=1,
+                 hands_interval=2, face_interval=3, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5, metrics=None):
+        # 必要なモデルだけを個別に動かす（Holistic は顔・手のモデルを毎フレーム必ず動かすため）
+        self.pose = mp.solutions.pose.Pose(
+            model_complexity=model_complexity,
+            enable_segmentation=segmentation,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence)
+        self.hands = mp.solutions.hands.Hands(
+            max_num_hands=2,
+            model_complexity=min(model_complexity, 1),  # 手のモデルは0と1のみ
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence) if hands else None
+        self.face = mp.solutions.face_mesh.FaceMesh(
+            max_num_faces=1,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence) if face else None
+        self.segmentation = segmentation
+        
+        # 手・顔は姿勢より低い頻度で推論し、間のフレームは前回の結果を使う
+        self.hands_interval = max(1, hands_interval)
+        self.face_interval = max(1, face_interval)
+        self.frame_index = 0
+        self.hand_landmarks = (None, None)  # (左手, 右手)
+        self.face_landmarks = None
+        
+        # 処理時間の計測（モデルごとの推論）
+        self.metrics = metrics or NullMetrics()
+    
+    def process(self, image_rgb):
+        """RGB画像から検出する（Holistic.process と同じ使い方）
+        
+        手の左右は入力が左右反転した（鏡像の）画像であることを前提に判定される。
+        """
+        with self.metrics.span("inference"):
+            pose_results = self.pose.process(image_rgb)
+        
+        if self.hands is not None and self.frame_index % self.hands_interval == 0:
+            with self.metrics.span("hands_inference"):
+                self.hand_landmarks = self._split_hands(self.hands.process(image_rgb))
+        if self.face is not None and self.frame_index % self.face_interval == 0:
+            with self.metrics.span("face_inference"):
+                face_results = self.face.process(image_rgb)
+            self.face_landmarks = face_results.multi_face_landmarks[0] if face_results.multi_face_landmarks else None
+        self.frame_index += 1
+        
+        left_hand, right_hand = self.hand_landmarks
+        return DetectionResults(
+            pose_landmarks=pose_results.pose_landmarks,
+            segmentation_mask=pose_results.segmentation_mask if self.segmentation else None,
+            left_hand_landmarks=left_hand,
+            right_hand_landmarks=right_hand,
+            face_landmarks=self.face_landmarks)
+    
+    @staticmethod
+    def _split_hands(results):
+        """Hands の結果を (左手, 右手) に振り分ける"""
+        left_hand = right_hand = None
+        if results.multi_hand_landmarks:
+            for landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
+                if handedness.classification[0].label == "Left":
+                    left_hand = landmarks
+                else:
+                    right_hand = landmarks
+        return left_hand, right_hand
+    
+    def close(self):
+        """検出器を解放"""
+        self.pose.close()
+        if self.hands is not None:
+            self.hands.close()
+        if self.face is not None:
+            self.face.close()
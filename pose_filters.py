@@ -0,0 +1,255 @@
+# pose_filters.py
+# ランドマーク用の時系列フィルタ（全ランドマークを配列演算でまとめて処理）
+import abc
+import math
+import numpy as np
+
+# 既定のフレーム間隔（タイムスタンプが使えない場合）
+DEFAULT_DT = 1.0 / 30.0
+
+class PoseFilter(abc.ABC):
+    """フィルタの共通インターフェース
+    
+    入力は (..., 4) の float32 配列（x, y, z, visibility）。
+    x, y, z を平滑化し、visibility は現在の値をそのまま使う。
+    """
+    
+    def __init__(self, smoothing_factor=0.8, reference_factor=0.8):
+        # reference_factor のとき各フィルタのパラメータが設定値どおりになる
+        self.reference_factor = reference_factor
+        self.smoothing_factor = smoothing_factor
+        self.velocity = None  # 速度推定（正規化座標/秒）
+        self.last_timestamp = None
+    
+    def strength_scale(self):
+        """スムージング係数を基準値に対する倍率に変換（係数が大きいほど小さい）"""
+        return max(1.0 - self.smoothing_factor, 1e-3) / max(1.0 - self.reference_factor, 1e-3)
+    
+    def set_smoothing_factor(self, smoothing_factor):
+        """スムージング係数を更新"""
+        self.smoothing_factor = smoothing_factor
+    
+    def reset(self):
+        """内部状態をリセット"""
+        self.velocity = None
+        self.last_timestamp = None
+    
+    def reset_rows(self, rows, points):
+        """先頭軸の指定した行の状態を points で初期化（複数人をまとめて処理する場合の人物の入れ替わり用）"""
+        if self.velocity is not None:
+            self.velocity[rows] = 0.0
+    
+    def _elapsed(self, timestamp):
+        """前回からの経過時間（秒）を求めてタイムスタンプを更新"""
+        if self.last_timestamp is None or timestamp is None or timestamp <= self.last_timestamp:
+            dt = DEFAULT_DT
+        else:
+            dt = timestamp - self.last_timestamp
+        self.last_timestamp = timestamp
+        return dt
+    
+    @abc.abstractmethod
+    def apply(self, points, timestamp=None):
+        """フィルタを適用して平滑化済みの新しい配列を返す"""
+
+class WeightedAverageFilter(PoseFilter):
+    """三角重みの加重移動平均（リングバッファ）"""
+    
+    def __init__(self, smoothing_factor=0.8, reference_factor=0.8, max_history=15):
+        super().__init__(smoothing_factor, reference_factor)
+        self.max_history = max_history
+        self.history = None  # (max_history, ..., 4)
+        self.history_index = 0  # 次に書き込むスロット
+        self.history_count = 0  # 有効な履歴数
+        self._previous = None
+        
+        # 三角重み（最新のデータほど重み大）を事前計算
+        self._partial_weights, self._full_weights = self._build_weights(max_history)
+    
+    @staticmethod
+    def _build_weights(max_history):
+        """履歴数・書き込み位置ごとの正規化済み三角重みを作成"""
+        # 履歴が埋まるまで：スロット0..n-1が古い順に並ぶ
+        partial = np.zeros((max_history, max_history), dtype=np.float32)
+        for n in range(1, max_history + 1):
+            weights = np.arange(1, n + 1, dtype=np.float32)
+            partial[n - 1, :n] = weights / weights.sum()
+        
+        # 履歴が埋まった後：書き込み位置のスロットが最も古い
+        full = np.stack([np.roll(partial[-1], shift) for shift in range(max_history)])
+        return partial, full
+    
+    def reset(self):
+        super().reset()
+        self.history_index = 0
+        self.history_count = 0
+        self._previous = None
+    
+    def reset_rows(self, rows, points):
+        super().reset_rows(rows, points)
+        if self.history is not None:
+            # 履歴全体を現在のポーズで埋めると、以降の平均はその行だけ初期状態から始まる
+            self.history[:, rows] = points
+        if self._previous is not None:
+            self._previous[rows] = points
+    
+    def apply(self, points, timestamp=None):
+        dt = self._elapsed(timestamp)
+        if self.history is None or self.history.shape[1:] != points.shape:
+            self.history = np.zeros((self.max_history,) + points.shape, dtype=np.float32)
+            self.reset()
+        
+        # 現在のランドマークをリングバッファへ書き込む
+        current = self.history[self.history_index]
+        current[...] = points
+        self.history_index = (self.history_index + 1) % self.max_history
+        self.history_count = min(self.history_count + 1, self.max_history)
+        
+        if self.history_count < 3:
+            # 履歴が不足している場合は現在のポーズを返す
+            smoothed = current.copy()
+        else:
+            # 重みを選択して全ランドマークの加重平均を一度に計算
+            if self.history_count < self.max_history:
+                weights = self._partial_weights[self.history_count - 1]
+            else:
+                weights = self._full_weights[self.history_index]
+            smoothed = np.tensordot(weights, self.history, axes=1)
+            
+            # スムージングを適用（visibilityは現在の値を使う）
+            smoothed *= self.smoothing_factor
+            smoothed += current * (1 - self.smoothing_factor)
+            smoothed[..., 3] = current[..., 3]
+        
+        # 出力の差分から速度を推定
+        if self._previous is not None:
+            self.velocity = (smoothed[..., :3] - self._previous[..., :3]) / dt
+        self._previous = smoothed
+        return smoothed
+
+class OneEuroFilter(PoseFilter):
+    """One-Euroフィルタ（速い動きほどカットオフを上げて遅延を抑える）"""
+    
+    def __init__(self, smoothing_factor=0.8, reference_factor=0.8,
+                 min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        super().__init__(smoothing_factor, reference_factor)
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._previous = None
+    
+    @staticmethod
+    def _alpha(cutoff, dt):
+        """カットオフ周波数から平滑化係数を求める"""
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+    
+    def reset(self):
+        super().reset()
+        self._previous = None
+    
+    def reset_rows(self, rows, points):
+        super().reset_rows(rows, points)
+        if self._previous is not None:
+            self._previous[rows] = points
+    
+    def apply(self, points, timestamp=None):
+        dt = self._elapsed(timestamp)
+        if self._previous is None or self._previous.shape != points.shape:
+            self._previous = points.astype(np.float32, copy=True)
+            self.velocity = np.zeros(points.shape[:-1] + (3,), dtype=np.float32)
+            return self._previous.copy()
+        
+        position = points[..., :3]
+        previous = self._previous[..., :3]
+        
+        # 速度（微分）を平滑化
+        raw_velocity = (position - previous) / dt
+        alpha_d = self._alpha(self.d_cutoff, dt)
+        self.velocity += alpha_d * (raw_velocity - self.velocity)
+        
+        # 速度に応じてカットオフを上げる
+        min_cutoff = self.min_cutoff * self.strength_scale()
+        cutoff = min_cutoff + self.beta * np.abs(self.velocity)
+        alpha = self._alpha(cutoff, dt)
+        
+        smoothed = np.empty_like(self._previous)
+        smoothed[..., :3] = previous + alpha * (position - previous)
+        smoothed[..., 3] = points[..., 3]
+        self._previous = smoothed
+        return smoothed
+
+class KalmanFilter(PoseFilter):
+    """ランドマーク座標ごとの等速度モデルのカルマンフィルタ"""
+    
+    def __init__(self, smoothing_factor=0.8, reference_factor=0.8,
+                 process_noise=10.0, measurement_noise=1e-4):
+        super().__init__(smoothing_factor, reference_factor)
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.position = None
+        # 共分散行列 [[p00, p01], [p01, p11]] を要素ごとに保持
+        self._p00 = None
+        self._p01 = None
+        self._p11 = None
+    
+    def reset(self):
+        super().reset()
+        self.position = None
+    
+    def reset_rows(self, rows, points):
+        super().reset_rows(rows, points)
+        if self.position is not None:
+            self.position[rows] = points[..., :3]
+            self._p00[rows] = self.measurement_noise
+            self._p01[rows] = 0.0
+            self._p11[rows] = 1.0
+    
+    def apply(self, points, timestamp=None):
+        dt = self._elapsed(timestamp)
+        measurement = points[..., :3]
+        if self.position is None or self.position.shape != measurement.shape:
+            self.position = measurement.astype(np.float32, copy=True)
+            self.velocity = np.zeros_like(self.position)
+            self._p00 = np.full_like(self.position, self.measurement_noise)
+            self._p01 = np.zeros_like(self.position)
+            self._p11 = np.full_like(self.position, 1.0)
+            return points.astype(np.float32, copy=True)
+        
+        # 係数が大きいほどプロセスノイズを小さくして強く平滑化
+        q = self.process_noise * self.strength_scale() ** 2
+        r = self.measurement_noise
+        
+        # 予測（等速度モデル）
+        self.position += self.velocity * dt
+        p00 = self._p00 + dt * (2 * self._p01 + dt * self._p11) + q * dt ** 4 / 4
+        p01 = self._p01 + dt * self._p11 + q * dt ** 3 / 2
+        p11 = self._p11 + q * dt ** 2
+        
+        # 更新
+        gain_p = p00 / (p00 + r)
+        gain_v = p01 / (p00 + r)
+        innovation = measurement - self.position
+        self.position += gain_p * innovation
+        self.velocity += gain_v * innovation
+        self._p00 = (1 - gain_p) * p00
+        self._p01 = (1 - gain_p) * p01
+        self._p11 = p11 - gain_v * p01
+        
+        smoothed = np.empty(points.shape, dtype=np.float32)
+        smoothed[..., :3] = self.position
+        smoothed[..., 3] = points[..., 3]
+        return smoothed
+
+# フィルタ名とクラスの対応（設定・キー操作での切り替え順）
+FILTER_TYPES = {
+    "weighted_average": WeightedAverageFilter,
+    "one_euro": OneEuroFilter,
+    "kalman": KalmanFilter,
+}
+
+def create_filter(filter_type, smoothing_factor=0.8, reference_factor=0.8, **params):
+    """フィルタ名からフィルタを生成"""
+    if filter_type not in FILTER_TYPES:
+        raise ValueError(f"未対応のフィルタです: {filter_type}")
+    return FILTER_TYPES[filter_type](smoothing_factor, reference_factor, **params)
@@ -1,77 +1,152 @@
 # pose_smoother.py
 # ポーズのスムージング処理
-import copy
+import time
+import numpy as np
+from landmarks import LANDMARK_FIELDS, LandmarkArray, landmarks_to_array
+from pose_filters import FILTER_TYPES, create_filter
 
 class PoseSmoother:
-    def __init__(self, max_history=15, smoothing_factor=0.8):
-        # スムージング用の過去ポーズ記録
-        self.pose_history = []
+    def __init__(self, max_history=15, smoothing_factor=0.8,
+                 filter_type="weighted_average", filter_params=None):
+        # スムージング設定
         self.max_history = max_history
         self.smoothing_factor = smoothing_factor
+        self.reference_factor = smoothing_factor  # フィルタパラメータの基準となる係数
+        
+        # フィルタごとの追加パラメータ
+        self.filter_params = filter_params or {}
+        self.filter_type = filter_type
+        self.filter = self._create_filter(filter_type)
+        
+        # 外挿用の直近の出力
+        self.last_points = None
+        self.last_timestamp = None
+    
+    def _create_filter(self, filter_type):
+        """フィルタを生成"""
+        params = dict(self.filter_params.get(filter_type, {}))
+        if filter_type == "weighted_average":
+            params.setdefault("max_history", self.max_history)
+        return create_filter(filter_type, self.smoothing_factor, self.reference_factor, **params)
+    
+    def set_filter(self, filter_type):
+        """フィルタを切り替え（履歴はリセットされる）"""
+        self.filter = self._create_filter(filter_type)
+        self.filter_type = filter_type
+        self.last_points = None
+    
+    def next_filter(self):
+        """次のフィルタに切り替え"""
+        names = list(FILTER_TYPES)
+        index = names.index(self.filter_type) if self.filter_type in names else -1
+        self.set_filter(names[(index + 1) % len(names)])
+    
+    @property
+    def velocity(self):
+        """フィルタの速度推定（(33, 3)、正規化座標/秒）"""
+        return self.filter.velocity
     
     def reset_history(self):
         """履歴をリセット"""
-        self.pose_history = []
+        self.filter.reset()
+        self.last_points = None
     
     def increase_smoothing(self, step=0.05):
         """スムージング係数を上げる"""
         self.smoothing_factor = min(0.95, self.smoothing_factor + step)
+        self.filter.set_smoothing_factor(self.smoothing_factor)
     
     def decrease_smoothing(self, step=0.05):
         """スムージング係数を下げる"""
         self.smoothing_factor = max(0.0, self.smoothing_factor - step)
+        self.filter.set_smoothing_factor(self.smoothing_factor)
     
-    def apply_smoothing(self, landmarks):
-        """加重移動平均スムージングを適用"""
-        # ランドマークのディープコピーを作成
-        smoothed_landmarks = copy.deepcopy(landmarks)
+    def apply_smoothing(self, landmarks, timestamp=None):
+        """選択中のフィルタでスムージングを適用"""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        points = landmarks_to_array(landmarks)
+        self.last_points = self.filter.apply(points, timestamp)
+        self.last_timestamp = timestamp
+        return LandmarkArray(self.last_points)
+    
+    def extrapolate(self, timestamp=None, max_horizon=0.2):
+        """直近の出力を速度推定で外挿したランドマークを返す（検出を省いたフレーム用）"""
+        if self.last_points is None:
+            return None
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        
+        velocity = self.filter.velocity
+        if velocity is None:
+            return LandmarkArray(self.last_points)
         
-        # 現在のランドマークを一時的なリストに変換
-        current_pose = []
-        for landmark in landmarks.landmark:
-            current_pose.append({
-                'x': landmark.x,
-                'y': landmark.y,
-                'z': landmark.z,
-                'visibility': landmark.visibility
-            })
+        # 外挿する時間は上限を設ける（長く外挿すると発散するため）
+        horizon = min(max(timestamp - self.last_timestamp, 0.0), max_horizon)
+        points = self.last_points.copy()
+        points[..., :3] += velocity * horizon
+        return LandmarkArray(points)
+
+class MultiPoseSmoother(PoseSmoother):
+    """複数人のポーズを1つのフィルタでまとめてスムージング
+    
+    トラックごとに固定のスロット（先頭軸の行）を割り当て、(max_people, 33, 4) の配列に
+    1回フィルタを適用する。人数が増えてもフィルタ呼び出しは1回で済む。
+    """
+    
+    def __init__(self, max_people=4, num_landmarks=33, **kwargs):
+        super().__init__(**kwargs)
+        self.max_people = max_people
+        self.batch = np.zeros((max_people, num_landmarks, LANDMARK_FIELDS), dtype=np.float32)
+        self.slots = {}  # トラックID → スロット
+    
+    def set_filter(self, filter_type):
+        super().set_filter(filter_type)
+        self.slots = {}
+    
+    def reset_history(self):
+        super().reset_history()
+        self.slots = {}
+    
+    def apply_tracks(self, track_ids, poses, held_ids=(), timestamp=None):
+        """トラックIDごとにスムージングしたランドマークを返す（[(track_id, LandmarkArray), ...]）
         
-        # 履歴に追加
-        self.pose_history.append(current_pose)
+        held_ids は今回検出されなかったが保持中のトラックで、直前の出力をそのまま入力する。
+        """
+        # 消えたトラックのスロットを解放
+        alive = set(int(track_id) for track_id in track_ids) | set(int(track_id) for track_id in held_ids)
+        self.slots = {track_id: slot for track_id, slot in self.slots.items() if track_id in alive}
+        free_slots = [slot for slot in range(self.max_people) if slot not in self.slots.values()]
         
-        # 履歴が長すぎる場合は古いものを削除
-        if len(self.pose_history) > self.max_history:
-            self.pose_history.pop(0)
+        # 検出されたポーズを各スロットに配置（新しいトラックはフィルタ状態を初期化）
+        new_slots = []
+        for track_id, pose in zip(track_ids, poses):
+            track_id = int(track_id)
+            slot = self.slots.get(track_id)
+            if slot is None:
+                if not free_slots:
+                    continue  # 上限人数を超えた分は描画しない
+                slot = self.slots[track_id] = free_slots.pop(0)
+                new_slots.append(slot)
+            self.batch[slot] = pose
         
-        # 履歴が不足している場合は現在のポーズを返す
-        if len(self.pose_history) < 3:
-            return landmarks
+        # 保持中のトラックは直前の出力で埋める
+        if self.last_points is not None:
+            for track_id in held_ids:
+                slot = self.slots.get(int(track_id))
+                if slot is not None:
+                    self.batch[slot] = self.last_points[slot]
         
-        # 各ランドマークに対して加重平均を計算
-        for i in range(len(landmarks.landmark)):
-            sumX = 0
-            sumY = 0
-            sumZ = 0
-            total_weight = 0
-            
-            # 過去のフレームに対して加重平均を計算
-            for j, frame in enumerate(self.pose_history):
-                # 三角重み付け（最新のデータほど重み大）
-                weight = (j + 1) / len(self.pose_history)
-                
-                sumX += frame[i]['x'] * weight
-                sumY += frame[i]['y'] * weight
-                sumZ += frame[i]['z'] * weight
-                total_weight += weight
-            
-            # 重み付け平均を計算
-            avgX = sumX / total_weight
-            avgY = sumY / total_weight
-            avgZ = sumZ / total_weight
-            
-            # スムージングを適用
-            smoothed_landmarks.landmark[i].x = landmarks.landmark[i].x * (1 - self.smoothing_factor) + avgX * self.smoothing_factor
-            smoothed_landmarks.landmark[i].y = landmarks.landmark[i].y * (1 - self.smoothing_factor) + avgY * self.smoothing_factor
-            smoothed_landmarks.landmark[i].z = landmarks.landmark[i].z * (1 - self.smoothing_factor) + avgZ * self.smoothing_factor
+        if new_slots:
+            self.filter.reset_rows(new_slots, self.batch[new_slots])
         
-        return smoothed_landmarks
+        smoothed = self.apply_smoothing(LandmarkArray(self.batch), timestamp).array
+        return [(track_id, LandmarkArray(smoothed[slot])) for track_id, slot in sorted(self.slots.items())]
+    
+    def extrapolate_tracks(self, timestamp=None, max_horizon=0.2):
+        """全トラックを速度推定で外挿（検出を省いたフレーム用）"""
+        extrapolated = self.extrapolate(timestamp, max_horizon)
+        if extrapolated is None:
+            return []
+        return [(track_id, LandmarkArray(extrapolated.array[slot]))
+                for track_id, slot in sorted(self.slots.items())]
@@ -0,0 +1,74 @@
+# pose_tracker.py
+# 複数人のポーズにフレーム間で一貫したトラックIDを割り当てる
+import numpy as np
+
+class PoseTracker:
+    def __init__(self, max_distance=0.1, max_missed=5, min_visibility=0.5):
+        # 対応付けの設定
+        self.max_distance = max_distance  # 同一人物とみなすランドマーク間の平均距離（正規化座標）
+        self.max_missed = max_missed  # 検出されなくてもトラックを保持するフレーム数
+        self.min_visibility = min_visibility  # 距離計算に使うランドマークの可視度
+        
+        # トラックの状態（IDの昇順）
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_poses = np.empty((0, 33, 4), dtype=np.float32)
+        self.track_missed = np.empty(0, dtype=np.int64)
+        self.next_id = 0
+    
+    def reset(self):
+        """全トラックを破棄"""
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_poses = np.empty((0,) + self.track_poses.shape[1:], dtype=np.float32)
+        self.track_missed = np.empty(0, dtype=np.int64)
+    
+    def _distances(self, poses):
+        """トラック×検出のランドマーク平均距離（(トラック数, 検出数)）"""
+        track_xy = self.track_poses[:, np.newaxis, :, :2]
+        pose_xy = poses[np.newaxis, :, :, :2]
+        distance = np.linalg.norm(track_xy - pose_xy, axis=-1)
+        
+        # 両方で見えているランドマークだけで平均（なければ全ランドマーク）
+        visible = ((self.track_poses[:, np.newaxis, :, 3] >= self.min_visibility) &
+                   (poses[np.newaxis, :, :, 3] >= self.min_visibility))
+        count = visible.sum(axis=-1)
+        visible_mean = (distance * visible).sum(axis=-1) / np.maximum(count, 1)
+        return np.where(count > 0, visible_mean, distance.mean(axis=-1))
+    
+    def update(self, poses):
+        """検出結果（(N, 33, 4)）にトラックIDを割り当てて返す（(N,) int64）"""
+        poses = np.asarray(poses, dtype=np.float32).reshape((-1,) + self.track_poses.shape[1:])
+        assigned = np.full(len(poses), -1, dtype=np.int64)
+        matched_tracks = np.zeros(len(self.track_ids), dtype=bool)
+        
+        # 距離の小さい組から貪欲に対応付け
+        if len(self.track_ids) and len(poses):
+            distances = self._distances(poses)
+            for flat in np.argsort(distances, axis=None):
+                track, pose = divmod(int(flat), len(poses))
+                if distances[track, pose] > self.max_distance:
+                    break
+                if matched_tracks[track] or assigned[pose] >= 0:
+                    continue
+                matched_tracks[track] = True
+                assigned[pose] = self.track_ids[track]
+                self.track_poses[track] = poses[pose]
+        
+        # 対応しなかったトラックは見失った回数を増やし、上限を超えたら破棄
+        self.track_missed = np.where(matched_tracks, 0, self.track_missed + 1)
+        keep = self.track_missed <= self.max_missed
+        
+        # 対応しなかった検出は新しいトラックにする
+        new = assigned < 0
+        new_ids = np.arange(self.next_id, self.next_id + np.count_nonzero(new), dtype=np.int64)
+        assigned[new] = new_ids
+        self.next_id += len(new_ids)
+        
+        self.track_ids = np.concatenate([self.track_ids[keep], new_ids])
+        self.track_poses = np.concatenate([self.track_poses[keep], poses[new]])
+        self.track_missed = np.concatenate([self.track_missed[keep], np.zeros(len(new_ids), dtype=np.int64)])
+        return assigned
+    
+    @property
+    def missing_ids(self):
+        """保持中だが今回のフレームで検出されなかったトラックのID"""
+        return self.track_ids[self.track_missed > 0]
@@ -1,5 +1,85 @@
+import argparse
+from frame_io import open_sink, open_source
 from main import PoseAnimationApp
+from shared_pipeline import SharedMemoryPipeline
 
 if __name__ == "__main__":
-    app = PoseAnimationApp()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ポーズアニメーション")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="キャプチャ・検出・描画をスレッドで並列実行する")
+    parser.add_argument("--adaptive-skip", action="store_true",
+                        help="処理が間に合わないときに検出を間引き、ランドマークを外挿する")
+    parser.add_argument("--record", metavar="PATH",
+                        help="スムージング済みランドマークを記録する（landmark_store形式）")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="記録したランドマークを再生する（カメラ・MediaPipeは使わない）")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="再生速度（1.0で等速、0で待たずに最速）")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="複数人を検出し、人物ごとに色分けして描画する")
+    parser.add_argument("--gestures", action="store_true",
+                        help="手のジェスチャー（グー・チョキ・パー）でコマンドを実行する")
+    parser.add_argument("--source", metavar="SPEC",
+                        help="入力元（camera[:番号] / video:PATH / images:DIR / socket:PORT、省略時はカメラ）")
+    parser.add_argument("--sink", metavar="SPEC", action="append",
+                        help="出力先（window / null / video:PATH / shm[:NAME]、省略時はウィンドウ）"
+                             "（--multiprocess では複数指定でき、出力先ごとに描画プロセスを起動する）")
+    parser.add_argument("--headless", action="store_true",
+                        help="ウィンドウを開かずに実行する（出力先の既定は null）")
+    parser.add_argument("--loop", action="store_true",
+                        help="動画・画像フォルダの入力を繰り返す")
+    parser.add_argument("--realtime", action="store_true",
+                        help="動画・画像フォルダの入力を実時間の速さで読む（既定は待たずに最速）")
+    parser.add_argument("--multiprocess", action="store_true",
+                        help="キャプチャ+検出と描画を別プロセスで実行し、共有メモリでフレームを受け渡す")
+    parser.add_argument("--export", metavar="PATH",
+                        help="描画結果を書き出す（.gif なら GIF アニメーション、.mp4 などは動画）")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="ステージごとの処理時間を出力する（.jsonlならJSON Lines、それ以外はPrometheus形式）")
+    parser.add_argument("--metrics-port", type=int,
+                        help="処理時間を http://127.0.0.1:PORT/metrics で公開する")
+    parser.add_argument("--timing-overlay", action="store_true",
+                        help="ステージごとの処理時間をキャンバスに表示する")
+    args = parser.parse_args()
+    
+    # 入力元と出力先（ウィンドウはアプリのUIマネージャを使うため、アプリ側で作成する）
+    sink_specs = args.sink or ["null" if args.headless else "window"]
+    if args.headless and "window" in sink_specs:
+        parser.error("--headless ではウィンドウに表示できません")
+    
+    # マルチプロセス構成（描画プロセスごとにUIマネージャとレンダラーを持つ）
+    if args.multiprocess:
+        unsupported = [flag for flag, value in (
+            ("--pipelined", args.pipelined), ("--adaptive-skip", args.adaptive_skip),
+            ("--record", args.record), ("--replay", args.replay),
+            ("--multi-person", args.multi_person), ("--gestures", args.gestures),
+            ("--export", args.export), ("--metrics", args.metrics),
+            ("--metrics-port", args.metrics_port), ("--timing-overlay", args.timing_overlay)) if value]
+        if unsupported:
+            parser.error(f"--multiprocess では {', '.join(unsupported)} を使えません"
+                         "（書き出しは --sink video:PATH を使う）")
+        source = open_source(args.source or "camera", loop=args.loop, realtime=args.realtime)
+        SharedMemoryPipeline(source, sink_specs).run()
+        raise SystemExit(0)
+    
+    if len(sink_specs) > 1:
+        parser.error("出力先を複数指定できるのは --multiprocess のときだけです")
+    sink_spec = sink_specs[0]
+    source = open_source(args.source, loop=args.loop, realtime=args.realtime) if args.source else None
+    sink = open_sink(sink_spec) if sink_spec != "window" else None
+    
+    app = PoseAnimationApp(
+        pipelined=args.pipelined or None,
+        adaptive_skip=args.adaptive_skip or None,
+        record_path=args.record,
+        replay_path=args.replay,
+        replay_speed=args.replay_speed,
+        metrics_path=args.metrics,
+        metrics_port=args.metrics_port,
+        timing_overlay=args.timing_overlay or None,
+        multi_person=args.multi_person or None,
+        gestures=args.gestures or None,
+        export_path=args.export,
+        source=source,
+        sink=sink)
+    app.run()
@@ -0,0 +1,79 @@
+# session_recorder.py
+# スムージング済みランドマークの記録と再生（カメラ・MediaPipeなしで描画を再現する）
+import time
+import numpy as np
+from landmark_store import DEFAULT_STREAMS, LandmarkStore, LandmarkStoreWriter
+from landmarks import LandmarkArray, landmarks_to_array
+
+# 記録するストリーム（ポーズと記録開始からの経過秒）
+RECORDING_STREAMS = {
+    "pose": DEFAULT_STREAMS["pose"],
+    "timestamp": ((), "float64"),
+}
+
+class SessionRecorder:
+    def __init__(self, path, width, height):
+        # 記録先（landmark_store形式のディレクトリ）
+        self.writer = LandmarkStoreWriter(
+            path, RECORDING_STREAMS, {"width": width, "height": height})
+        self.start_time = None
+    
+    def write(self, landmarks, timestamp=None):
+        """1フレーム分を記録（ポーズが検出されなかった場合はNone）"""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = timestamp
+        
+        pose = landmarks_to_array(landmarks) if landmarks is not None else None
+        self.writer.append(self.writer.count, pose=pose, timestamp=timestamp - self.start_time)
+    
+    def close(self):
+        """記録を閉じる"""
+        self.writer.close()
+
+class SessionPlayer:
+    def __init__(self, path, speed=1.0, loop=False):
+        # 記録の読み込み（メモリマップ）
+        self.store = LandmarkStore(path)
+        self.width = self.store.metadata.get("width", 640)
+        self.height = self.store.metadata.get("height", 480)
+        
+        # 再生速度（1.0で等速、0以下は待たずに最速で再生）
+        self.speed = speed
+        self.loop = loop
+        self.position = 0
+        self.start_time = None
+    
+    def isOpened(self):
+        """cv2.VideoCaptureと同じ形で再生可能かを返す"""
+        return self.position < len(self.store) or (self.loop and len(self.store) > 0)
+    
+    def read(self):
+        """次のフレームのランドマークを返す（(成功, ランドマークまたはNone)）"""
+        if self.position >= len(self.store):
+            if not self.loop or len(self.store) == 0:
+                return False, None
+            self.position = 0
+            self.start_time = None
+        
+        # 記録時のタイムスタンプに合わせて待つ
+        timestamp = float(self.store["timestamp"][self.position])
+        if self.speed > 0:
+            now = time.perf_counter()
+            if self.start_time is None:
+                self.start_time = now - timestamp / self.speed
+            delay = self.start_time + timestamp / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+        
+        pose = self.store["pose"][self.position]
+        self.position += 1
+        if np.isnan(pose[0, 0]):
+            return True, None
+        return True, LandmarkArray(np.array(pose))
+    
+    def release(self):
+        """再生を終了"""
+        self.position = len(self.store)
+        self.loop = False
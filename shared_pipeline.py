@@ -0,0 +1,225 @@
+# shared_pipeline.py
+# キャプチャ+検出と描画を別プロセスに分け、フレームとランドマークを共有メモリの
+# リングバッファ（frame_ring）で受け渡すマルチプロセス構成
+#
+# 検出（MediaPipe）と描画（CharacterRenderer / UIManager の OpenCV 描画）が1つの
+# プロセスの GIL を取り合わないよう、それぞれ別のコアで動かす。描画プロセスは
+# 出力先ごとに1つ起動し、リングバッファの最新のスロットを NumPy のビューのまま
+# （コピーせずに）読んで描画する。
+import multiprocessing
+import queue
+import time
+import numpy as np
+from config import POSE_DETECTION_CONFIG, RENDER_CONFIG, SHARED_PIPELINE_CONFIG, SMOOTHING_CONFIG
+from frame_pipeline import FramePipeline
+from frame_ring import FrameRing
+from landmark_store import DEFAULT_STREAMS
+from landmarks import LANDMARK_FIELDS, LandmarkArray, landmarks_to_array
+
+# 描画プロセスで処理するコマンド（それ以外はキャプチャ+検出プロセスへ送る）
+_RENDER_ACTIONS = ("change_color",)
+
+def ring_fields(width, height):
+    """リングバッファの1スロット（フレーム・スムージング済みランドマーク・タイムスタンプ）"""
+    return {
+        "frame": ((height, width, 3), "uint8"),
+        "pose": DEFAULT_STREAMS["pose"],  # 検出されなかったフレームは NaN
+        "timestamp": ((), "float64"),
+    }
+
+def _render_process(ring_name, sink_spec, index, ready, stop_event, commands):
+    """描画プロセス：リングバッファの最新のスロットを描画して出力先へ"""
+    from character_renderer import CharacterRenderer
+    from frame_io import open_sink
+    from ui_manager import UIManager
+    
+    ring = FrameRing.attach(ring_name)
+    ui_manager = UIManager(window_name="Pose Animation" if index == 0 else f"Pose Animation {index}")
+    renderer = CharacterRenderer(**RENDER_CONFIG)
+    sink = open_sink(sink_spec, ui_manager)
+    sink.open()
+    ready.put(index)
+    
+    height, width = ring.fields["frame"][0][:2]
+    sequence = -1
+    skipped = 0  # 描画が追いつかずに飛ばしたスロット数
+    torn = 0  # 描画中に上書きされて捨てたスロット数
+    start_time = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            latest = ring.wait(sequence, timeout=0.1, poll_interval=SHARED_PIPELINE_CONFIG["poll_interval"])
+            if latest is None:
+                if ring.closed:
+                    break
+                continue
+            if sequence >= 0:
+                skipped += latest - sequence - 1
+            sequence = latest
+            
+            # 共有メモリのビューをそのまま描画に使う
+            views = ring.view(sequence)
+            if views is None:
+                torn += 1
+                continue
+            pose = views["pose"]
+            landmarks = None if np.isnan(pose[0, 0]) else LandmarkArray(pose)
+            canvas = ui_manager.create_canvas(width, height)
+            ui_manager.update(canvas, views["frame"], landmarks is not None)
+            if landmarks is not None:
+                renderer.draw_character(canvas, landmarks, width, height)
+            del views, pose, landmarks
+            
+            # 描画中にキャプチャ側が同じスロットを上書きしていたら出力しない
+            if not ring.valid(sequence):
+                torn += 1
+                continue
+            sink.write(canvas)
+            
+            # キー入力（ESC で全体を終了、色の変更以外は検出側へ送る）
+            key = sink.wait_key()
+            if key == 27:
+                stop_event.set()
+                break
+            command = ui_manager.handle_key(key)
+            if command is None:
+                continue
+            if command["action"] in _RENDER_ACTIONS:
+                renderer.next_color_scheme()
+            else:
+                commands.put(command)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        ring.close()
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        print(f"描画プロセス{index}（{sink_spec}）: {sink.frames}フレーム（{sink.frames / elapsed:.1f} FPS）"
+              f" 飛ばし {skipped} 上書き {torn}")
+
+class SharedMemoryPipeline:
+    """このプロセスでキャプチャと検出を行い、出力先ごとに描画プロセスを起動する"""
+    
+    def __init__(self, source, sink_specs, slots=None):
+        from pose_detector import PoseDetector
+        from pose_smoother import PoseSmoother
+        
+        self.source = source
+        self.sink_specs = list(sink_specs)
+        self.slots = slots or SHARED_PIPELINE_CONFIG["ring_slots"]
+        self.detector = PoseDetector(**POSE_DETECTION_CONFIG)
+        self.smoother = PoseSmoother(
+            max_history=SMOOTHING_CONFIG["max_history"],
+            smoothing_factor=SMOOTHING_CONFIG["default_smoothing_factor"],
+            filter_type=SMOOTHING_CONFIG["filter_type"],
+            filter_params=SMOOTHING_CONFIG["filter_params"])
+        self.ring = None
+        self.processes = []
+        self.commands = None  # 描画プロセスから送られるキー入力のコマンド
+        self.first_frame = None
+        self.frames_published = 0
+    
+    def capture(self):
+        """キャプチャステージ（リングバッファの大きさを決めるために読んだ最初のフレームから返す）"""
+        if self.first_frame is not None:
+            frame, self.first_frame = self.first_frame, None
+            return frame
+        success, frame = self.source.read()
+        return frame if success else None
+    
+    def detect(self, frame):
+        """検出ステージ：スムージング済みランドマーク（(33, 4) 配列、なければ NaN）とタイムスタンプ"""
+        # スムーザーを使う検出スレッドでコマンドを適用する
+        while True:
+            try:
+                self.handle_command(self.commands.get_nowait())
+            except queue.Empty:
+                break
+        
+        timestamp = time.perf_counter()
+        landmarks = self.detector.detect_pose(frame)
+        if landmarks:
+            return landmarks_to_array(self.smoother.apply_smoothing(landmarks, timestamp)), timestamp
+        return np.full((33, LANDMARK_FIELDS), np.nan, dtype=np.float32), timestamp
+    
+    def handle_command(self, command):
+        """描画プロセスから送られたキー入力のコマンド（スムージングの設定、検出スレッドで呼ぶ）"""
+        if command["action"] == "smooth_up":
+            self.smoother.increase_smoothing()
+            print(f"スムージング係数: {self.smoother.smoothing_factor:.2f}")
+        elif command["action"] == "smooth_down":
+            self.smoother.decrease_smoothing()
+            print(f"スムージング係数: {self.smoother.smoothing_factor:.2f}")
+        elif command["action"] == "next_filter":
+            self.smoother.next_filter()
+            print(f"スムージングフィルタ: {self.smoother.filter_type}")
+        elif command["action"] == "reset_history":
+            self.smoother.reset_history()
+            print("履歴リセット")
+    
+    def run(self):
+        """描画プロセスを起動し、入力が終わるか描画プロセスで ESC が押されるまで実行"""
+        success, frame = self.source.read()
+        if not success:
+            print("入力を開けませんでした。")
+            self.source.release()
+            return False
+        self.first_frame = frame
+        height, width = frame.shape[:2]
+        self.ring = FrameRing.create(ring_fields(width, height), self.slots)
+        
+        # 描画プロセスの起動（リングバッファを開いて出力の準備ができるまで待つ）
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        self.commands = context.Queue()
+        stop_event = context.Event()
+        for index, sink_spec in enumerate(self.sink_specs):
+            process = context.Process(
+                target=_render_process,
+                args=(self.ring.name, sink_spec, index, ready, stop_event, self.commands),
+                name=f"render-{index}",
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+        
+        pipeline = FramePipeline(self.capture, self.detect, queue_size=1)
+        start_time = time.perf_counter()
+        try:
+            for _ in self.processes:
+                ready.get(timeout=SHARED_PIPELINE_CONFIG["ready_timeout"])
+            print(f"共有メモリ {self.ring.name} に書き込みます（描画プロセス {len(self.processes)}個）")
+            
+            pipeline.start()
+            start_time = time.perf_counter()
+            while not stop_event.is_set():
+                item = pipeline.get_result(timeout=0.1)
+                if item is None:
+                    if pipeline.is_finished():
+                        break
+                    continue
+                frame, (pose, timestamp) = item
+                self.ring.write(frame=frame, pose=pose, timestamp=timestamp)
+                self.frames_published += 1
+        except queue.Empty:
+            print("描画プロセスを起動できませんでした。")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = max(time.perf_counter() - start_time, 1e-9)
+            pipeline.stop()
+            self.close()
+        print(f"キャプチャ+検出: {self.frames_published}フレーム（{self.frames_published / elapsed:.1f} FPS）")
+        return True
+    
+    def close(self):
+        """描画プロセスに終了を知らせて待ち、共有メモリを削除"""
+        if self.ring is not None:
+            self.ring.close_writer()
+        for process in self.processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.source.release()
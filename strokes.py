@@ -0,0 +1,139 @@
+# strokes.py
+# マウスで描いた線（ストローク）の保持・合成と、骨格の関節に追従させる描画
+import cv2
+import numpy as np
+from landmarks import POSE_LANDMARK_INDEX
+
+# ストロークを関連付ける候補の関節
+ATTACH_JOINTS = (
+    "nose",
+    "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist", "left_hip", "right_hip",
+    "left_knee", "right_knee", "left_ankle", "right_ankle",
+)
+_ATTACH_INDICES = np.array([POSE_LANDMARK_INDEX[name] for name in ATTACH_JOINTS])
+
+class Stroke:
+    """1本の線（(N, 2) int32 の折れ線）と、その重心・外接矩形"""
+    __slots__ = ("points", "color", "thickness", "joint", "centroid", "bbox")
+    
+    def __init__(self, points, color, thickness, joint=None):
+        self.points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        self.color = color
+        self.thickness = thickness
+        self.joint = joint  # 追従する関節名（None なら描いた位置のまま）
+        self.centroid = self.points.mean(axis=0)
+        self.bbox = cv2.boundingRect(self.points)  # (x, y, 幅, 高さ)
+    
+    def draw(self, image, offset=(0, 0)):
+        """offset だけ平行移動して1回の cv2.polylines で描画"""
+        cv2.polylines(image, [self.points + np.asarray(offset, dtype=np.int32)], False,
+                      self.color, self.thickness)
+
+class StrokeLayer:
+    def __init__(self, width, height):
+        # 描いた線を保持するキャンバスと、線のある画素のマスク
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        self.dirty = None  # 線のある範囲 (x1, y1, x2, y2)（合成はこの範囲だけ）
+        self.strokes = []  # 完成したストローク
+        self.current = []  # 描画中の点
+        self.current_style = None  # 描画中の線の (色, 太さ)
+    
+    def clear(self):
+        """全てのストロークを消去"""
+        if self.dirty is not None:
+            x1, y1, x2, y2 = self.dirty
+            self.canvas[y1:y2, x1:x2] = 0
+            self.mask[y1:y2, x1:x2] = 0
+        self.dirty = None
+        self.strokes = []
+        self.current = []
+    
+    def begin(self, point, color, thickness):
+        """線を描き始める"""
+        self.current = [point]
+        self.current_style = (color, thickness)
+    
+    def extend(self, point):
+        """描画中の線に点を追加してキャンバスに描く"""
+        if not self.current:
+            return
+        color, thickness = self.current_style
+        last_point = self.current[-1]
+        cv2.line(self.canvas, last_point, point, color, thickness)
+        cv2.line(self.mask, last_point, point, 255, thickness)
+        self.current.append(point)
+        
+        # 線の太さの分も含めて合成範囲を広げる
+        height, width = self.mask.shape
+        pad = thickness // 2 + 1
+        x1 = max(min(last_point[0], point[0]) - pad, 0)
+        y1 = max(min(last_point[1], point[1]) - pad, 0)
+        x2 = min(max(last_point[0], point[0]) + pad + 1, width)
+        y2 = min(max(last_point[1], point[1]) + pad + 1, height)
+        if x1 >= x2 or y1 >= y2:
+            return
+        if self.dirty is not None:
+            dx1, dy1, dx2, dy2 = self.dirty
+            x1, y1, x2, y2 = min(x1, dx1), min(y1, dy1), max(x2, dx2), max(y2, dy2)
+        self.dirty = (x1, y1, x2, y2)
+    
+    def end(self):
+        """線を描き終える（2点以上あればストロークとして保存して返す）"""
+        points, self.current = self.current, []
+        if len(points) < 2:
+            return None
+        stroke = Stroke(points, *self.current_style)
+        self.strokes.append(stroke)
+        return stroke
+    
+    def composite(self, image):
+        """描いた線を image に重ねる（線のある範囲だけ処理、image を直接書き換える）"""
+        if self.dirty is None:
+            return image
+        x1, y1, x2, y2 = self.dirty
+        cv2.copyTo(self.canvas[y1:y2, x1:x2], self.mask[y1:y2, x1:x2], image[y1:y2, x1:x2])
+        return image
+    
+    def attach(self, pixels=None, visibility=None, min_visibility=0.5, default_joint="right_wrist"):
+        """関節に関連付けていないストロークを、重心に最も近い関節に関連付ける
+        
+        pixels は全ランドマークのピクセル座標（(33, 2)）。骨格がなければ default_joint に関連付ける。
+        関連付けたストロークの数を返す。
+        """
+        strokes = [stroke for stroke in self.strokes if stroke.joint is None]
+        if not strokes:
+            return 0
+        
+        if pixels is None:
+            for stroke in strokes:
+                stroke.joint = default_joint
+            return len(strokes)
+        
+        # ストロークの重心 × 候補の関節 の距離をまとめて計算
+        joints = np.asarray(pixels, dtype=np.float64)[_ATTACH_INDICES]
+        centroids = np.array([stroke.centroid for stroke in strokes])
+        distances = np.linalg.norm(centroids[:, np.newaxis] - joints[np.newaxis], axis=-1)
+        if visibility is not None:
+            visible = np.asarray(visibility)[_ATTACH_INDICES] >= min_visibility
+            if visible.any():
+                distances[:, ~visible] = np.inf
+        for stroke, joint in zip(strokes, distances.argmin(axis=1)):
+            stroke.joint = ATTACH_JOINTS[joint]
+        return len(strokes)
+    
+    @property
+    def attached(self):
+        """関節に関連付けたストローク"""
+        return [stroke for stroke in self.strokes if stroke.joint is not None]
+    
+    def draw_attached(self, image, pixels):
+        """関連付けたストロークを、重心が関節の位置に来るように描画（image を直接書き換える）"""
+        for stroke in self.strokes:
+            if stroke.joint is None:
+                continue
+            target = pixels[POSE_LANDMARK_INDEX[stroke.joint]]
+            offset = np.floor(np.asarray(target) - stroke.centroid).astype(np.int32)
+            stroke.draw(image, offset)
+        return image
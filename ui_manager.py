@@ -1,22 +1,53 @@
 # ui_manager.py
 # UI表示と入力処理
+import time
 import cv2
 import numpy as np
-from datetime import datetime
+
+class _OverlayLayer:
+    """事前に描画した静的レイヤー（描画範囲の切り出しとマスク）"""
+    
+    def __init__(self, image):
+        # 文字が描かれた範囲だけを保持して合成時のコピー量を減らす
+        mask = image.any(axis=2)
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            self.region = None
+            return
+        self.region = (slice(ys.min(), ys.max() + 1), slice(xs.min(), xs.max() + 1))
+        self.pixels = image[self.region].copy()
+        self.mask = mask[self.region].astype(np.uint8)
+    
+    def draw(self, canvas):
+        """キャンバスにマスク付きでコピー（cv2.copyToはビューに直接書き込む）"""
+        if self.region is not None:
+            cv2.copyTo(self.pixels, self.mask, canvas[self.region])
 
 class UIManager:
-    def __init__(self, window_name="Pose Animation"):
+    def __init__(self, window_name="Pose Animation", canvas_pool_size=2):
         self.window_name = window_name
         self.prev_frame_time = 0
         self.current_frame_time = 0
+        self.fps = 0.0  # 指数移動平均したFPS
+        self.fps_smoothing = 0.9
         
         # キーマッピング
         self.key_commands = {
             ord('s'): {"action": "smooth_up"},
             ord('d'): {"action": "smooth_down"},
+            ord('f'): {"action": "next_filter"},
             ord('r'): {"action": "reset_history"},
+            ord('t'): {"action": "toggle_timing"},
             ord('c'): {"action": "change_color"}
         }
+        
+        # 解像度ごとにキャッシュした静的レイヤー（ヘルプ・状態表示）
+        self.layer_cache = {}
+        
+        # 使い回すキャンバスのバッファ（表示中のキャンバスを上書きしないよう複数持つ）
+        self.canvas_pool_size = canvas_pool_size
+        self.canvas_pool = {}
+        self.canvas_pool_index = 0
     
     def initialize(self):
         """UIの初期化"""
@@ -24,20 +55,50 @@ class UIManager:
         return True
     
     def create_canvas(self, width, height):
-        """描画用キャンバスの作成"""
-        return np.zeros((height, width, 3), dtype=np.uint8)
+        """描画用キャンバスの作成（事前確保したバッファを黒で塗り直して返す）"""
+        pool = self.canvas_pool.get((width, height))
+        if pool is None:
+            pool = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(self.canvas_pool_size)]
+            self.canvas_pool = {(width, height): pool}  # 解像度が変わったら古いバッファは破棄
+        self.canvas_pool_index = (self.canvas_pool_index + 1) % len(pool)
+        canvas = pool[self.canvas_pool_index]
+        canvas.fill(0)
+        return canvas
+    
+    def _get_layers(self, width, height):
+        """解像度ごとの静的レイヤーを取得（初回のみ描画）"""
+        layers = self.layer_cache.get((width, height))
+        if layers is None:
+            layers = {
+                "help": self._render_layer(self.add_control_help, width, height),
+                "pose_detected": self._render_layer(self._draw_pose_detected, width, height),
+                "no_pose": self._render_layer(self._draw_no_pose, width, height),
+            }
+            self.layer_cache[(width, height)] = layers
+        return layers
+    
+    def _render_layer(self, draw_fn, width, height):
+        """描画関数の結果を静的レイヤーとして保存"""
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        draw_fn(image)
+        return _OverlayLayer(image)
     
     def update(self, canvas, video_frame, pose_detected):
         """UIの更新処理"""
-        # フレームレート計算
-        self.current_frame_time = datetime.now().timestamp()
-        fps = 1 / (self.current_frame_time - self.prev_frame_time) if self.prev_frame_time > 0 else 0
+        # フレームレート計算（単調時計の間隔を指数移動平均で平滑化）
+        self.current_frame_time = time.perf_counter()
+        if self.prev_frame_time > 0:
+            instant_fps = 1 / max(self.current_frame_time - self.prev_frame_time, 1e-6)
+            if self.fps == 0.0:
+                self.fps = instant_fps
+            else:
+                self.fps = self.fps * self.fps_smoothing + instant_fps * (1 - self.fps_smoothing)
         self.prev_frame_time = self.current_frame_time
         
         # FPS表示
         cv2.putText(
             canvas, 
-            f"FPS: {int(fps)}", 
+            f"FPS: {int(self.fps)}", 
             (10, 30), 
             cv2.FONT_HERSHEY_SIMPLEX, 
             1, 
@@ -45,40 +106,48 @@ class UIManager:
             2
         )
         
-        # ポーズ検出状態の表示
-        if pose_detected:
-            cv2.putText(
-                canvas,
-                "ポーズ検出中",
-                (10, 70),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 255, 0),
-                2
-            )
-        else:
-            height, width, _ = canvas.shape
-            cv2.putText(
-                canvas,
-                "ポーズが検出されていません",
-                (width // 4, height // 2),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1.5,
-                (0, 0, 255),
-                2
-            )
+        # ポーズ検出状態と操作方法の表示（事前描画したレイヤーを合成）
+        height, width, _ = canvas.shape
+        layers = self._get_layers(width, height)
+        layers["pose_detected" if pose_detected else "no_pose"].draw(canvas)
         
-        # デバッグ用のサムネイル表示
-        self.add_thumbnail(canvas, video_frame)
+        # デバッグ用のサムネイル表示（再生時はカメラ映像なし）
+        if video_frame is not None:
+            self.add_thumbnail(canvas, video_frame)
         
         # 操作方法の表示
-        self.add_control_help(canvas)
+        layers["help"].draw(canvas)
+    
+    def _draw_pose_detected(self, canvas):
+        """ポーズ検出中の表示"""
+        cv2.putText(
+            canvas,
+            "ポーズ検出中",
+            (10, 70),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            (0, 255, 0),
+            2
+        )
+    
+    def _draw_no_pose(self, canvas):
+        """ポーズ未検出の表示"""
+        height, width, _ = canvas.shape
+        cv2.putText(
+            canvas,
+            "ポーズが検出されていません",
+            (width // 4, height // 2),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.5,
+            (0, 0, 255),
+            2
+        )
     
     def add_thumbnail(self, canvas, frame, width=160, height=120):
         """サムネイルの表示"""
         h, w, _ = canvas.shape
-        thumbnail = cv2.resize(frame, (width, height))
-        canvas[10:10+height, w-10-width:w-10] = thumbnail
+        # キャンバス上の領域に直接縮小する（中間バッファを作らない）
+        cv2.resize(frame, (width, height), dst=canvas[10:10+height, w-10-width:w-10])
     
     def add_control_help(self, canvas):
         """操作方法のヘルプ表示"""
@@ -87,12 +156,14 @@ class UIManager:
             "操作方法:",
             "S: スムージング強度アップ",
             "D: スムージング強度ダウン",
+            "F: スムージングフィルタ切替",
             "R: 履歴リセット",
             "C: キャラクター色変更",
+            "T: 処理時間表示",
             "ESC: 終了"
         ]
         
-        y_pos = h - 150
+        y_pos = h - 200
         for text in controls:
             cv2.putText(
                 canvas,
@@ -106,6 +177,26 @@ class UIManager:
             )
             y_pos += 25
     
+    def add_timing_overlay(self, canvas, summary, x_offset=180, top=150):
+        """ステージごとの処理時間（p50/p95）の表示"""
+        h, w, _ = canvas.shape
+        x_pos = w - x_offset - 10
+        y_pos = top
+        cv2.putText(canvas, "stage  p50/p95 ms", (x_pos, y_pos),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200), 1, cv2.LINE_AA)
+        for name, stats in summary.items():
+            y_pos += 18
+            cv2.putText(
+                canvas,
+                f"{name[:12]:<12} {stats['p50_ms']:.1f}/{stats['p95_ms']:.1f}",
+                (x_pos, y_pos),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.45,
+                (200, 200, 200),
+                1,
+                cv2.LINE_AA
+            )
+    
     def display(self, canvas):
         """キャンバスの表示"""
         cv2.imshow(self.window_name, canvas)